@@ -1,37 +1,191 @@
-from fastapi import HTTPException, Depends, APIRouter
+from fastapi import HTTPException, Depends, APIRouter, Request
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
+from collections import OrderedDict
+from time import monotonic
 from secrets import token_hex
 from jose import jwt, JWTError
 from datetime import datetime
+import os
 
-from psycopg2.pool import PoolError
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg import adapters, Error as DatabaseError
+from psycopg.conninfo import make_conninfo
+from psycopg.types.string import TextLoader
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
 
+from memo import MemoCursor
+from statements import PREPARED_MAX
 
-def mk_database(dbname, user, password, host, port):
-    conn_pool = ThreadedConnectionPool(
-        minconn=2, maxconn=100, dbname=dbname, user=user, password=password, host=host, port=port
+# return UUIDs as strings, the same way psycopg2 did
+adapters.register_loader("uuid", TextLoader)
+
+# settings for the database connection pools
+DB_POOL_MIN_CONN = 2
+DB_POOL_MAX_CONN = 100
+# how long a request may wait in the queue for a free connection
+DB_ACQUIRE_TIMEOUT_SECONDS = 10.0
+# how many requests may wait in the queue at once, the rest are rejected immediately
+DB_MAX_WAITING = 500
+
+# optional streaming replica of the system database for the read-only routes
+SYSTEM_DB_REPLICA_HOST = os.environ.get("SYSTEM_DB_REPLICA_HOST")
+SYSTEM_DB_REPLICA_PORT = os.environ.get("SYSTEM_DB_REPLICA_PORT", "5432")
+# reads of a user go to the primary for this long after the user's own write
+REPLICA_STICKY_SECONDS = 5.0
+# the replica is skipped while it is behind the primary by more than this
+REPLICA_MAX_LAG_SECONDS = 2.0
+# how often the replication lag is measured
+REPLICA_LAG_CHECK_INTERVAL_SECONDS = 1.0
+# how long a read waits for a replica connection before going to the primary
+REPLICA_ACQUIRE_TIMEOUT_SECONDS = 0.5
+# how long the replica is skipped after it failed
+REPLICA_RETRY_SECONDS = 5.0
+
+# upper bounds (in seconds) of the checkout latency histogram buckets
+_CHECKOUT_BUCKETS = (0.001, 0.01, 0.1, 1.0, float("inf"))
+
+
+async def _configure_connection(conn):
+    conn.prepared_max = PREPARED_MAX
+
+
+# Connection pool that makes requests wait in a bounded FIFO queue when all
+# connections are in use, instead of failing at once. Keeps the gauges that
+# are needed to size DB_POOL_MAX_CONN.
+class DatabasePool:
+    def __init__(self, conninfo: str, min_conn: int, max_conn: int, acquire_timeout: float, max_waiting: int):
+        # psycopg_pool serves waiting clients in the order they came
+        self.pool = AsyncConnectionPool(
+            conninfo=conninfo,
+            min_size=min_conn,
+            max_size=max_conn,
+            timeout=acquire_timeout,
+            max_waiting=max_waiting,
+            kwargs={"cursor_factory": MemoCursor},
+            configure=_configure_connection,
+            open=False,
+        )
+        self.max_conn = max_conn
+        self.acquire_timeout = acquire_timeout
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.checkout_histogram = [0] * len(_CHECKOUT_BUCKETS)
+
+    async def acquire(self):
+        self.waiting += 1
+        start = monotonic()
+        try:
+            conn = await self.pool.getconn()
+        except TooManyRequests:
+            self.rejected += 1
+            raise
+        except PoolTimeout:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        self._record_checkout(monotonic() - start)
+        self.in_use += 1
+        return conn
+
+    async def release(self, conn):
+        self.in_use -= 1
+        await self.pool.putconn(conn)
+
+    def _record_checkout(self, seconds: float):
+        self.checkouts += 1
+        self.checkout_seconds_total += seconds
+        self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+        for i, bound in enumerate(_CHECKOUT_BUCKETS):
+            if seconds < bound:
+                self.checkout_histogram[i] += 1
+                break
+
+    def stats(self) -> dict:
+        return {
+            "max_conn": self.max_conn,
+            "in_use": self.in_use,
+            "open_connections": self.pool.get_stats().get("pool_size", 0),
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquire_timeout_seconds": self.acquire_timeout,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "checkout_seconds_avg": self.checkout_seconds_total / self.checkouts if self.checkouts else 0.0,
+            "checkout_seconds_max": self.checkout_seconds_max,
+            "checkout_seconds_histogram": {
+                f"<{bound}": count for bound, count in zip(_CHECKOUT_BUCKETS, self.checkout_histogram)
+            },
+        }
+
+
+# all pools are opened on the application startup and closed on shutdown
+_pools: dict[str, DatabasePool] = {}
+
+
+def mk_database(
+    dbname,
+    user,
+    password,
+    host,
+    port,
+    max_conn=DB_POOL_MAX_CONN,
+    acquire_timeout=DB_ACQUIRE_TIMEOUT_SECONDS,
+    max_waiting=DB_MAX_WAITING,
+    name=None,
+):
+    conn_pool = DatabasePool(
+        make_conninfo(dbname=dbname, user=user, password=password, host=host, port=port),
+        DB_POOL_MIN_CONN,
+        max_conn,
+        acquire_timeout,
+        max_waiting,
     )
+    _pools[name or dbname] = conn_pool
 
-    @contextmanager
-    def get_conn():
-        conn = None
+    @asynccontextmanager
+    async def get_conn():
         try:
-            conn = conn_pool.getconn()
-            with conn.cursor() as cursor:
-                yield conn, cursor
-        except PoolError:
+            conn = await conn_pool.acquire()
+        except TooManyRequests:
+            raise HTTPException(status_code=503, detail="Too many requests are waiting for a database connection")
+        except PoolTimeout:
             raise HTTPException(status_code=503, detail="All database connections are busy")
+        try:
+            async with conn.cursor() as cursor:
+                yield conn, cursor
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
         finally:
-            if conn is not None:
-                conn.commit()
-                conn_pool.putconn(conn)
+            await conn_pool.release(conn)
 
     return get_conn
 
 
+async def open_databases():
+    for conn_pool in _pools.values():
+        await conn_pool.pool.open()
+
+
+async def close_databases():
+    for conn_pool in _pools.values():
+        await conn_pool.pool.close()
+
+
+def get_pool_stats() -> dict:
+    return {dbname: conn_pool.stats() for dbname, conn_pool in _pools.items()}
+
+
 get_db = mk_database(dbname="edhub", user="postgres", password="12345678", host="system_db", port="5432")
 
 
@@ -40,6 +194,162 @@ get_storage_db = mk_database(
 )
 
 
+# Sends the reads of the read-only routes to the replica, unless the user
+# has just written something, the replica is too far behind the primary, or
+# it is unreachable; those reads go to the primary. The state is kept per
+# backend process.
+class ReplicaRouter:
+    _LAG_SQL = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+    """
+
+    # the expired write marks are dropped once there are this many of them
+    _MAX_WRITES = 10000
+
+    def __init__(self, get_replica_conn, sticky_seconds: float, max_lag: float, check_interval: float, retry: float):
+        self.get_replica_conn = get_replica_conn
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry = retry
+        self._writes = {}
+        self.lag_seconds = None
+        self.lag_ok = True
+        self.checked_at = float("-inf")
+        self.down_until = float("-inf")
+        self.replica_reads = 0
+        self.sticky_reads = 0
+        self.lagging_reads = 0
+        self.fallbacks = 0
+
+    def note_write(self, user_email: str):
+        now = monotonic()
+        self._writes[user_email] = now + self.sticky_seconds
+        if len(self._writes) > self._MAX_WRITES:
+            self._writes = {email: deadline for email, deadline in self._writes.items() if deadline > now}
+
+    def is_sticky(self, user_email) -> bool:
+        deadline = self._writes.get(user_email)
+        return deadline is not None and deadline > monotonic()
+
+    async def _check_lag(self, db_cursor) -> bool:
+        now = monotonic()
+        if now - self.checked_at >= self.check_interval:
+            await db_cursor.execute(self._LAG_SQL)
+            lag = (await db_cursor.fetchone())[0]
+            self.lag_seconds = None if lag is None else float(lag)
+            self.lag_ok = self.lag_seconds is not None and self.lag_seconds <= self.max_lag
+            self.checked_at = now
+        return self.lag_ok
+
+    # enters a replica connection into the stack, or returns None if the read must go to the primary
+    async def acquire(self, stack: AsyncExitStack, user_email):
+        if user_email is not None and self.is_sticky(user_email):
+            self.sticky_reads += 1
+            return None
+        if monotonic() < self.down_until:
+            self.fallbacks += 1
+            return None
+
+        replica_stack = AsyncExitStack()
+        try:
+            db = await replica_stack.enter_async_context(self.get_replica_conn())
+            db[1].replica = True
+            lag_ok = await self._check_lag(db[1])
+        except (HTTPException, DatabaseError):
+            # unreachable or busy, give it some time
+            try:
+                await replica_stack.aclose()
+            except DatabaseError:
+                pass
+            self.down_until = monotonic() + self.retry
+            self.fallbacks += 1
+            return None
+        if not lag_ok:
+            await replica_stack.aclose()
+            self.lagging_reads += 1
+            return None
+
+        await stack.enter_async_context(replica_stack)
+        self.replica_reads += 1
+        return db
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "replica_reads": self.replica_reads,
+            "sticky_reads": self.sticky_reads,
+            "lagging_reads": self.lagging_reads,
+            "fallbacks": self.fallbacks,
+            "lag_seconds": self.lag_seconds,
+            "replica_down": monotonic() < self.down_until,
+            "sticky_users": sum(deadline > monotonic() for deadline in self._writes.values()),
+        }
+
+
+replica_router = None
+if SYSTEM_DB_REPLICA_HOST:
+    replica_router = ReplicaRouter(
+        mk_database(
+            dbname="edhub",
+            user="postgres",
+            password="12345678",
+            host=SYSTEM_DB_REPLICA_HOST,
+            port=SYSTEM_DB_REPLICA_PORT,
+            acquire_timeout=REPLICA_ACQUIRE_TIMEOUT_SECONDS,
+            name="edhub_replica",
+        ),
+        REPLICA_STICKY_SECONDS,
+        REPLICA_MAX_LAG_SECONDS,
+        REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+        REPLICA_RETRY_SECONDS,
+    )
+
+
+def get_replica_stats() -> dict:
+    if replica_router is None:
+        return {"enabled": False}
+    return replica_router.stats()
+
+
+_READ_METHODS = ("GET", "HEAD")
+
+
+# the email from the bearer token of the request, without any checks of the user
+def _token_email(request: Request):
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("email")
+    except JWTError:
+        return None
+
+
+# FastAPI dependency: the one connection of the request, shared by
+# authentication and the route handler, and released once the route is done.
+# Read-only routes get a replica connection when there is a replica.
+async def get_request_db(request: Request):
+    user_email = _token_email(request) if replica_router is not None else None
+    try:
+        async with AsyncExitStack() as stack:
+            db = None
+            if replica_router is not None and request.method in _READ_METHODS:
+                db = await replica_router.acquire(stack, user_email)
+            request.state.db_replica = db is not None
+            if db is None:
+                db = await stack.enter_async_context(get_db())
+            yield db
+    finally:
+        # the next reads of the user must see this write
+        if replica_router is not None and request.method not in _READ_METHODS and user_email is not None:
+            replica_router.note_write(user_email)
+
+
 router = APIRouter()
 
 # setting for JWT and autorization
@@ -49,8 +359,65 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 pwd_hasher = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# settings for the cache of validated tokens
+TOKEN_CACHE_MAX_SIZE = 10000
+TOKEN_CACHE_TTL_SECONDS = 60
+
+
+# Bounded LRU cache of (email, token expiration) pairs whose user was found
+# in the database. An entry lives at most TTL seconds, which bounds how long
+# another worker process may keep accepting tokens of a deleted account.
+class TokenCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, user_email: str, expire_timestamp) -> bool:
+        key = (user_email, expire_timestamp)
+        deadline = self._entries.get(key)
+        if deadline is not None and deadline < monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            deadline = None
+        if deadline is None:
+            self.misses += 1
+            return False
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+    def add(self, user_email: str, expire_timestamp):
+        self._entries[(user_email, expire_timestamp)] = monotonic() + self.ttl
+        self._entries.move_to_end((user_email, expire_timestamp))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # forget all tokens of the user, so that a removed account is cut off immediately
+    def evict_user(self, user_email: str):
+        for key in [key for key in self._entries if key[0] == user_email]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+token_cache = TokenCache(TOKEN_CACHE_MAX_SIZE, TOKEN_CACHE_TTL_SECONDS)
+
+
+# (user_email, expire_timestamp) of a valid token
+def _decode_token(token: str) -> tuple[str, int]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         expire_timestamp = payload.get("exp")
@@ -67,12 +434,52 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except (JWTError, ValueError) as e:
         detail = str(e) if str(e) else "Invalid token"
         raise HTTPException(status_code=401, detail=detail)
+    return user_email, expire_timestamp
+
+
+async def _user_exists(db_cursor, user_email: str) -> bool:
+    await db_cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE email = %s)", (user_email,))
+    return (await db_cursor.fetchone())[0]
+
+
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: tuple = Depends(get_request_db),
+):
+    user_email, expire_timestamp = _decode_token(token)
+
+    # the user was found recently, no need to ask the database again
+    if token_cache.contains(user_email, expire_timestamp):
+        return user_email
 
     # checking whether such user exists
-    with get_db() as (db_conn, db_cursor):
-        db_cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE email = %s)", (user_email,))
-        user_exists = db_cursor.fetchone()[0]
-        if not user_exists:
-            raise HTTPException(status_code=401, detail="User not exists")
+    db_conn, db_cursor = db
+    user_exists = await _user_exists(db_cursor, user_email)
+    if not user_exists and request.state.db_replica:
+        # the account may be too new for the replica
+        async with get_db() as (primary_conn, primary_cursor):
+            user_exists = await _user_exists(primary_cursor, user_email)
+    if not user_exists:
+        raise HTTPException(status_code=401, detail="User not exists")
+
+    token_cache.add(user_email, expire_timestamp)
+    return user_email
+
+
+# the same as get_current_user for the routes that do not use the system database,
+# like the ones receiving long request bodies: the connection for the user check is
+# returned to the pool at once instead of being held until the response is sent
+async def get_current_user_unheld(token: str = Depends(oauth2_scheme)):
+    user_email, expire_timestamp = _decode_token(token)
+
+    if token_cache.contains(user_email, expire_timestamp):
+        return user_email
+
+    async with get_db() as (db_conn, db_cursor):
+        user_exists = await _user_exists(db_cursor, user_email)
+    if not user_exists:
+        raise HTTPException(status_code=401, detail="User not exists")
 
+    token_cache.add(user_email, expire_timestamp)
     return user_email
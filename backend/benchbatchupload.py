@@ -0,0 +1,92 @@
+#
+# Compares FILES single uploads with /create_material_attachment against one
+# /create_material_attachments request with the same number of files, through
+# the HTTP API of a running instance. Registers a throwaway user with a course
+# and a material for it:
+# `python benchbatchupload.py http://localhost/api`.
+#
+
+import argparse
+import json
+import os
+import uuid
+from time import perf_counter
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+FILES = 20
+FILE_SIZE = 64 * 1024
+ROUNDS = 5
+
+
+def call(api_url: str, method: str, path: str, params: dict = None, token: str = None, body=None, content_type=None):
+    url = f"{api_url}/{path}" + (f"?{urlencode(params)}" if params else "")
+    headers = {}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    if content_type is not None:
+        headers["Content-Type"] = content_type
+    with urlopen(Request(url, data=body, method=method, headers=headers)) as response:
+        return json.load(response)
+
+
+def multipart(field: str, files: list[tuple[str, bytes]]) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for filename, content in files:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return bytes(body), f"multipart/form-data; boundary={boundary}"
+
+
+def setup(api_url: str) -> tuple[str, dict]:
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "benchPass123!"
+    account = json.dumps({"email": email, "password": password, "name": "Bench"}).encode()
+    call(api_url, "POST", "create_user", body=account, content_type="application/json")
+    credentials = json.dumps({"email": email, "password": password}).encode()
+    token = call(api_url, "POST", "login", body=credentials, content_type="application/json")["access_token"]
+    course_id = call(api_url, "POST", "create_course", {"title": "Bench"}, token)["course_id"]
+    material = {"course_id": course_id, "title": "Bench", "description": "Bench"}
+    material_id = call(api_url, "POST", "create_material", material, token)["material_id"]
+    return token, {"course_id": course_id, "material_id": material_id}
+
+
+def random_files() -> list[tuple[str, bytes]]:
+    return [(f"file{i}.bin", os.urandom(FILE_SIZE)) for i in range(FILES)]
+
+
+def single_uploads(api_url: str, token: str, params: dict) -> float:
+    files = random_files()
+    start = perf_counter()
+    for file in files:
+        body, content_type = multipart("file", [file])
+        call(api_url, "POST", "create_material_attachment", params, token, body, content_type)
+    return perf_counter() - start
+
+
+def batch_upload(api_url: str, token: str, params: dict) -> float:
+    body, content_type = multipart("files", random_files())
+    start = perf_counter()
+    call(api_url, "POST", "create_material_attachments", params, token, body, content_type)
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single and batch attachment uploads.")
+    parser.add_argument("api_url", nargs="?", default="http://localhost/api")
+    args = parser.parse_args()
+
+    token, params = setup(args.api_url)
+    for name, upload in (("single", single_uploads), ("batch", batch_upload)):
+        seconds = min(upload(args.api_url, token, params) for _ in range(ROUNDS))
+        print(f"{name:>6}: {FILES} x {FILE_SIZE // 1024} KiB in {seconds * 1000:.0f} ms, {FILES / seconds:.0f} files/s")
+
+
+if __name__ == "__main__":
+    main()
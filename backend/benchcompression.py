@@ -0,0 +1,84 @@
+#
+# Measures what the compression of the postgres blob store saves and costs:
+# every file of a corpus directory is cut into chunks, the codec is probed
+# like on upload, and the chunks are encoded and decoded. Reports the stored
+# size and the CPU time per file extension, nothing touches the database:
+# `docker compose exec backend python benchcompression.py /path/to/corpus`.
+# Without a directory, the sources of the backend are used, together with
+# random files that stand for images and archives.
+#
+
+import argparse
+import os
+from collections import defaultdict
+from time import process_time
+from repo.blobs import CHUNK_SIZE, probe_codec, encode_chunk, decode_chunk
+
+RANDOM_FILES = 20
+RANDOM_FILE_SIZE = 1024 * 1024
+
+
+def corpus_files(root: str):
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            with open(path, "rb") as source:
+                yield os.path.splitext(filename)[1] or filename, source.read()
+
+
+def random_files():
+    for _ in range(RANDOM_FILES):
+        yield "(random)", os.urandom(RANDOM_FILE_SIZE)
+
+
+# (size, stored size, compressed files, encode seconds, decode seconds)
+def measure(content: bytes) -> tuple:
+    chunks = [content[offset:offset + CHUNK_SIZE] for offset in range(0, len(content), CHUNK_SIZE)]
+    start = process_time()
+    codec = "identity"
+    stored = []
+    for chunk in chunks:
+        if not stored:
+            codec, encoded = probe_codec(chunk)
+        else:
+            encoded = encode_chunk(codec, chunk)
+        stored.append(encoded)
+    encode_seconds = process_time() - start
+
+    start = process_time()
+    decoded = b"".join(decode_chunk(codec, chunk) for chunk in stored)
+    decode_seconds = process_time() - start
+    assert decoded == content
+
+    return len(content), sum(map(len, stored)), int(codec != "identity"), encode_seconds, decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the compression of the stored files.")
+    parser.add_argument("corpus", nargs="?", help="directory with the files to measure")
+    args = parser.parse_args()
+
+    files = corpus_files(args.corpus) if args.corpus else [*corpus_files("."), *random_files()]
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0.0, 0.0])
+    for extension, content in files:
+        for total in (totals[extension], totals["(all)"]):
+            total[0] += 1
+            for i, value in enumerate(measure(content)):
+                total[i + 1] += value
+
+    print(f"{'extension':<16}{'files':>8}{'compressed':>12}{'size KiB':>12}{'stored KiB':>12}"
+          f"{'ratio':>8}{'enc MiB/s':>11}{'dec MiB/s':>11}")
+    for extension, (count, size, stored_size, compressed, encode_seconds, decode_seconds) in sorted(
+        totals.items(), key=lambda item: -item[1][1]
+    ):
+        mib = size / 1024 / 1024
+        print(
+            f"{extension:<16}{count:>8}{compressed:>12}{size // 1024:>12}{stored_size // 1024:>12}"
+            f"{size / stored_size if stored_size else 1.0:>8.2f}"
+            f"{mib / encode_seconds if encode_seconds else 0.0:>11.0f}"
+            f"{mib / decode_seconds if decode_seconds else 0.0:>11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
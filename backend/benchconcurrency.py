@@ -0,0 +1,101 @@
+#
+# Measures the requests per second of a running instance at 50 and 200
+# concurrent clients. Every client keeps one connection open and sends
+# /get_course_feed requests one after another for DURATION seconds, as a
+# throwaway user with a course and a few materials:
+# `python benchconcurrency.py http://localhost/api`.
+# Run it once against a build of the commit before the async database layer
+# and once against the current one to compare them.
+#
+
+import argparse
+import asyncio
+import json
+import uuid
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+CLIENTS = (50, 200)
+DURATION = 10
+MATERIALS = 10
+
+
+def call(api_url: str, method: str, path: str, params: dict = None, token: str = None, body=None):
+    url = f"{api_url}/{path}" + (f"?{urlencode(params)}" if params else "")
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    with urlopen(Request(url, data=body, method=method, headers=headers)) as response:
+        return json.load(response)
+
+
+def setup(api_url: str) -> tuple[str, str]:
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "benchPass123!"
+    account = json.dumps({"email": email, "password": password, "name": "Bench"}).encode()
+    call(api_url, "POST", "create_user", body=account)
+    credentials = json.dumps({"email": email, "password": password}).encode()
+    token = call(api_url, "POST", "login", body=credentials)["access_token"]
+    course_id = call(api_url, "POST", "create_course", {"title": "Bench"}, token)["course_id"]
+    for i in range(MATERIALS):
+        material = {"course_id": course_id, "title": f"Bench {i}", "description": "Bench"}
+        call(api_url, "POST", "create_material", material, token)
+    return token, course_id
+
+
+async def read_response(reader) -> int:
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+# returns the numbers of the successful and the failed requests
+async def client(host: str, port: int, request: bytes, deadline: float) -> tuple[int, int]:
+    reader, writer = await asyncio.open_connection(host, port)
+    ok = failed = 0
+    try:
+        while perf_counter() < deadline:
+            writer.write(request)
+            await writer.drain()
+            if await read_response(reader) == 200:
+                ok += 1
+            else:
+                failed += 1
+    finally:
+        writer.close()
+    return ok, failed
+
+
+async def run(api_url: str, token: str, course_id: str, clients: int) -> tuple[float, int]:
+    url = urlsplit(api_url)
+    path = f"{url.path}/get_course_feed?{urlencode({'course_id': course_id})}"
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nAuthorization: Bearer {token}\r\n\r\n"
+    ).encode()
+    start = perf_counter()
+    results = await asyncio.gather(
+        *(client(url.hostname, url.port or 80, request, start + DURATION) for _ in range(clients))
+    )
+    seconds = perf_counter() - start
+    return sum(ok for ok, _ in results) / seconds, sum(failed for _, failed in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the requests per second at many concurrent clients.")
+    parser.add_argument("api_url", nargs="?", default="http://localhost/api")
+    args = parser.parse_args()
+
+    token, course_id = setup(args.api_url)
+    for clients in CLIENTS:
+        rps, failed = asyncio.run(run(args.api_url, token, course_id, clients))
+        print(f"{clients:>4} clients: {rps:.0f} requests/s, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
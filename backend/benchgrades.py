@@ -0,0 +1,96 @@
+#
+# Compares the grade table of a course of STUDENTS students and ASSIGNMENTS
+# assignments built the old way, with the grades from one query and the name
+# of every student from one more query each, against the single query of
+# repo.courses.sql_select_grade_table. The course is created inside the
+# transaction and rolled back at the end:
+# `docker compose exec backend python benchgrades.py`.
+#
+
+import asyncio
+from statistics import median
+from time import perf_counter
+from auth import get_db, open_databases, close_databases
+from migrate import migrate_all
+import repo.courses
+import repo.users
+
+STUDENTS = 1000
+ASSIGNMENTS = 100
+ROUNDS = 5
+
+# every student submitted 90% of the assignments, two thirds of them are graded
+SEED_SQL = f"""
+CREATE TEMP TABLE bench_course ON COMMIT DROP AS SELECT gen_random_uuid() AS courseid;
+
+INSERT INTO users (email, publicname, isadmin, timeregistered, passwordhash)
+SELECT 'bench' || i || '@example.com', 'Bench ' || i, 'f', now(), '' FROM generate_series(1, {STUDENTS}) AS i;
+
+INSERT INTO courses (courseid, name, timecreated) SELECT courseid, 'Bench', now() FROM bench_course;
+
+INSERT INTO student_at (email, courseid)
+SELECT 'bench' || i || '@example.com', courseid FROM generate_series(1, {STUDENTS}) AS i, bench_course;
+
+INSERT INTO course_assignments (courseid, assid, timeadded, author, name, description)
+SELECT courseid, i, now(), NULL, 'Bench ' || i, '' FROM generate_series(1, {ASSIGNMENTS}) AS i, bench_course;
+
+INSERT INTO course_assignments_submissions (courseid, assid, email, timeadded, timemodified, comment, grade, gradedby)
+SELECT
+    courseid, a, 'bench' || s || '@example.com', now(), now(), '',
+    CASE WHEN (a + s) % 3 > 0 THEN (a * s) % 100 END, NULL
+FROM generate_series(1, {STUDENTS}) AS s, generate_series(1, {ASSIGNMENTS}) AS a, bench_course
+WHERE (a * 7 + s) % 10 > 0;
+"""
+
+
+async def old_table(cur, course_id, students, assignments):
+    await cur.execute(
+        "SELECT email, assid, grade FROM course_assignments_submissions "
+        "WHERE courseid = %s AND email = ANY(%s) AND assid = ANY(%s)",
+        (course_id, students, assignments),
+    )
+    values = await cur.fetchall()
+    rowindex = {email: i for i, email in enumerate(students)}
+    colindex = {assignment: i for i, assignment in enumerate(assignments)}
+    table = [[None] * len(assignments) for _ in students]
+    for email, assignment, grade in values:
+        table[rowindex[email]][colindex[assignment]] = grade
+    return [(email, await repo.users.sql_get_user_name(cur, email), row) for email, row in zip(students, table)]
+
+
+async def new_table(cur, course_id, students, assignments):
+    return await repo.courses.sql_select_grade_table(cur, course_id, students, assignments)
+
+
+async def main():
+    await open_databases()
+    try:
+        await migrate_all()
+        async with get_db() as (conn, cur):
+            try:
+                await cur.execute(SEED_SQL)
+                await cur.execute("SELECT courseid FROM bench_course")
+                course_id = (await cur.fetchone())[0]
+                students = [f"bench{i}@example.com" for i in range(1, STUDENTS + 1)]
+                assignments = list(range(1, ASSIGNMENTS + 1))
+
+                tables = {}
+                for name, build in (("per-student names", old_table), ("single query", new_table)):
+                    timings = []
+                    for _ in range(ROUNDS):
+                        cur.memo.invalidate()
+                        start = perf_counter()
+                        tables[name] = await build(cur, course_id, students, assignments)
+                        timings.append(perf_counter() - start)
+                    print(f"{name:>17}: median {median(timings) * 1000:.1f} ms for {STUDENTS} x {ASSIGNMENTS}")
+                assert [tuple(row) for row in tables["single query"]] == [
+                    tuple(row) for row in tables["per-student names"]
+                ]
+            finally:
+                await conn.rollback()
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
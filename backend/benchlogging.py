@@ -0,0 +1,63 @@
+#
+# Measures what logging adds to the latency of a write request: every
+# iteration runs a small write transaction like the endpoints do, then logs
+# it once with the synchronous logger (its own INSERT and commit) and once
+# with logic.logging.log_writer. The batched records are flushed at the end
+# and the time is reported apart. The records are deleted afterwards:
+# `docker compose exec backend python benchlogging.py`.
+#
+
+import asyncio
+from statistics import median, quantiles
+from time import perf_counter
+from auth import get_db, open_databases, close_databases
+from migrate import migrate_all
+import logic.logging
+import repo.logging
+
+ITERATIONS = 2000
+TAG = "bench logging"
+
+
+async def write_request(log):
+    start = perf_counter()
+    async with get_db() as (conn, cur):
+        await cur.execute("SELECT pg_advisory_xact_lock(0)")
+        await conn.commit()
+        await log(conn, cur)
+    return perf_counter() - start
+
+
+async def log_synchronously(conn, cur):
+    await repo.logging.sql_insert_log(cur, TAG, "synchronous")
+    await conn.commit()
+
+
+async def log_batched(conn, cur):
+    logic.logging.log(TAG, "batched")
+
+
+def report(name: str, latencies: list[float]):
+    p99 = quantiles(latencies, n=100)[98]
+    print(f"{name:>12}: median {median(latencies) * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms")
+
+
+async def main():
+    await open_databases()
+    try:
+        await migrate_all()
+        report("synchronous", [await write_request(log_synchronously) for _ in range(ITERATIONS)])
+        report("batched", [await write_request(log_batched) for _ in range(ITERATIONS)])
+
+        start = perf_counter()
+        await logic.logging.log_writer.flush()
+        print(f"flushing {ITERATIONS} batched records took {(perf_counter() - start) * 1000:.1f} ms")
+
+        async with get_db() as (conn, cur):
+            await cur.execute("DELETE FROM logs WHERE tag = %s", (TAG,))
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+#
+# Measures the latency of constraints.assert_course_access and
+# repo.submissions.sql_select_submissions with and without prepared
+# statements. The data comes from indexcheck.SEED_SQL and is rolled back
+# at the end: `docker compose exec backend python benchprepared.py`.
+#
+
+import asyncio
+from statistics import mean, median
+from time import perf_counter
+from auth import get_db, open_databases, close_databases
+from indexcheck import SEED_SQL, select_sample
+from migrate import migrate_all
+import constraints
+import repo.submissions
+
+ITERATIONS = 2000
+
+
+async def measure(cur, run_query) -> list[float]:
+    res = []
+    for _ in range(ITERATIONS):
+        # the request memo would answer the repeated access checks itself
+        cur.memo.invalidate()
+        start = perf_counter()
+        await run_query()
+        res.append(perf_counter() - start)
+    return res
+
+
+async def main():
+    await open_databases()
+    try:
+        await migrate_all()
+        async with get_db() as (conn, cur):
+            try:
+                await cur.execute(SEED_SQL)
+                course_id, student, _, assignment_id, _, _ = await select_sample(cur)
+                queries = {
+                    "constraints.assert_course_access": lambda: constraints.assert_course_access(
+                        cur, student, course_id
+                    ),
+                    "submissions.sql_select_submissions": lambda: repo.submissions.sql_select_submissions(
+                        cur, course_id, assignment_id
+                    ),
+                }
+                default_threshold = conn.prepare_threshold
+                for name, run_query in queries.items():
+                    for prepared in (False, True):
+                        # a None threshold turns prepared statements off for the connection
+                        conn.prepare_threshold = default_threshold if prepared else None
+                        await run_query()  # warm up
+                        timings = await measure(cur, run_query)
+                        print(
+                            f"{name} {'prepared' if prepared else 'text':>8}: "
+                            f"mean {mean(timings) * 1e6:.0f} us, median {median(timings) * 1e6:.0f} us"
+                        )
+                conn.prepare_threshold = default_threshold
+            finally:
+                await conn.rollback()
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+#
+# Measures the memory that logic.uploading.careful_upload needs: uploads
+# a MAX_SIZE file into the storage database, once and then from CONCURRENT
+# requests at once, and reports the peak of Python allocations. Nothing is
+# kept, the uploads are rolled back:
+# `docker compose exec backend python benchupload.py`.
+#
+
+import asyncio
+import os
+import tracemalloc
+from tempfile import NamedTemporaryFile
+from fastapi import UploadFile
+from auth import get_storage_db, open_databases, close_databases
+from migrate import migrate_all
+from logic.uploading import careful_upload, CHUNK_SIZE, MAX_SIZE
+
+CONCURRENT = 50
+
+
+# a file on disk, like the spooled files of the multipart parser
+def make_source_file():
+    source = NamedTemporaryFile()
+    for _ in range(MAX_SIZE // CHUNK_SIZE):
+        source.write(os.urandom(CHUNK_SIZE))
+    source.flush()
+    return source
+
+
+async def upload(source_path: str):
+    with open(source_path, "rb") as source:
+        async with get_storage_db() as (conn, cur):
+            try:
+                await careful_upload(cur, UploadFile(source, filename="bench.bin"))
+            finally:
+                await conn.rollback()
+
+
+async def measure(source_path: str, uploads: int) -> int:
+    tracemalloc.start()
+    await asyncio.gather(*(upload(source_path) for _ in range(uploads)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+async def main():
+    await open_databases()
+    try:
+        await migrate_all()
+        with make_source_file() as source:
+            for uploads in (1, CONCURRENT):
+                peak = await measure(source.name, uploads)
+                print(
+                    f"{uploads} x {MAX_SIZE // 1024} KiB uploads: peak {peak // 1024} KiB, "
+                    f"{peak // uploads // 1024} KiB per upload (chunk {CHUNK_SIZE // 1024} KiB)"
+                )
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+#
+# Runs one pass of the garbage collector of the storage database (see
+# logic/blobgc.py) and reports what it reclaimed. The backend runs the
+# passes by itself, this script is for running one by hand, e.g.
+# `docker compose exec backend python blobgc.py --grace-seconds 600`.
+#
+
+import argparse
+import asyncio
+import logic.blobgc
+from auth import open_databases, close_databases
+from migrate import migrate_all
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Collect the unused files of the storage database.")
+    parser.add_argument("--grace-seconds", type=float, default=logic.blobgc.BLOB_GC_GRACE_SECONDS)
+    args = parser.parse_args()
+
+    await open_databases()
+    try:
+        await migrate_all()
+        counters = await logic.blobgc.collect_garbage(args.grace_seconds)
+        if counters["skipped"]:
+            print("Another process is collecting the garbage at the moment")
+        print(logic.blobgc.describe(counters))
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
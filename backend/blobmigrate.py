@@ -0,0 +1,84 @@
+#
+# Moves the contents of the files to another blob store while the backend
+# keeps running, e.g. `docker compose exec backend python blobmigrate.py --to disk`.
+#
+# Every file is copied and switched to the new store in its own transaction,
+# with its row locked, so that a concurrent release waits for the switch and
+# then deletes the copy in the new store. The old copies are deleted only after
+# GRACE_SECONDS, when the downloads that started before the switch are over.
+#
+
+import argparse
+import asyncio
+from auth import get_storage_db, open_databases, close_databases
+from migrate import migrate_all
+import repo.files as repo_files
+from repo.blobs import BLOB_STORES, get_blob_store, remove_blobs
+
+BATCH_SIZE = 100
+GRACE_SECONDS = 60
+FIRST_FILE_ID = "00000000-0000-0000-0000-000000000000"
+
+
+# returns the backend the file was moved from, or None if there is nothing to move
+async def move_file(file_id: str, target) -> str:
+    async with get_storage_db() as (conn, cur):
+        source_name = await repo_files.sql_lock_file(cur, file_id)
+        if source_name is None or source_name == target.name:
+            return None
+        # leftovers of an earlier move of the file to the target
+        await target.delete(cur, file_id)
+        await target.write(cur, file_id, get_blob_store(source_name).read(file_id))
+        await repo_files.sql_update_file_backend(cur, file_id, target.name)
+    return source_name
+
+
+async def delete_sources(moved_files):
+    async with get_storage_db() as (conn, cur):
+        for file_id, source_name in moved_files:
+            await get_blob_store(source_name).delete(cur, file_id)
+    await remove_blobs(moved_files)
+
+
+async def migrate_blobs(target_name: str, batch_size: int, grace_seconds: float):
+    target = get_blob_store(target_name)
+    last_file_id = FIRST_FILE_ID
+    moved_total = 0
+    while True:
+        async with get_storage_db() as (conn, cur):
+            file_ids = await repo_files.sql_select_files_to_migrate(cur, target.name, last_file_id, batch_size)
+        if not file_ids:
+            break
+        last_file_id = file_ids[-1]
+
+        moved_files = []
+        for file_id in file_ids:
+            source_name = await move_file(file_id, target)
+            if source_name is not None:
+                moved_files.append((file_id, source_name))
+        if not moved_files:
+            continue
+
+        await asyncio.sleep(grace_seconds)
+        await delete_sources(moved_files)
+        moved_total += len(moved_files)
+        print(f"Moved {moved_total} files to {target.name}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move the contents of the files to another blob store.")
+    parser.add_argument("--to", required=True, choices=sorted(BLOB_STORES), help="the blob store to move to")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--grace-seconds", type=float, default=GRACE_SECONDS)
+    args = parser.parse_args()
+
+    await open_databases()
+    try:
+        await migrate_all()
+        await migrate_blobs(args.to, args.batch_size, args.grace_seconds)
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,10 @@
 from fastapi import HTTPException
 from typing import Union
-import repo.parents
+from collections import OrderedDict
+from time import monotonic
+from uuid import UUID
+import repo.access
+from memo import MISSING
 
 #
 # value_assert_ functions all return None if no problems were found and the
@@ -14,385 +18,614 @@ import repo.parents
 # check is successful, or False if the arguments were invalid or
 # if the check failed.
 #
+# CourseAccess holds everything the checks need to know about one user in
+# one course. resolve_course_access fetches it for several users with one
+# query, so the logic layer can run all of its checks without going back
+# to the database. The module-level functions are thin wrappers around it.
+#
+# All answers are remembered in the memo of the cursor (see memo.py) for the
+# rest of the request, until the request writes something.
+#
+# The roles of a user in a course are also kept in role_cache between
+# requests. The logic functions that change roles invalidate it.
+#
+
+# settings for the role cache
+ROLE_CACHE_MAX_SIZE = 50000
+ROLE_CACHE_TTL_SECONDS = 60
+# roles read from the replica are not cached for this long after an
+# invalidation, as the replica may not have seen the change yet
+ROLE_CACHE_REPLICA_GUARD_SECONDS = 5
+
+
+# Bounded LRU cache of the role part of the course access rows, keyed by
+# (email, course_id) with the course ID from normalize_course_id, which the
+# invalidations must use as well. An entry lives at most TTL seconds, which bounds how
+# long another worker process may use roles changed by this one. Every
+# invalidation starts a new generation; a role read in an older one may
+# predate the change and is not put.
+class RoleCache:
+    def __init__(self, max_size: int, ttl: float, replica_guard: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.replica_guard = replica_guard
+        self._entries = OrderedDict()
+        self._invalidated_at = float("-inf")
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # (course_exists, user_exists, is_admin, is_teacher, is_student, children) or MISSING
+    def get(self, user_email, course_id):
+        key = (user_email, course_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    # generation is the one from before the role was read
+    def put(self, user_email, course_id, role, from_replica: bool, generation: int):
+        if generation != self.generation:
+            return
+        now = monotonic()
+        if from_replica and now - self._invalidated_at < self.replica_guard:
+            return
+        self._entries[(user_email, course_id)] = (now + self.ttl, role)
+        self._entries.move_to_end((user_email, course_id))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _drop(self, keys):
+        for key in keys:
+            del self._entries[key]
+            self.invalidations += 1
+        self.generation += 1
+        self._invalidated_at = monotonic()
+
+    # the user got or lost a role in the course
+    def invalidate(self, user_email: str, course_id: str):
+        self._drop([key for key in [(user_email, course_id)] if key in self._entries])
+
+    # the student left the course, so their parents there lost a child too
+    def invalidate_student(self, student_email: str, course_id: str):
+        self._drop(
+            [
+                key
+                for key, (_, role) in self._entries.items()
+                if key[1] == course_id and (key[0] == student_email or student_email in role[5])
+            ]
+        )
+
+    def invalidate_course(self, course_id: str):
+        self._drop([key for key in self._entries if key[1] == course_id])
+
+    # the user was removed or became an admin
+    def invalidate_user(self, user_email: str):
+        self._drop([key for key, (_, role) in self._entries.items() if key[0] == user_email or user_email in role[5]])
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+role_cache = RoleCache(ROLE_CACHE_MAX_SIZE, ROLE_CACHE_TTL_SECONDS, ROLE_CACHE_REPLICA_GUARD_SECONDS)
+
+
+class CourseAccess:
+    def __init__(self, user_email: str, assignment_id_valid: bool, material_id_valid: bool, row):
+        self.user_email = user_email
+        self.assignment_id_valid = assignment_id_valid
+        self.material_id_valid = material_id_valid
+        (
+            self.course_exists,
+            self.assignment_exists,
+            self.material_exists,
+            self.user_exists,
+            self.is_admin,
+            self.is_teacher,
+            self.is_student,
+            self.has_submitted,
+            children,
+        ) = row
+        self.children = set(children)
+        self.is_parent = len(self.children) > 0
+
+    # checking whether the user exists in our LMS
+    def value_assert_user_exists(self) -> Union[None, HTTPException]:
+        if not self.user_exists:
+            return HTTPException(status_code=404, detail="No user with provided email")
+        return None
+
+    def assert_user_exists(self):
+        err = self.value_assert_user_exists()
+        if err is not None:
+            raise err
+
+    # checking whether the course exists in our LMS
+    def value_assert_course_exists(self) -> Union[None, HTTPException]:
+        if not self.course_exists:
+            return HTTPException(status_code=404, detail="No course with provided ID")
+        return None
+
+    def assert_course_exists(self):
+        err = self.value_assert_course_exists()
+        if err is not None:
+            raise err
+
+    # checking whether the material exists in the course
+    def value_assert_material_exists(self) -> Union[None, HTTPException]:
+        if not self.material_id_valid:
+            return HTTPException(status_code=400, detail="Material ID should be integer")
+        err = self.value_assert_course_exists()
+        if err is not None:
+            return err
+        if not self.material_exists:
+            return HTTPException(status_code=404, detail="No material with provided ID in this course")
+        return None
+
+    def assert_material_exists(self):
+        err = self.value_assert_material_exists()
+        if err is not None:
+            raise err
+
+    # checking whether the assignment exists in the course
+    def value_assert_assignment_exists(self) -> Union[None, HTTPException]:
+        if not self.assignment_id_valid:
+            return HTTPException(status_code=400, detail="Assignment ID should be integer")
+        err = self.value_assert_course_exists()
+        if err is not None:
+            return err
+        if not self.assignment_exists:
+            return HTTPException(status_code=404, detail="No assignment with provided ID in this course")
+        return None
+
+    def assert_assignment_exists(self):
+        err = self.value_assert_assignment_exists()
+        if err is not None:
+            raise err
+
+    def _value_assert_role(self, has_role: bool, detail: str) -> Union[None, HTTPException]:
+        err = self.value_assert_user_exists()
+        if err is not None:
+            return err
+        err = self.value_assert_course_exists()
+        if err is not None:
+            return err
+        if not (has_role or self.is_admin):
+            return HTTPException(status_code=403, detail=detail)
+        return None
+
+    # checking whether the user has general access to the course
+    def value_assert_course_access(self) -> Union[None, HTTPException]:
+        return self._value_assert_role(
+            self.is_teacher or self.is_student or self.is_parent, "User does not have access to this course"
+        )
+
+    def assert_course_access(self):
+        err = self.value_assert_course_access()
+        if err is not None:
+            raise err
+
+    def check_course_access(self) -> bool:
+        return self.value_assert_course_access() is None
+
+    # checking whether the user has teacher access to the course
+    def value_assert_teacher_access(self) -> Union[None, HTTPException]:
+        return self._value_assert_role(self.is_teacher, "User has no teacher rights in this course")
+
+    def assert_teacher_access(self):
+        err = self.value_assert_teacher_access()
+        if err is not None:
+            raise err
+
+    def check_teacher_access(self) -> bool:
+        return self.value_assert_teacher_access() is None
+
+    # checking whether the user has student access to the course
+    def value_assert_student_access(self) -> Union[None, HTTPException]:
+        return self._value_assert_role(self.is_student, "User has no student rights in this course")
+
+    def assert_student_access(self):
+        err = self.value_assert_student_access()
+        if err is not None:
+            raise err
+
+    def check_student_access(self) -> bool:
+        return self.value_assert_student_access() is None
+
+    # checking whether the user has parent access to the course
+    def value_assert_parent_access(self) -> Union[None, HTTPException]:
+        return self._value_assert_role(self.is_parent, "User has no parental access in this course")
+
+    def assert_parent_access(self):
+        err = self.value_assert_parent_access()
+        if err is not None:
+            raise err
+
+    def check_parent_access(self) -> bool:
+        return self.value_assert_parent_access() is None
+
+    # checking whether the user has parent access with the student in the course
+    def value_assert_parent_student_access(self, student: "CourseAccess") -> Union[None, HTTPException]:
+        err = self.value_assert_user_exists()
+        if err is not None:
+            return err
+        err = student.value_assert_user_exists()
+        if err is not None:
+            return err
+        err = self.value_assert_course_exists()
+        if err is not None:
+            return err
+        if not (student.user_email in self.children or self.is_admin):
+            return HTTPException(status_code=403, detail="User has no parental access to this student's course")
+        return None
+
+    def assert_parent_student_access(self, student: "CourseAccess"):
+        err = self.value_assert_parent_student_access(student)
+        if err is not None:
+            raise err
+
+    def check_parent_student_access(self, student: "CourseAccess") -> bool:
+        return self.value_assert_parent_student_access(student) is None
+
+    # checking if this user (as a student) made a submission to the assignment
+    def value_assert_submission_exists(self) -> Union[None, HTTPException]:
+        err = self.value_assert_assignment_exists()
+        if err is not None:
+            return err
+        # check if the student is enrolled to course
+        if not self.check_student_access():
+            return HTTPException(status_code=403, detail="Provided user in not a student at this course")
+        if not self.has_submitted:
+            return HTTPException(
+                status_code=404, detail="The given student has not made a submission to this assignment"
+            )
+        return None
+
+    def assert_submission_exists(self):
+        err = self.value_assert_submission_exists()
+        if err is not None:
+            raise err
+
+    # checking whether the user is a parent of all the students at the course
+    def value_assert_parent_of_all(self, students: list["CourseAccess"]) -> Union[None, HTTPException]:
+        err = self.value_assert_user_exists()
+        if err is not None:
+            return err
+        err = self.value_assert_course_exists()
+        if err is not None:
+            return err
+        if self.is_admin:
+            return None
+        for student in students:
+            err = student.value_assert_user_exists()
+            if err is not None:
+                return err
+            if student.user_email not in self.children:
+                return HTTPException(403, "User has no parental access to this student")
+        return None
+
+    def assert_parent_of_all(self, students: list["CourseAccess"]):
+        err = self.value_assert_parent_of_all(students)
+        if err is not None:
+            raise err
+
+    # getting info about the roles
+    def role(self) -> dict:
+        return {
+            "is_teacher": self.check_teacher_access(),
+            "is_student": self.check_student_access(),
+            "is_parent": self.check_parent_access(),
+            "is_admin": self.is_admin,
+        }
+
+
+def _parse_id(value) -> tuple[Union[int, None], bool]:
+    if value is None:
+        return None, True
+    try:
+        return int(value), True
+    except ValueError:
+        return None, False
+
+
+# the one spelling of the course ID the memo and role_cache keys use: Postgres
+# also takes the same UUID in upper case, without hyphens or in braces
+def normalize_course_id(course_id) -> str:
+    try:
+        return str(UUID(str(course_id)))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="No course with provided ID")
+
+
+# fetching the access info of every provided user in the course, with a single query
+async def resolve_course_access(
+    db_cursor, course_id: str, *user_emails: Union[str, None], assignment_id=None, material_id=None
+) -> list[CourseAccess]:
+    course_id = normalize_course_id(course_id)
+    assignment_id, assignment_id_valid = _parse_id(assignment_id)
+    material_id, material_id_valid = _parse_id(material_id)
+
+    rows = {}
+    for email in user_emails:
+        row = db_cursor.memo.get(("access", course_id, assignment_id, material_id, email))
+        if row is MISSING and assignment_id is None and material_id is None:
+            # without an assignment or a material, the roles are the whole row
+            role = role_cache.get(email, course_id)
+            if role is not MISSING:
+                course_exists, user_exists, is_admin, is_teacher, is_student, children = role
+                row = (course_exists, False, False, user_exists, is_admin, is_teacher, is_student, False, children)
+                db_cursor.memo.put(("access", course_id, assignment_id, material_id, email), row)
+        if row is not MISSING:
+            rows[email] = row
+    missing = [email for email in dict.fromkeys(user_emails) if email not in rows]
+    if missing:
+        generation = role_cache.generation
+        fetched = await repo.access.sql_select_course_access(db_cursor, course_id, missing, assignment_id, material_id)
+        for email, row in zip(missing, fetched):
+            db_cursor.memo.put(("access", course_id, assignment_id, material_id, email), row)
+            course_exists, _, _, user_exists, is_admin, is_teacher, is_student, _, children = row
+            role_cache.put(
+                email,
+                course_id,
+                (course_exists, user_exists, is_admin, is_teacher, is_student, tuple(children)),
+                db_cursor.replica,
+                generation,
+            )
+            rows[email] = row
+
+    return [CourseAccess(email, assignment_id_valid, material_id_valid, rows[email]) for email in user_emails]
 
 
 # checking whether the user exists in our LMS
-def value_assert_user_exists(db_cursor, user_email: str) -> Union[None, HTTPException]:
-    db_cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE email = %s)", (user_email,))
-    user_exists = db_cursor.fetchone()[0]
+async def value_assert_user_exists(db_cursor, user_email: str) -> Union[None, HTTPException]:
+    user_exists = db_cursor.memo.get(("user", user_email))
+    if user_exists is MISSING:
+        await db_cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE email = %s)", (user_email,))
+        user_exists = (await db_cursor.fetchone())[0]
+        db_cursor.memo.put(("user", user_email), user_exists)
     if not user_exists:
         return HTTPException(status_code=404, detail="No user with provided email")
     return None
 
 
 # checking whether the user exists in our LMS
-def assert_user_exists(db_cursor, user_email: str):
-    err = value_assert_user_exists(db_cursor, user_email)
+async def assert_user_exists(db_cursor, user_email: str):
+    err = await value_assert_user_exists(db_cursor, user_email)
     if err is not None:
         raise err
 
 
 # checking whether the user exists in our LMS
-def check_user_exists(db_cursor, user_email: str) -> bool:
-    return value_assert_user_exists(db_cursor, user_email) is None
+async def check_user_exists(db_cursor, user_email: str) -> bool:
+    return await value_assert_user_exists(db_cursor, user_email) is None
 
 
 # checking whether the course exists in our LMS
-def value_assert_course_exists(db_cursor, course_id: str) -> Union[None, HTTPException]:
-    db_cursor.execute("SELECT EXISTS(SELECT 1 FROM courses WHERE courseid = %s)", (course_id,))
-    course_exists = db_cursor.fetchone()[0]
+async def value_assert_course_exists(db_cursor, course_id: str) -> Union[None, HTTPException]:
+    course_exists = db_cursor.memo.get(("course", course_id))
+    if course_exists is MISSING:
+        await db_cursor.execute("SELECT EXISTS(SELECT 1 FROM courses WHERE courseid = %s)", (course_id,))
+        course_exists = (await db_cursor.fetchone())[0]
+        db_cursor.memo.put(("course", course_id), course_exists)
     if not course_exists:
         return HTTPException(status_code=404, detail="No course with provided ID")
     return None
 
 
 # checking whether the course exists in our LMS
-def assert_course_exists(db_cursor, course_id: str):
-    err = value_assert_course_exists(db_cursor, course_id)
+async def assert_course_exists(db_cursor, course_id: str):
+    err = await value_assert_course_exists(db_cursor, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the course exists in our LMS
-def check_course_exists(db_cursor, course_id: str) -> bool:
-    return value_assert_course_exists(db_cursor, course_id) is None
+async def check_course_exists(db_cursor, course_id: str) -> bool:
+    return await value_assert_course_exists(db_cursor, course_id) is None
 
 
 # checking whether the material exists in the course
-def value_assert_material_exists(db_cursor, course_id: str, material_id: str) -> Union[None, HTTPException]:
-    try:
-        material_id = int(material_id)
-    except ValueError:
-        return HTTPException(status_code=400, detail="Material ID should be integer")
-
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM course_materials WHERE courseid = %s AND matid = %s)", (course_id, material_id)
-    )
-    material_exists = db_cursor.fetchone()[0]
-    if not material_exists:
-        return HTTPException(status_code=404, detail="No material with provided ID in this course")
-    return None
+async def value_assert_material_exists(db_cursor, course_id: str, material_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, None, material_id=material_id)
+    return access.value_assert_material_exists()
 
 
 # checking whether the material exists in the course
-def assert_material_exists(db_cursor, course_id: str, material_id: str):
-    err = value_assert_material_exists(db_cursor, course_id, material_id)
+async def assert_material_exists(db_cursor, course_id: str, material_id: str):
+    err = await value_assert_material_exists(db_cursor, course_id, material_id)
     if err is not None:
         raise err
 
 
 # checking whether the material exists in the course
-def check_material_exists(db_cursor, course_id: str, material_id: str) -> bool:
-    return value_assert_material_exists(db_cursor, course_id, material_id) is None
+async def check_material_exists(db_cursor, course_id: str, material_id: str) -> bool:
+    return await value_assert_material_exists(db_cursor, course_id, material_id) is None
 
 
 # checking whether the assignment exists in the course
-def value_assert_assignment_exists(db_cursor, course_id: str, assignment_id: str) -> Union[None, HTTPException]:
-    try:
-        assignment_id = int(assignment_id)
-    except ValueError:
-        return HTTPException(status_code=400, detail="Assignment ID should be integer")
-
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM course_assignments WHERE courseid = %s AND assid = %s)",
-        (course_id, assignment_id),
-    )
-    assignment_exists = db_cursor.fetchone()[0]
-    if not assignment_exists:
-        return HTTPException(status_code=404, detail="No assignment with provided ID in this course")
-    return None
+async def value_assert_assignment_exists(db_cursor, course_id: str, assignment_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, None, assignment_id=assignment_id)
+    return access.value_assert_assignment_exists()
 
 
 # checking whether the assignment exists in the course
-def assert_assignment_exists(db_cursor, course_id: str, assignment_id: str):
-    err = value_assert_assignment_exists(db_cursor, course_id, assignment_id)
+async def assert_assignment_exists(db_cursor, course_id: str, assignment_id: str):
+    err = await value_assert_assignment_exists(db_cursor, course_id, assignment_id)
     if err is not None:
         raise err
 
 
 # checking whether the assignment exists in the course
-def check_assignment_exists(db_cursor, course_id: str, assignment_id: str) -> bool:
-    return value_assert_assignment_exists(db_cursor, course_id, assignment_id) is None
+async def check_assignment_exists(db_cursor, course_id: str, assignment_id: str) -> bool:
+    return await value_assert_assignment_exists(db_cursor, course_id, assignment_id) is None
 
 
 # checking whether the user has general access to the course,
-def value_assert_course_access(db_cursor, user_email: str, course_id: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, user_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        """
-        SELECT EXISTS(
-            SELECT 1 FROM teaches WHERE email = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM student_at WHERE email = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM parent_of_at_course WHERE parentemail = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM users WHERE email = %s AND isadmin
-        )
-    """,
-        (user_email, course_id, user_email, course_id, user_email, course_id, user_email),
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
-        return HTTPException(status_code=403, detail="User does not have access to this course")
-    return None
+async def value_assert_course_access(db_cursor, user_email: str, course_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, user_email)
+    return access.value_assert_course_access()
 
 
 # checking whether the user has general access to the course,
-def assert_course_access(db_cursor, user_email: str, course_id: str):
-    err = value_assert_course_access(db_cursor, user_email, course_id)
+async def assert_course_access(db_cursor, user_email: str, course_id: str):
+    err = await value_assert_course_access(db_cursor, user_email, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the user has general access to the course,
-def check_course_access(db_cursor, user_email: str, course_id: str) -> bool:
-    return value_assert_course_access(db_cursor, user_email, course_id) is None
+async def check_course_access(db_cursor, user_email: str, course_id: str) -> bool:
+    return await value_assert_course_access(db_cursor, user_email, course_id) is None
 
 
 # checking whether the user has teacher access to the course
-def value_assert_teacher_access(db_cursor, teacher_email: str, course_id: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, teacher_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        """
-        SELECT EXISTS(
-            SELECT 1 FROM teaches WHERE email = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM users WHERE email = %s AND isadmin
-        )
-    """,
-        (teacher_email, course_id, teacher_email),
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
-        return HTTPException(status_code=403, detail="User has no teacher rights in this course")
-    return None
+async def value_assert_teacher_access(db_cursor, teacher_email: str, course_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, teacher_email)
+    return access.value_assert_teacher_access()
 
 
 # checking whether the user has teacher access to the course
-def assert_teacher_access(db_cursor, teacher_email: str, course_id: str):
-    err = value_assert_teacher_access(db_cursor, teacher_email, course_id)
+async def assert_teacher_access(db_cursor, teacher_email: str, course_id: str):
+    err = await value_assert_teacher_access(db_cursor, teacher_email, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the user has teacher access to the course
-def check_teacher_access(db_cursor, teacher_email: str, course_id: str) -> bool:
-    return value_assert_teacher_access(db_cursor, teacher_email, course_id) is None
+async def check_teacher_access(db_cursor, teacher_email: str, course_id: str) -> bool:
+    return await value_assert_teacher_access(db_cursor, teacher_email, course_id) is None
 
 
 # checking whether the user has student access to the course
-def value_assert_student_access(db_cursor, student_email: str, course_id: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, student_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        """
-        SELECT EXISTS(
-            SELECT 1 FROM student_at WHERE email = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM users WHERE email = %s AND isadmin
-        )
-    """,
-        (student_email, course_id, student_email),
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
-        return HTTPException(status_code=403, detail="User has no student rights in this course")
-    return None
+async def value_assert_student_access(db_cursor, student_email: str, course_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, student_email)
+    return access.value_assert_student_access()
 
 
 # checking whether the user has student access to the course
-def assert_student_access(db_cursor, student_email: str, course_id: str):
-    err = value_assert_student_access(db_cursor, student_email, course_id)
+async def assert_student_access(db_cursor, student_email: str, course_id: str):
+    err = await value_assert_student_access(db_cursor, student_email, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the user has student access to the course
-def check_student_access(db_cursor, student_email: str, course_id: str) -> bool:
-    return value_assert_student_access(db_cursor, student_email, course_id) is None
+async def check_student_access(db_cursor, student_email: str, course_id: str) -> bool:
+    return await value_assert_student_access(db_cursor, student_email, course_id) is None
 
 
 # checking whether the user has parent access to the course
-def value_assert_parent_access(db_cursor, parent_email: str, course_id: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, parent_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        """
-        SELECT EXISTS(
-            SELECT 1 FROM parent_of_at_course WHERE parentemail = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM users WHERE email = %s AND isadmin
-        )
-    """,
-        (parent_email, course_id, parent_email),
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
-        return HTTPException(status_code=403, detail="User has no parental access in this course")
-    return None
+async def value_assert_parent_access(db_cursor, parent_email: str, course_id: str) -> Union[None, HTTPException]:
+    access, = await resolve_course_access(db_cursor, course_id, parent_email)
+    return access.value_assert_parent_access()
 
 
 # checking whether the user has parent access to the course
-def assert_parent_access(db_cursor, parent_email: str, course_id: str):
-    err = value_assert_parent_access(db_cursor, parent_email, course_id)
+async def assert_parent_access(db_cursor, parent_email: str, course_id: str):
+    err = await value_assert_parent_access(db_cursor, parent_email, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the user has parent access to the course
-def check_parent_access(db_cursor, parent_email: str, course_id: str) -> bool:
-    return value_assert_parent_access(db_cursor, parent_email, course_id) is None
+async def check_parent_access(db_cursor, parent_email: str, course_id: str) -> bool:
+    return await value_assert_parent_access(db_cursor, parent_email, course_id) is None
 
 
 # checking whether the user has parent access with the student in the course
-def value_assert_parent_student_access(
+async def value_assert_parent_student_access(
     db_cursor, parent_email: str, student_email: str, course_id: str
 ) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, parent_email)
-    if err is not None:
-        return err
-    err = value_assert_user_exists(db_cursor, student_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        """
-        SELECT EXISTS(
-            SELECT 1 FROM parent_of_at_course WHERE parentemail = %s AND studentemail = %s AND courseid = %s
-            UNION
-            SELECT 1 FROM users WHERE email = %s AND isadmin
-        )
-    """,
-        (parent_email, student_email, course_id, parent_email),
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
-        return HTTPException(status_code=403, detail="User has no parental access to this student's course")
-    return None
+    parent, student = await resolve_course_access(db_cursor, course_id, parent_email, student_email)
+    return parent.value_assert_parent_student_access(student)
 
 
 # checking whether the user has parent access with the student in the course
-def assert_parent_student_access(db_cursor, parent_email: str, student_email: str, course_id: str):
-    err = value_assert_parent_student_access(db_cursor, parent_email, student_email, course_id)
+async def assert_parent_student_access(db_cursor, parent_email: str, student_email: str, course_id: str):
+    err = await value_assert_parent_student_access(db_cursor, parent_email, student_email, course_id)
     if err is not None:
         raise err
 
 
 # checking whether the user has parent access with the student in the course
-def check_parent_student_access(db_cursor, parent_email: str, student_email: str, course_id: str) -> bool:
-    return value_assert_parent_student_access(db_cursor, parent_email, student_email, course_id) is None
+async def check_parent_student_access(db_cursor, parent_email: str, student_email: str, course_id: str) -> bool:
+    return await value_assert_parent_student_access(db_cursor, parent_email, student_email, course_id) is None
 
 
 # checking if the submission exists
-def value_assert_submission_exists(
+async def value_assert_submission_exists(
     db_cursor, course_id: str, assignment_id: str, student_email: str
 ) -> Union[None, HTTPException]:
-    err = value_assert_assignment_exists(db_cursor, course_id, assignment_id)
-    if err is not None:
-        return err
-    # check if the student is enrolled to course
-    if not check_student_access(db_cursor, student_email, course_id):
-        raise HTTPException(status_code=403, detail="Provided user in not a student at this course")
-    db_cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM course_assignments_submissions WHERE courseid = %s AND assid = %s AND email = %s)",
-        (course_id, int(assignment_id), student_email),
-    )
-    submitted = db_cursor.fetchone()[0]
-    if not submitted:
-        return HTTPException(status_code=404, detail="The given student has not made a submission to this assignment")
-    return None
+    student, = await resolve_course_access(db_cursor, course_id, student_email, assignment_id=assignment_id)
+    return student.value_assert_submission_exists()
 
 
 # checking if the submission exists
-def assert_submission_exists(db_cursor, course_id: str, assignment_id: str, student_email: str):
-    err = value_assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
+async def assert_submission_exists(db_cursor, course_id: str, assignment_id: str, student_email: str):
+    err = await value_assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
     if err is not None:
         raise err
 
 
 # checking if the submission exists
-def check_submission_exists(db_cursor, course_id: str, assignment_id: str, student_email: str) -> bool:
-    return value_assert_submission_exists(db_cursor, course_id, assignment_id, student_email) is None
+async def check_submission_exists(db_cursor, course_id: str, assignment_id: str, student_email: str) -> bool:
+    return await value_assert_submission_exists(db_cursor, course_id, assignment_id, student_email) is None
 
 
-def value_assert_parent_of_all(db_cursor, parent_email: str,
-                               student_emails: list[str], course_id: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, parent_email)
-    if err is not None:
-        return err
-    err = value_assert_course_exists(db_cursor, course_id)
-    if err is not None:
-        return err
-    if check_admin_access(db_cursor, parent_email):
-        return None
-    for student in student_emails:
-        err = value_assert_user_exists(db_cursor, student)
-        if err is not None:
-            return err
-        ok = repo.parents.sql_has_child_at_course(db_cursor, course_id, parent_email, student)
-        if not ok:
-            return HTTPException(403, "User has no parental access to this student")
-    return None
+async def value_assert_parent_of_all(db_cursor, parent_email: str,
+                                     student_emails: list[str], course_id: str) -> Union[None, HTTPException]:
+    parent, *students = await resolve_course_access(db_cursor, course_id, parent_email, *student_emails)
+    return parent.value_assert_parent_of_all(students)
 
 
-def assert_parent_of_all(db_cursor, parent_email: str, student_emails: list[str], course_id: str):
-    err = value_assert_parent_of_all(db_cursor, parent_email, student_emails, course_id)
+async def assert_parent_of_all(db_cursor, parent_email: str, student_emails: list[str], course_id: str):
+    err = await value_assert_parent_of_all(db_cursor, parent_email, student_emails, course_id)
     if err is not None:
         raise err
 
 
-def check_parent_of_all(db_cursor, parent_email: str, student_emails: list[str], course_id: str) -> bool:
-    return value_assert_parent_of_all(db_cursor, parent_email, student_emails, course_id) is None
+async def check_parent_of_all(db_cursor, parent_email: str, student_emails: list[str], course_id: str) -> bool:
+    return await value_assert_parent_of_all(db_cursor, parent_email, student_emails, course_id) is None
 
 
 # checking whether the user has admin access
-def value_assert_admin_access(db_cursor, user_email: str) -> Union[None, HTTPException]:
-    err = value_assert_user_exists(db_cursor, user_email)
-    if err is not None:
-        return err
-    db_cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM users WHERE email = %s AND isadmin)", (user_email,)
-    )
-    has_access = db_cursor.fetchone()[0]
-    if not has_access:
+async def value_assert_admin_access(db_cursor, user_email: str) -> Union[None, HTTPException]:
+    user = db_cursor.memo.get(("admin", user_email))
+    if user is MISSING:
+        await db_cursor.execute("SELECT isadmin FROM users WHERE email = %s", (user_email,))
+        user = await db_cursor.fetchone()
+        db_cursor.memo.put(("admin", user_email), user)
+    if user is None:
+        return HTTPException(status_code=404, detail="No user with provided email")
+    if not user[0]:
         return HTTPException(status_code=403, detail="User has no admin rights")
     return None
 
 
 # checking whether the user has admin access
-def assert_admin_access(db_cursor, user_email: str):
-    err = value_assert_admin_access(db_cursor, user_email)
+async def assert_admin_access(db_cursor, user_email: str):
+    err = await value_assert_admin_access(db_cursor, user_email)
     if err is not None:
         raise err
 
 
 # checking whether the user has admin access
-def check_admin_access(db_cursor, user_email: str) -> bool:
-    return value_assert_admin_access(db_cursor, user_email) is None
+async def check_admin_access(db_cursor, user_email: str) -> bool:
+    return await value_assert_admin_access(db_cursor, user_email) is None
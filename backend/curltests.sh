@@ -28,6 +28,9 @@ extract_material_id() {
 extract_assignment_id() {
     python3 -c "import sys, json; print(json.load(sys.stdin)['assignment_id'])"
 }
+extract_file_id() {
+    python3 -c "import sys, json; print(json.load(sys.stdin)['file_id'])"
+}
 
 echo "== Registering users =="
 curl -s --fail -X POST $API_URL/create_user -H "Content-Type: application/json" \
@@ -91,6 +94,21 @@ MATERIAL_ID=$(curl -s --fail -X POST "$API_URL/create_material?course_id=$COURSE
 echo "Material ID: $MATERIAL_ID"
 echo
 
+echo "== Attaching the same file twice to the material =="
+ATTACHMENT_FILE=$(mktemp)
+echo "Lecture notes" > "$ATTACHMENT_FILE"
+FILE_ID1=$(curl -s --fail -X POST "$API_URL/create_material_attachment?course_id=$COURSE_ID&material_id=$MATERIAL_ID" \
+    -H "Authorization: Bearer $TOKEN" -F "file=@$ATTACHMENT_FILE;filename=notes.txt" | extract_file_id)
+FILE_ID2=$(curl -s --fail -X POST "$API_URL/create_material_attachment?course_id=$COURSE_ID&material_id=$MATERIAL_ID" \
+    -H "Authorization: Bearer $TOKEN" -F "file=@$ATTACHMENT_FILE;filename=notes-copy.txt" | extract_file_id)
+[ "$FILE_ID1" != "$FILE_ID2" ]
+curl -s --fail -X POST "$API_URL/create_material_attachments?course_id=$COURSE_ID&material_id=$MATERIAL_ID" \
+    -H "Authorization: Bearer $TOKEN" -F "files=@$ATTACHMENT_FILE;filename=a.txt" -F "files=@$ATTACHMENT_FILE;filename=b.txt"
+echo
+curl -s --fail -X GET "$API_URL/download_material_attachment?course_id=$COURSE_ID&material_id=$MATERIAL_ID&file_id=$FILE_ID2" \
+    -H "Authorization: Bearer $TOKEN" -D - -o /dev/null | grep -i "notes-copy.txt"
+echo
+
 echo "== Getting course feed =="
 curl -s --fail -X GET "$API_URL/get_course_feed?course_id=$COURSE_ID" -H "Authorization: Bearer $TOKEN"
 echo
@@ -116,6 +134,15 @@ curl -s --fail -X POST "$API_URL/submit_assignment?course_id=$COURSE_ID&assignme
     -H "Authorization: Bearer $STUDENT_TOKEN"
 echo
 
+echo "== Attaching the same file twice to the submission =="
+curl -s --fail -X POST "$API_URL/create_submission_attachment?course_id=$COURSE_ID&assignment_id=$ASSIGNMENT_ID&student_email=$STUDENT_EMAIL" \
+    -H "Authorization: Bearer $STUDENT_TOKEN" -F "file=@$ATTACHMENT_FILE;filename=solution.txt"
+echo
+curl -s --fail -X POST "$API_URL/create_submission_attachment?course_id=$COURSE_ID&assignment_id=$ASSIGNMENT_ID&student_email=$STUDENT_EMAIL" \
+    -H "Authorization: Bearer $STUDENT_TOKEN" -F "file=@$ATTACHMENT_FILE;filename=solution.txt"
+echo
+rm "$ATTACHMENT_FILE"
+
 echo "== Grading assignment =="
 curl -s --fail -X POST "$API_URL/grade_submission?course_id=$COURSE_ID&assignment_id=$ASSIGNMENT_ID&student_email=$STUDENT_EMAIL&grade=95" \
     -H "Authorization: Bearer $TOKEN"
@@ -0,0 +1,217 @@
+#
+# Checks that the read queries of the repo modules are served by indexes.
+#
+# The script fills the system database with 100k rows per table, asks
+# Postgres for the plans of the queries with EXPLAIN and reports every
+# sequential scan of a table. All the inserted rows are rolled back at the
+# end, but the script still loads the database, so do not run it against
+# production: `docker compose exec backend python indexcheck.py`.
+#
+
+import asyncio
+import sys
+from auth import get_db, open_databases, close_databases
+from migrate import migrate_all
+import repo.access
+import repo.assignments
+import repo.courses
+import repo.files
+import repo.materials
+import repo.parents
+import repo.students
+import repo.submissions
+import repo.teachers
+import repo.users
+
+# every user studies at one course, teaches at another one and is a parent
+# of the next user; every course has 100 materials and assignments with one
+# attached file each; every student submits one assignment with one file
+SEED_SQL = """
+CREATE TEMP TABLE check_courses ON COMMIT DROP AS
+SELECT i, gen_random_uuid() AS courseid FROM generate_series(0, 999) AS i;
+
+INSERT INTO users (email, publicname, isadmin, timeregistered, passwordhash)
+SELECT 'check' || i || '@example.com', 'Check ' || i, 'f', now(), '' FROM generate_series(1, 100000) AS i;
+
+INSERT INTO courses (courseid, name, timecreated)
+SELECT courseid, 'Check ' || i, now() FROM check_courses;
+
+INSERT INTO student_at (email, courseid)
+SELECT 'check' || u.i || '@example.com', c.courseid
+FROM generate_series(1, 100000) AS u(i) JOIN check_courses c ON c.i = u.i % 1000;
+
+INSERT INTO teaches (email, courseid)
+SELECT 'check' || u.i || '@example.com', c.courseid
+FROM generate_series(1, 100000) AS u(i) JOIN check_courses c ON c.i = (u.i + 500) % 1000;
+
+INSERT INTO parent_of_at_course (parentemail, studentemail, courseid)
+SELECT 'check' || (u.i % 100000 + 1) || '@example.com', 'check' || u.i || '@example.com', c.courseid
+FROM generate_series(1, 100000) AS u(i) JOIN check_courses c ON c.i = u.i % 1000;
+
+INSERT INTO course_materials (courseid, timeadded, author, name, description)
+SELECT c.courseid, now(), NULL, 'Check', '' FROM check_courses c, generate_series(1, 100);
+
+INSERT INTO course_assignments (courseid, timeadded, author, name, description)
+SELECT c.courseid, now(), NULL, 'Check', '' FROM check_courses c, generate_series(1, 100);
+
+INSERT INTO material_files (courseid, matid, fileid, contentid, filename, uploadtime)
+SELECT courseid, matid, gen_random_uuid(), gen_random_uuid(), 'check.txt', now()
+FROM course_materials JOIN check_courses USING (courseid);
+
+INSERT INTO assignment_files (courseid, assid, fileid, contentid, filename, uploadtime)
+SELECT courseid, assid, gen_random_uuid(), gen_random_uuid(), 'check.txt', now()
+FROM course_assignments JOIN check_courses USING (courseid);
+
+INSERT INTO course_assignments_submissions (courseid, assid, email, timeadded, timemodified, comment)
+SELECT s.courseid, (SELECT min(a.assid) FROM course_assignments a WHERE a.courseid = s.courseid),
+    s.email, now(), now(), ''
+FROM student_at s JOIN check_courses USING (courseid);
+
+INSERT INTO submissions_files (courseid, assid, email, fileid, contentid, filename, uploadtime)
+SELECT courseid, assid, email, gen_random_uuid(), gen_random_uuid(), 'check.txt', now()
+FROM course_assignments_submissions JOIN check_courses USING (courseid);
+
+ANALYZE;
+"""
+
+# the tables filled by SEED_SQL, a sequential scan of any of them is reported
+SEEDED_TABLES = {
+    "users",
+    "courses",
+    "course_materials",
+    "course_assignments",
+    "course_assignments_submissions",
+    "teaches",
+    "student_at",
+    "parent_of_at_course",
+    "material_files",
+    "assignment_files",
+    "submissions_files",
+}
+
+
+# runs EXPLAIN instead of each query and keeps the plans;
+# the repo functions get placeholder rows instead of the query results
+class ExplainCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.plans = []
+
+    async def execute(self, query, params=None):
+        await self.cursor.execute("EXPLAIN (FORMAT JSON) " + query, params, prepare=False)
+        self.plans.append((await self.cursor.fetchone())[0][0]["Plan"])
+
+    async def fetchone(self):
+        return (None,) * 16
+
+    async def fetchall(self):
+        return []
+
+
+def find_seq_scans(plan) -> list[str]:
+    res = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in SEEDED_TABLES:
+        res.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        res.extend(find_seq_scans(subplan))
+    return res
+
+
+async def select_sample(cur):
+    await cur.execute(
+        """
+        SELECT c.courseid, s.email, p.parentemail, cs.assid, m.matid, mf.fileid
+        FROM check_courses c
+        JOIN student_at s ON s.courseid = c.courseid
+        JOIN parent_of_at_course p ON p.courseid = c.courseid AND p.studentemail = s.email
+        JOIN course_assignments_submissions cs ON cs.courseid = c.courseid AND cs.email = s.email
+        JOIN course_materials m ON m.courseid = c.courseid
+        JOIN material_files mf ON mf.courseid = c.courseid AND mf.matid = m.matid
+        WHERE c.i = 0
+        LIMIT 1
+        """
+    )
+    return await cur.fetchone()
+
+
+async def check_indexes(cur) -> bool:
+    course_id, student, parent, assignment_id, material_id, file_id = await select_sample(cur)
+    queries = {
+        "access.sql_select_course_access": lambda c: repo.access.sql_select_course_access(
+            c, course_id, [student, parent], assignment_id, material_id
+        ),
+        "assignments.sql_select_assignment": lambda c: repo.assignments.sql_select_assignment(
+            c, course_id, assignment_id
+        ),
+        "assignments.sql_select_assignment_attachments": lambda c: repo.assignments.sql_select_assignment_attachments(
+            c, course_id, assignment_id
+        ),
+        "assignments.sql_get_all_assignments": lambda c: repo.assignments.sql_get_all_assignments(c, course_id),
+        "courses.sql_select_available_courses": lambda c: repo.courses.sql_select_available_courses(c, student),
+        "courses.sql_select_course_info": lambda c: repo.courses.sql_select_course_info(c, course_id),
+        "courses.sql_select_course_feed": lambda c: repo.courses.sql_select_course_feed(c, course_id),
+        "courses.sql_select_grade_table": lambda c: repo.courses.sql_select_grade_table(
+            c, course_id, [student], [assignment_id]
+        ),
+        "materials.sql_select_material": lambda c: repo.materials.sql_select_material(c, course_id, material_id),
+        "materials.sql_select_material_attachment": lambda c: repo.materials.sql_select_material_attachment(
+            c, course_id, material_id, file_id
+        ),
+        "materials.sql_select_material_attachments": lambda c: repo.materials.sql_select_material_attachments(
+            c, course_id, material_id
+        ),
+        "parents.sql_select_students_parents": lambda c: repo.parents.sql_select_students_parents(
+            c, course_id, student
+        ),
+        "parents.sql_select_parents_children": lambda c: repo.parents.sql_select_parents_children(
+            c, course_id, parent
+        ),
+        "students.sql_select_enrolled_students": lambda c: repo.students.sql_select_enrolled_students(c, course_id),
+        "submissions.sql_select_submission_grade": lambda c: repo.submissions.sql_select_submission_grade(
+            c, course_id, assignment_id, student
+        ),
+        "submissions.sql_select_submission_attachments": lambda c: repo.submissions.sql_select_submission_attachments(
+            c, course_id, assignment_id, student
+        ),
+        "submissions.sql_select_submissions": lambda c: repo.submissions.sql_select_submissions(
+            c, course_id, assignment_id
+        ),
+        "submissions.sql_select_single_submission": lambda c: repo.submissions.sql_select_single_submission(
+            c, course_id, assignment_id, student
+        ),
+        "teachers.sql_select_course_teachers": lambda c: repo.teachers.sql_select_course_teachers(c, course_id),
+        "teachers.sql_count_teachers": lambda c: repo.teachers.sql_count_teachers(c, course_id),
+        "users.sql_get_user_name": lambda c: repo.users.sql_get_user_name(c, student),
+        "users.sql_select_single_teacher_courses": lambda c: repo.users.sql_select_single_teacher_courses(c, student),
+        "users.sql_count_admins": lambda c: repo.users.sql_count_admins(c),
+    }
+
+    ok = True
+    for name, run_query in queries.items():
+        explain_cursor = ExplainCursor(cur)
+        await run_query(explain_cursor)
+        seq_scans = sorted({table for plan in explain_cursor.plans for table in find_seq_scans(plan)})
+        if seq_scans:
+            ok = False
+            print(f"FAIL {name}: sequential scan of {', '.join(seq_scans)}")
+        else:
+            print(f"ok   {name}")
+    return ok
+
+
+async def main() -> bool:
+    await open_databases()
+    try:
+        await migrate_all()
+        async with get_db() as (conn, cur):
+            try:
+                await cur.execute(SEED_SQL)
+                return await check_indexes(cur)
+            finally:
+                await conn.rollback()
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -53,6 +53,7 @@ class MaterialAttachmentMetadata(BaseModel):
     file_id: str
     filename: str
     upload_time: str
+    size: Union[int, None]
 
 
 class AssignmentID(BaseModel):
@@ -73,6 +74,7 @@ class AssignmentAttachmentMetadata(BaseModel):
     file_id: str
     filename: str
     upload_time: str
+    size: Union[int, None]
 
 
 class Submission(BaseModel):
@@ -94,6 +96,7 @@ class SubmissionAttachmentMetadata(BaseModel):
     file_id: str
     filename: str
     upload_time: str
+    size: Union[int, None]
 
 
 class Account(BaseModel):
@@ -120,8 +123,41 @@ class UserNewPassword(BaseModel):
 
 class GradeRow(BaseModel):
     email: str
+    name: Union[str, None]
     grades: list[Union[int, None]]
 
 
 class GradeTable(BaseModel):
     rows: list[GradeRow]
+
+
+class UploadSession(BaseModel):
+    upload_id: str
+    size: int
+    part_size: int
+    parts: int
+    expires: str
+
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    part_size: int
+    parts: int
+    received_parts: list[list[int]]
+    received_ranges: list[list[int]]
+    expires: str
+
+
+class AuditEvent(BaseModel):
+    id: int
+    time: str
+    tag: str
+    actor: Union[str, None]
+    message: str
+
+
+class AuditLogPage(BaseModel):
+    events: list[AuditEvent]
+    next_cursor: Union[str, None]
@@ -1,13 +1,14 @@
-from fastapi import HTTPException, UploadFile, Response
+from fastapi import HTTPException, UploadFile, Request
 from constants import TIME_FORMAT
 import constraints
 import repo.assignments as repo_ass
 import repo.files as repo_files
 import logic.logging as logger
-from logic.uploading import careful_upload
+from logic.uploading import careful_upload, careful_upload_all, finish_upload, release_files
+from logic.downloading import stream_attachment
 
 
-def create_assignment(
+async def create_assignment(
     db_conn,
     db_cursor,
     course_id: str,
@@ -16,38 +17,41 @@ def create_assignment(
     user_email: str,
 ):
     # checking constraints
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    await constraints.assert_teacher_access(db_cursor, user_email, course_id)
 
     # create assignment
-    assignment_id = repo_ass.sql_insert_assignment(db_cursor, course_id, title, description, user_email)
-    db_conn.commit()
+    assignment_id = await repo_ass.sql_insert_assignment(db_cursor, course_id, title, description, user_email)
+    await db_conn.commit()
 
-    logger.log(db_conn, logger.TAG_ASSIGNMENT_ADD, f"Created assignment {assignment_id}")
+    logger.log(logger.TAG_ASSIGNMENT_ADD, f"Created assignment {assignment_id}", actor=user_email)
 
     return {"course_id": course_id, "assignment_id": assignment_id}
 
 
-def remove_assignment(db_conn, db_cursor, course_id: str, assignment_id: str, user_email: str):
+async def remove_assignment(db_conn, db_cursor, course_id: str, assignment_id: str, user_email: str):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
 
     # remove assignment
-    repo_ass.sql_delete_assignment(db_cursor, course_id, assignment_id)
-    db_conn.commit()
+    file_ids = await repo_files.sql_select_assignment_file_ids(db_cursor, course_id, assignment_id)
+    await repo_ass.sql_delete_assignment(db_cursor, course_id, assignment_id)
+    await db_conn.commit()
+    await release_files(file_ids)
 
-    logger.log(db_conn, logger.TAG_ASSIGNMENT_DEL, f"Removed assignment {assignment_id}")
+    logger.log(logger.TAG_ASSIGNMENT_DEL, f"Removed assignment {assignment_id}", actor=user_email)
 
     return {"success": True}
 
 
-def get_assignment(db_cursor, course_id: str, assignment_id: str, user_email: str):
+async def get_assignment(db_cursor, course_id: str, assignment_id: str, user_email: str):
 
     # checking constraints
-    constraints.assert_course_access(db_cursor, user_email, course_id)
+    await constraints.assert_course_access(db_cursor, user_email, course_id)
 
     # searching for assignments
-    assignment = repo_ass.sql_select_assignment(db_cursor, course_id, assignment_id)
+    assignment = await repo_ass.sql_select_assignment(db_cursor, course_id, assignment_id)
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
 
@@ -64,64 +68,116 @@ def get_assignment(db_cursor, course_id: str, assignment_id: str, user_email: st
 
 async def create_assignment_attachment(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, file: UploadFile, user_email: str):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
 
-    # read the file
-    contents = await careful_upload(file)
+    # stream the file into the storage database
+    content_id, size, sha256 = await careful_upload(storage_db_cursor, file)
 
-    # save the file into database
-    attachment_metadata = repo_ass.sql_insert_assignment_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, file.filename, contents)
-    db_conn.commit()
-    storage_db_conn.commit()
+    # save the file metadata into database
+    attachment_metadata = await repo_ass.sql_insert_assignment_attachment(db_cursor, course_id, assignment_id, content_id, file.filename, size, sha256)
+    await db_conn.commit()
+    await storage_db_conn.commit()
 
-    logger.log(db_conn, logger.TAG_ATTACHMENT_ADD_ASS, f"User {user_email} created an attachment {file.filename} for the assignment {assignment_id} in course {course_id}")
+    logger.log(logger.TAG_ATTACHMENT_ADD_ASS, f"User {user_email} created an attachment {file.filename} for the assignment {assignment_id} in course {course_id}", actor=user_email)
     return {
         "course_id": course_id,
         "assignment_id": assignment_id,
         'file_id': attachment_metadata[0],
         'filename' : file.filename,
-        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT)
+        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT),
+        'size': size,
     }
 
 
-def get_assignment_attachments(db_cursor, course_id: str, assignment_id: str, user_email: str):
+async def create_assignment_attachments(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, files: list[UploadFile], user_email: str):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_course_access(db_cursor, user_email, course_id)
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
+
+    # stream the files into the storage database
+    attachments = await careful_upload_all(storage_db_cursor, files)
+
+    # save the metadata of all the files into database at once
+    file_ids, upload_time = await repo_ass.sql_insert_assignment_attachments(db_cursor, course_id, assignment_id, attachments)
+    await db_conn.commit()
+    await storage_db_conn.commit()
+
+    filenames = ", ".join(file.filename for file in files)
+    logger.log(logger.TAG_ATTACHMENT_ADD_ASS, f"User {user_email} created attachments {filenames} for the assignment {assignment_id} in course {course_id}", actor=user_email)
+    return [{
+        "course_id": course_id,
+        "assignment_id": assignment_id,
+        "file_id": file_id,
+        "filename": filename,
+        "upload_time": upload_time.strftime(TIME_FORMAT),
+        "size": size,
+    } for file_id, (_, filename, size, _) in zip(file_ids, attachments)]
+
+
+async def finish_assignment_attachment_upload(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, upload_id: str, user_email: str):
+    # checking constraints
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
+
+    # assemble the parts of the resumable upload into a file
+    content_id, filename, size, sha256 = await finish_upload(storage_db_cursor, upload_id, user_email)
+
+    # save the file metadata into database
+    attachment_metadata = await repo_ass.sql_insert_assignment_attachment(db_cursor, course_id, assignment_id, content_id, filename, size, sha256)
+    await db_conn.commit()
+    await storage_db_conn.commit()
+
+    logger.log(logger.TAG_ATTACHMENT_ADD_ASS, f"User {user_email} created an attachment {filename} for the assignment {assignment_id} in course {course_id}", actor=user_email)
+    return {
+        "course_id": course_id,
+        "assignment_id": assignment_id,
+        'file_id': attachment_metadata[0],
+        'filename' : filename,
+        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT),
+        'size': size,
+    }
+
+
+async def get_assignment_attachments(db_cursor, course_id: str, assignment_id: str, user_email: str):
+    # checking constraints
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_course_access()
 
     # searching for assignment attachments
-    files = repo_ass.sql_select_assignment_attachments(db_cursor, course_id, assignment_id)
+    files = await repo_ass.sql_select_assignment_attachments(db_cursor, course_id, assignment_id)
 
     res = [{
         "course_id": course_id,
         "assignment_id": assignment_id,
         "file_id": file[0],
         "filename": file[1],
-        "upload_time": file[2].strftime(TIME_FORMAT)
+        "upload_time": file[2].strftime(TIME_FORMAT),
+        "size": file[3],
     } for file in files]
  
     return res
 
 
-def download_assignment_attachment(db_cursor, storage_db_cursor, course_id: str, assignment_id: str, file_id: str, user_email: str):
+async def download_assignment_attachment(db_cursor, request: Request, course_id: str, assignment_id: str, file_id: str, user_email: str):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_course_access(db_cursor, user_email, course_id)
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_course_access()
 
     # searching for assignment attachment
-    file = repo_files.sql_download_attachment(storage_db_cursor, file_id)
-    file_metadata = repo_files.sql_select_attachment_metadata(db_cursor, file_id)
-    if (not file or not file_metadata):
+    file_metadata = await repo_ass.sql_select_assignment_attachment(db_cursor, course_id, assignment_id, file_id)
+    if not file_metadata:
         raise HTTPException(status_code=404, detail="Attachment not found")
 
-    return Response(
-        content=file,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{file_metadata[1]}"'}
-    )
+    content_id, filename, upload_time, size, sha256 = file_metadata
+    return await stream_attachment(request, content_id, filename, upload_time, size, sha256, hot=True)
 
 
-def get_all_assignments(db_cursor, course_id: str, user_email: str) -> list[int]:
-    constraints.assert_course_access(db_cursor, user_email, course_id)
-    return repo_ass.sql_get_all_assignments(db_cursor, course_id)
+async def get_all_assignments(db_cursor, course_id: str, user_email: str) -> list[int]:
+    await constraints.assert_course_access(db_cursor, user_email, course_id)
+    return await repo_ass.sql_get_all_assignments(db_cursor, course_id)
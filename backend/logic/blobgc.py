@@ -0,0 +1,184 @@
+import asyncio
+import os
+from time import monotonic
+from auth import get_db, get_storage_db
+import repo.files as repo_files
+from repo.blobs import BLOB_STORES, DiskBlobStore, remove_blobs
+import logic.logging as logger
+from logic.uploading import expire_uploads
+
+#
+# Garbage collector of the storage database. The attachments of the system
+# database use the files of the storage database, and the two databases can
+# not be changed in one transaction, so a file may be left behind when a
+# request fails between them. Every pass goes through a part of the files in
+# batches of short transactions and:
+# - deletes the files no attachment uses,
+# - raises the reference counts that are lower than the number of attachments,
+# - deletes the chunks left behind by the files moved out of the postgres store,
+# - removes the files on disk that no file of the disk store owns.
+# Each pass also deletes the expired resumable uploads.
+# Files younger than the grace period are left alone, their uploads may still
+# be running. Where a pass stopped is kept in gc_state, the next pass goes on
+# from there.
+#
+
+BLOB_GC_INTERVAL_SECONDS = int(os.environ.get("BLOB_GC_INTERVAL_SECONDS", 600))
+BLOB_GC_GRACE_SECONDS = int(os.environ.get("BLOB_GC_GRACE_SECONDS", 3600))
+BLOB_GC_BATCH_SIZE = 500
+# batches and disk shards per pass, and the pause between the batches
+BLOB_GC_BATCHES_PER_PASS = 20
+BLOB_GC_SHARDS_PER_PASS = 16
+BLOB_GC_BATCH_PAUSE_SECONDS = 0.1
+
+GC_LOCK_ID = 7310002
+FIRST_FILE_ID = "00000000-0000-0000-0000-000000000000"
+
+# the counters of the last pass of this process
+last_pass = None
+
+
+def _new_pass() -> dict:
+    return {
+        "files_checked": 0,
+        "files_deleted": 0,
+        "refcounts_fixed": 0,
+        "disk_files_removed": 0,
+        "uploads_expired": 0,
+        "reclaimed_bytes": 0,
+        "seconds": 0.0,
+        "skipped": False,
+    }
+
+
+# returns whether there are more files to check in this pass,
+# or None when another process is collecting at the moment
+async def _collect_files_batch(counters: dict, grace_seconds: float):
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        if not await repo_files.sql_try_lock_gc(storage_db_cursor, GC_LOCK_ID):
+            return None
+        position = await repo_files.sql_select_gc_position(storage_db_cursor, "files") or FIRST_FILE_ID
+        files = await repo_files.sql_select_gc_files(storage_db_cursor, position, grace_seconds, BLOB_GC_BATCH_SIZE)
+        file_ids = [file[0] for file in files]
+
+        async with get_db() as (db_conn, db_cursor):
+            references = await repo_files.sql_count_file_references(db_cursor, file_ids)
+
+        unused = [(file_id, refcount) for file_id, refcount, _, _ in files if file_id not in references]
+        deleted = await repo_files.sql_delete_unreferenced_files(
+            storage_db_cursor, [file[0] for file in unused], [file[1] for file in unused]
+        )
+
+        undercounted = [
+            (file_id, refcount, references[file_id])
+            for file_id, refcount, _, _ in files
+            if references.get(file_id, 0) > refcount
+        ]
+        fixed = await repo_files.sql_raise_refcounts(
+            storage_db_cursor,
+            [file[0] for file in undercounted],
+            [file[1] for file in undercounted],
+            [file[2] for file in undercounted],
+        )
+
+        moved = [file_id for file_id, _, backend, long_ago in files if backend != "postgres" and long_ago]
+        chunk_bytes = await repo_files.sql_delete_moved_chunks(storage_db_cursor, moved, grace_seconds)
+
+        # the next pass starts from the beginning after the last batch
+        next_position = file_ids[-1] if len(file_ids) == BLOB_GC_BATCH_SIZE else FIRST_FILE_ID
+        await repo_files.sql_update_gc_position(storage_db_cursor, "files", next_position)
+
+    await remove_blobs([(file_id, backend) for file_id, backend, _ in deleted])
+    counters["files_checked"] += len(files)
+    counters["files_deleted"] += len(deleted)
+    counters["refcounts_fixed"] += fixed
+    counters["reclaimed_bytes"] += sum(size for _, _, size in deleted) + chunk_bytes
+    return next_position != FIRST_FILE_ID
+
+
+async def _collect_disk_shard(counters: dict, store: DiskBlobStore, grace_seconds: float) -> bool:
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        if not await repo_files.sql_try_lock_gc(storage_db_cursor, GC_LOCK_ID):
+            return False
+        position = await repo_files.sql_select_gc_position(storage_db_cursor, "disk")
+        shard_index = (store.shards.index(position) + 1) % len(store.shards) if position in store.shards else 0
+        shard = store.shards[shard_index]
+        files, partial_files = await store.scan_shard(shard, grace_seconds)
+        sizes = dict(files)
+        orphans = await repo_files.sql_select_disk_orphans(storage_db_cursor, list(sizes), grace_seconds)
+        await repo_files.sql_update_gc_position(storage_db_cursor, "disk", shard)
+
+    for file_id in orphans:
+        await store.remove(file_id)
+    # the uploads that failed without cleaning up after themselves
+    for path, _ in partial_files:
+        await store.remove_path(path)
+    counters["disk_files_removed"] += len(orphans) + len(partial_files)
+    counters["reclaimed_bytes"] += sum(sizes[file_id] for file_id in orphans) + sum(size for _, size in partial_files)
+    return True
+
+
+# one pass of the collector, returns its counters
+async def collect_garbage(grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> dict:
+    global last_pass
+    counters = _new_pass()
+    started = monotonic()
+
+    for _ in range(BLOB_GC_BATCHES_PER_PASS):
+        sessions, size = await expire_uploads()
+        counters["uploads_expired"] += sessions
+        counters["reclaimed_bytes"] += size
+        if not sessions:
+            break
+
+    for _ in range(BLOB_GC_BATCHES_PER_PASS):
+        more = await _collect_files_batch(counters, grace_seconds)
+        if more is None:
+            counters["skipped"] = True
+        if not more:
+            break
+        await asyncio.sleep(BLOB_GC_BATCH_PAUSE_SECONDS)
+
+    store = BLOB_STORES[DiskBlobStore.name]
+    if not counters["skipped"] and os.path.isdir(store.root):
+        for _ in range(BLOB_GC_SHARDS_PER_PASS):
+            if not await _collect_disk_shard(counters, store, grace_seconds):
+                counters["skipped"] = True
+                break
+            await asyncio.sleep(BLOB_GC_BATCH_PAUSE_SECONDS)
+
+    counters["seconds"] = monotonic() - started
+    last_pass = counters
+    return counters
+
+
+def describe(counters: dict) -> str:
+    return (
+        f"Storage GC reclaimed {counters['reclaimed_bytes']} bytes in {counters['seconds']:.1f} s: "
+        f"checked {counters['files_checked']} files, deleted {counters['files_deleted']}, "
+        f"fixed {counters['refcounts_fixed']} reference counts, "
+        f"removed {counters['disk_files_removed']} files on disk, expired {counters['uploads_expired']} uploads"
+    )
+
+
+# runs a pass every BLOB_GC_INTERVAL_SECONDS until the backend stops
+async def run_garbage_collector():
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            counters = await collect_garbage()
+            if counters["skipped"]:
+                continue
+            print(describe(counters))
+            logger.log(logger.TAG_STORAGE_GC, describe(counters))
+        except Exception as e:
+            # the next pass tries again
+            print(f"Storage GC failed: {e!r}")
+
+
+def get_stats() -> dict:
+    return {
+        "interval_seconds": BLOB_GC_INTERVAL_SECONDS,
+        "grace_seconds": BLOB_GC_GRACE_SECONDS,
+        "last_pass": last_pass,
+    }
@@ -1,52 +1,59 @@
 from fastapi import HTTPException
 from constants import TIME_FORMAT
 import constraints
+import repo.assignments
 import repo.courses
+import repo.files
+import repo.students
 import repo.teachers
-import repo.users
 import logic.logging as logger
 import logic.users
 import logic.csvtables
+from logic.uploading import release_files
 from typing import Union
 import itertools
 
 
-def available_courses(db_cursor, user_email: str):
-    courses = repo.courses.sql_select_available_courses(db_cursor, user_email)
+async def available_courses(db_cursor, user_email: str):
+    courses = await repo.courses.sql_select_available_courses(db_cursor, user_email)
     result = [{"course_id": crs[0]} for crs in courses]
     return result
 
 
-def get_all_courses(db_cursor, user_email: str):
-    constraints.assert_admin_access(db_cursor, user_email)
-    courses = repo.courses.sql_select_all_courses(db_cursor)
+async def get_all_courses(db_cursor, user_email: str):
+    await constraints.assert_admin_access(db_cursor, user_email)
+    courses = await repo.courses.sql_select_all_courses(db_cursor)
     result = [{"course_id": crs[0]} for crs in courses]
     return result
 
 
-def create_course(db_conn, db_cursor, title: str, user_email: str):
-    course_id = repo.courses.sql_insert_course(db_cursor, title)
-    repo.teachers.sql_insert_teacher(db_cursor, user_email, course_id)
-    db_conn.commit()
+async def create_course(db_conn, db_cursor, title: str, user_email: str):
+    course_id = await repo.courses.sql_insert_course(db_cursor, title)
+    await repo.teachers.sql_insert_teacher(db_cursor, user_email, course_id)
+    await db_conn.commit()
+    constraints.role_cache.invalidate(user_email, constraints.normalize_course_id(course_id))
 
-    logger.log(db_conn, logger.TAG_COURSE_ADD, f"User {user_email} created course {course_id}")
+    logger.log(logger.TAG_COURSE_ADD, f"User {user_email} created course {course_id}", actor=user_email)
 
     return {"course_id": course_id}
 
 
-def remove_course(db_conn, db_cursor, course_id: str, user_email: str):
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
-    repo.courses.sql_delete_course(db_cursor, course_id)
-    db_conn.commit()
+async def remove_course(db_conn, db_cursor, course_id: str, user_email: str):
+    await constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    file_ids = await repo.files.sql_select_course_file_ids(db_cursor, course_id)
+    await repo.courses.sql_delete_course(db_cursor, course_id)
+    await db_conn.commit()
+    constraints.role_cache.invalidate_course(constraints.normalize_course_id(course_id))
+    await release_files(file_ids)
 
-    logger.log(db_conn, logger.TAG_COURSE_DEL, f"User {user_email} deleted course {course_id}")
+    logger.log(logger.TAG_COURSE_DEL, f"User {user_email} deleted course {course_id}", actor=user_email)
 
     return {"success": True}
 
 
-def get_course_info(db_cursor, course_id: str, user_email: str):
-    constraints.assert_course_access(db_cursor, user_email, course_id)
-    course = repo.courses.sql_select_course_info(db_cursor, course_id)
+async def get_course_info(db_cursor, course_id: str, user_email: str):
+    await constraints.assert_course_access(db_cursor, user_email, course_id)
+    course = await repo.courses.sql_select_course_info(db_cursor, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     res = {
@@ -58,9 +65,9 @@ def get_course_info(db_cursor, course_id: str, user_email: str):
     return res
 
 
-def get_course_feed(db_cursor, course_id: str, user_email: str):
-    constraints.assert_course_access(db_cursor, user_email, course_id)
-    course_feed = repo.courses.sql_select_course_feed(db_cursor, course_id)
+async def get_course_feed(db_cursor, course_id: str, user_email: str):
+    await constraints.assert_course_access(db_cursor, user_email, course_id)
+    course_feed = await repo.courses.sql_select_course_feed(db_cursor, course_id)
     res = [
         {
             "course_id": str(mat[0]),
@@ -74,68 +81,65 @@ def get_course_feed(db_cursor, course_id: str, user_email: str):
     return res
 
 
-def get_all_grades(db_cursor, course_id: str, students: list[str],
-                   gradables: list[int], user_email: str) -> list[tuple[str, int, Union[None, int]]]:
-    constraints.assert_user_exists(db_cursor, user_email)
-    constraints.assert_course_exists(db_cursor, course_id)
-    role = logic.users.get_user_role(db_cursor, course_id, user_email)
+async def _assert_grades_access(db_cursor, course_id: str, students: list[str], user_email: str):
+    user, *student_accesses = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, *(students or [])
+    )
+    user.assert_user_exists()
+    user.assert_course_exists()
+    role = user.role()
     if role["is_parent"]:
-        constraints.assert_parent_of_all(db_cursor, user_email, students, course_id)
+        user.assert_parent_of_all(student_accesses)
     elif role["is_student"]:
         for student in students:
             if student != user_email:
                 raise HTTPException(403, "A student cannot view other students' grades")
-    return repo.courses.sql_select_grades_in_course(db_cursor, course_id, students, gradables)
 
 
-def get_grade_table(db_cursor, course_id: str, students: list[str],
-                    gradables: list[int], user_email: str) -> list[list[Union[int, None]]]:
+async def get_grade_table(db_cursor, course_id: str, students: list[str],
+                          gradables: list[int], user_email: str) -> list[tuple[str, str, list[Union[int, None]]]]:
     """
-    Returns:
-    1) the list of row names - student logins;
-    2) the list of column names - assignment IDs;
-    3) a `len(students) x len(gradables)` table of grades. Rows and columns are not included.
+    Returns the (student login, student display name, grades) rows of the table, in the order of `students`.
+    The grades are in the order of `gradables`, None where the student has no grade.
+    Without `students`, the rows are of all students of the course; without `gradables`, the columns are of
+    all assignments. Both are sorted then.
     Currently, gradables are just IDs of assignments in this course.
+
+    The whole table, names included, comes from a single query.
     """
-    values = get_all_grades(db_cursor, course_id, students, gradables, user_email)
-    allrows = sorted(set(v[0] for v in values)) if students is None else students
-    allcols = sorted(set(v[1] for v in values)) if gradables is None else gradables
-    nrows = len(allrows)
-    ncols = len(allcols)
-    rowindex = {allrows[i]: i for i in range(nrows)}
-    colindex = {allcols[i]: i for i in range(ncols)}
-    table = [[None] * ncols for _ in range(nrows)]
-    for email, assignment, grade in values:
-        table[rowindex[email]][colindex[assignment]] = grade
-    return table
-
-
-def get_grade_table_csv(db_cursor, course_id: str, students: list[str],
-                        gradables: list[int], user_email: str) -> str:
+    await _assert_grades_access(db_cursor, course_id, students, user_email)
+    if students is None:
+        enrolled = await repo.students.sql_select_enrolled_students(db_cursor, course_id)
+        students = sorted(email for email, name in enrolled)
+    if gradables is None:
+        gradables = sorted(await repo.assignments.sql_get_all_assignments(db_cursor, course_id))
+    return await repo.courses.sql_select_grade_table(db_cursor, course_id, students, gradables)
+
+
+async def get_grade_table_csv(db_cursor, course_id: str, students: list[str],
+                              gradables: list[int], user_email: str) -> str:
     """
     Compile a CSV file (comma-separated, CRLF newlines) with all grades of all students.
 
     COLUMNS: student login, student display name, then assignment names
     """
-    table = get_grade_table(db_cursor, course_id, students, gradables, user_email)
+    table = await get_grade_table(db_cursor, course_id, students, gradables, user_email)
     columns = itertools.chain(("Login", "Public Name",), gradables)
-    for login, row in zip(students, table):
-        row.insert(0, login)
-        row.insert(1, repo.users.sql_get_user_name(db_cursor, login))
-    return logic.csvtables.encode_to_csv_with_columns(columns, table)
+    rows = [[login, name, *grades] for login, name, grades in table]
+    return logic.csvtables.encode_to_csv_with_columns(columns, rows)
 
 
-def get_students_accessible_by(db_cursor, course_id: str, user_email: str) -> list[str]:
+async def get_students_accessible_by(db_cursor, course_id: str, user_email: str) -> list[str]:
     """
     Returns the list of logins of students whose grades are visible by `user_email`.
 
     In particular, returns an empty list if the user is not associated with the given course.
     """
-    role = logic.users.get_user_role(db_cursor, course_id, user_email)
+    role = await logic.users.get_user_role(db_cursor, course_id, user_email)
     if role["is_teacher"] or role["is_admin"]:
-        return [email for email, name in repo.students.sql_select_enrolled_students(db_cursor, course_id)]
+        return [email for email, name in await repo.students.sql_select_enrolled_students(db_cursor, course_id)]
     if role["is_parent"]:
-        return [email for email, name in repo.parents.sql_select_parents_children(db_cursor, course_id, user_email)]
+        return [email for email, name in await repo.parents.sql_select_parents_children(db_cursor, course_id, user_email)]
     elif role["is_student"]:
         return [user_email]
     else:
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from auth import get_storage_db
+import repo.files as repo_files
+from repo.blobs import get_blob_store, blob_cache, read_whole
+
+
+# etag is the tag of the representation the response would send
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+# (first, last) byte of a single "bytes=" range, or None to send the whole file
+def _parse_range(request: Request, etag: str, last_modified_header: str, size: int):
+    range_header = request.headers.get("Range")
+    if range_header is None:
+        return None
+
+    # a range of a changed file is useless for the client, it gets the whole new one
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range.strip() not in (etag, last_modified_header):
+        return None
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            # the last bytes of the file, "bytes=-0" cannot be satisfied
+            suffix_length = int(last)
+            first, last = (max(size - suffix_length, 0), size - 1) if suffix_length > 0 else (size, size)
+        else:
+            first, last = int(first), int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if first >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _accepts_encoding(request: Request, codec: str) -> bool:
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() == codec:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+# (backend, codec, stored_size) of the file
+async def _select_storage(file_id: str) -> tuple:
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        storage = await repo_files.sql_select_file_storage(storage_db_cursor, file_id)
+    if storage is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return storage
+
+
+# hot=True for the attachments the whole course downloads, they are served
+# from the blob cache
+async def stream_attachment(
+    request: Request, file_id: str, filename: str, upload_time: datetime, size, sha256, hot: bool = False
+):
+    # the file was not found in the storage when its size and hash were filled
+    if size is None or sha256 is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    backend, codec, stored_size = await _select_storage(file_id)
+    store = get_blob_store(backend)
+
+    last_modified = upload_time.replace(tzinfo=timezone.utc)
+    last_modified_header = formatdate(last_modified.timestamp(), usegmt=True)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Last-Modified": last_modified_header,
+        "Accept-Ranges": "bytes",
+    }
+
+    # the compressed chunks are sent as they are stored when the client accepts them,
+    # as a representation of its own under its own tag. The choice is made before
+    # anything else, so that GET, HEAD and 304 describe the same representation.
+    # Ranges are always of the decoded file.
+    identity_etag = f'"{sha256}"'
+    encoded = backend == "postgres" and codec == "zstd"
+    send_encoded = encoded and "Range" not in request.headers and _accepts_encoding(request, codec)
+    etag = f'"{sha256}-{codec}"' if send_encoded else identity_etag
+    headers["ETag"] = etag
+    if encoded:
+        headers["Vary"] = "Accept-Encoding"
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    if send_encoded:
+        headers.update({"Content-Encoding": codec, "Content-Length": str(stored_size)})
+        if request.method == "HEAD":
+            return Response(status_code=200, media_type="application/octet-stream", headers=headers)
+        return StreamingResponse(store.read_stored(file_id), media_type="application/octet-stream", headers=headers)
+
+    status_code, start, length = 200, 0, size
+    byte_range = _parse_range(request, identity_etag, last_modified_header, size)
+    if byte_range is not None:
+        first, last = byte_range
+        status_code, start, length = 206, first, last - first + 1
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, media_type="application/octet-stream", headers=headers)
+
+    # the cache is skipped where nginx sends the file by itself
+    if hot and not store.sends_itself and blob_cache.accepts(size):
+        content = await blob_cache.get(file_id, lambda: read_whole(store, file_id), length)
+        if length != len(content):
+            content = content[start:start + length]
+        return Response(content, status_code=status_code, media_type="application/octet-stream", headers=headers)
+
+    return store.response(file_id, status_code, start, length, headers)
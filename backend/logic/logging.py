@@ -1,10 +1,265 @@
+import asyncio
+import json
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from auth import get_db
+from constants import TIME_FORMAT
+import constraints
 import repo.logging as repo_log
 
+#
+# The log records are not written by the requests themselves: log() puts them
+# into the queue of log_writer, and its background task writes them to the
+# logs table in batches, every LOG_FLUSH_INTERVAL_SECONDS or as soon as
+# LOG_FLUSH_RECORDS records are waiting. The queue holds at most
+# LOG_QUEUE_MAX_RECORDS records, the records that do not fit are dropped and
+# counted. The rest of the queue is written when the backend stops.
+#
+# The logs table has one partition per day (UTC). run_log_maintenance creates
+# the partitions of the next days ahead of time and drops the ones older
+# than LOG_RETENTION_DAYS, which takes the same time however many rows they
+# have.
+#
+# Admins read the logs with get_audit_logs, a page at a time, and export them
+# with export_audit_logs as NDJSON. Both go through the rows with keyset
+# pagination on (t, id): a page starts right after the last row of the
+# previous one, found in the index of the filter, however deep it is.
+#
 
-def log(db_conn, tag, msg):
-    with db_conn.cursor() as db_cursor:
-        repo_log.sql_insert_log(db_cursor, tag, msg)
-        db_conn.commit()
+LOG_FLUSH_INTERVAL_SECONDS = 0.2
+LOG_FLUSH_RECORDS = 500
+LOG_QUEUE_MAX_RECORDS = 10000
+
+LOG_RETENTION_DAYS = 7
+LOG_PARTITIONS_AHEAD_DAYS = 3
+LOG_MAINTENANCE_INTERVAL_SECONDS = 60 * 60
+LOG_PARTITION_PREFIX = "logs_p"
+
+AUDIT_PAGE_DEFAULT = 100
+AUDIT_PAGE_MAX = 1000
+AUDIT_EXPORT_PAGE = 5000
+
+
+class LogWriter:
+    def __init__(self, flush_interval: float, flush_records: int, max_records: int):
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.max_records = max_records
+        self._records = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def log(self, tag: str, msg: str, actor: str = None):
+        if len(self._records) >= self.max_records:
+            self.dropped += 1
+            return
+        # the time of the event, not of the write; UTC like now() of the database
+        self._records.append((datetime.now(timezone.utc).replace(tzinfo=None), tag, msg, actor))
+        if len(self._records) >= self.flush_records:
+            self._wakeup.set()
+
+    async def flush(self):
+        while self._records:
+            records = [self._records.popleft() for _ in range(min(len(self._records), self.flush_records))]
+            try:
+                async with get_db() as (db_conn, db_cursor):
+                    await repo_log.sql_insert_logs(db_cursor, records)
+            except BaseException:
+                # the records go back to the front of the queue, as many as fit,
+                # also when the flush is cancelled
+                self.failed_flushes += 1
+                room = self.max_records - len(self._records)
+                self.dropped += max(len(records) - room, 0)
+                self._records.extendleft(reversed(records[:room]))
+                raise
+            self.flushes += 1
+            self.written += len(records)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # the next flush tries again
+                print(f"Writing the log failed: {e!r}")
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    # stops the background task after the flush it is doing, so that no batch is
+    # cut off halfway, and writes what is left in the queue
+    async def close(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Writing the log failed: {e!r}, {len(self._records)} records are lost")
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._records),
+            "max_records": self.max_records,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+log_writer = LogWriter(LOG_FLUSH_INTERVAL_SECONDS, LOG_FLUSH_RECORDS, LOG_QUEUE_MAX_RECORDS)
+
+
+# actor is the email of the user who did what the record is about
+def log(tag, msg, actor=None):
+    log_writer.log(tag, msg, actor)
+
+
+def _partition_name(day: date) -> str:
+    return f"{LOG_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _partition_day(name: str):
+    try:
+        return datetime.strptime(name.removeprefix(LOG_PARTITION_PREFIX), "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+# returns the names of the created and the dropped partitions
+async def maintain_log_partitions() -> tuple[list[str], list[str]]:
+    today = datetime.now(timezone.utc).date()
+    oldest = today - timedelta(days=LOG_RETENTION_DAYS)
+    created, dropped = [], []
+    async with get_db() as (db_conn, db_cursor):
+        if not await repo_log.sql_try_lock_log_maintenance(db_cursor):
+            return created, dropped
+        partitions = await repo_log.sql_select_log_partitions(db_cursor)
+
+        for offset in range(LOG_PARTITIONS_AHEAD_DAYS + 1):
+            day = today + timedelta(days=offset)
+            if _partition_name(day) not in partitions:
+                await repo_log.sql_create_log_partition(db_cursor, _partition_name(day), day, day + timedelta(days=1))
+                created.append(_partition_name(day))
+
+        for name in sorted(partitions):
+            day = _partition_day(name)
+            if day is not None and day < oldest:
+                await repo_log.sql_drop_log_partition(db_cursor, name)
+                dropped.append(name)
+        await repo_log.sql_delete_old_default_logs(db_cursor, oldest)
+    return created, dropped
+
+
+# runs the maintenance at once and then every LOG_MAINTENANCE_INTERVAL_SECONDS
+async def run_log_maintenance():
+    while True:
+        try:
+            created, dropped = await maintain_log_partitions()
+            if created or dropped:
+                print(f"Log partitions created: {created or 'none'}, dropped: {dropped or 'none'}")
+        except Exception as e:
+            # the next run tries again
+            print(f"Log maintenance failed: {e!r}")
+        await asyncio.sleep(LOG_MAINTENANCE_INTERVAL_SECONDS)
+
+
+def _parse_time(name: str, value: str):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"The format of {name} should be TIME_FORMAT")
+
+
+def _check_tag(tag: str):
+    if tag is not None and tag not in TAGS:
+        raise HTTPException(status_code=400, detail="Unknown tag")
+
+
+# the cursor of a page is the (t, id) of its last row
+def _encode_cursor(row) -> str:
+    return f"{row[1].isoformat()}_{row[0]}"
+
+
+def _decode_cursor(cursor: str):
+    if cursor is None:
+        return None
+    t, _, log_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(t), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _audit_event(row) -> dict:
+    log_id, t, tag, actor, msg = row
+    return {"id": log_id, "time": t.strftime(TIME_FORMAT), "tag": tag, "actor": actor, "message": msg}
+
+
+async def get_audit_logs(
+    db_cursor, user_email: str, tag: str, actor: str, since: str, until: str, cursor: str, limit: int
+):
+    # checking constraints
+    await constraints.assert_admin_access(db_cursor, user_email)
+    _check_tag(tag)
+    if not 1 <= limit <= AUDIT_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"Limit should be from 1 to {AUDIT_PAGE_MAX}")
+    since, until, after = _parse_time("since", since), _parse_time("until", until), _decode_cursor(cursor)
+
+    # newest first
+    rows = await repo_log.sql_select_logs(db_cursor, tag, actor, since, until, after, True, limit)
+    return {
+        "events": [_audit_event(row) for row in rows],
+        "next_cursor": _encode_cursor(rows[-1]) if len(rows) == limit else None,
+    }
+
+
+async def _stream_audit_logs(tag: str, actor: str, since: datetime, until: datetime):
+    after = None
+    while True:
+        # a short transaction per page, so that a slow client holds no connection
+        async with get_db() as (db_conn, db_cursor):
+            rows = await repo_log.sql_select_logs(db_cursor, tag, actor, since, until, after, False, AUDIT_EXPORT_PAGE)
+        if not rows:
+            return
+        yield "".join(json.dumps(_audit_event(row), ensure_ascii=False) + "\n" for row in rows).encode()
+        if len(rows) < AUDIT_EXPORT_PAGE:
+            return
+        after = rows[-1][1], rows[-1][0]
+
+
+async def export_audit_logs(db_cursor, user_email: str, tag: str, actor: str, since: str, until: str):
+    # checking constraints
+    await constraints.assert_admin_access(db_cursor, user_email)
+    _check_tag(tag)
+    since, until = _parse_time("since", since), _parse_time("until", until)
+
+    # oldest first, up to the start of the export unless the end is given
+    if until is None:
+        until = datetime.now(timezone.utc).replace(tzinfo=None)
+    return StreamingResponse(
+        _stream_audit_logs(tag, actor, since, until),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="audit_logs.ndjson"'},
+    )
 
 
 _TAG_ASSIGNMENT = "assignment"
@@ -17,12 +272,14 @@ _TAG_USER = "user"
 _TAG_SUBMISSION = "submission"
 _TAG_ATTACHMENT = "attachment"
 _TAG_ADMIN = "admin"
+_TAG_STORAGE = "storage"
 
 _ACT_ADD = "add"
 _ACT_DEL = "del"
 _ACT_SUBMIT = "submit"
 _ACT_GRADE = "grade"
 _ACT_CHANGE_PASSWORD = "changepw"
+_ACT_GC = "gc"
 
 
 TAG_ASSIGNMENT_ADD = f"{_TAG_ASSIGNMENT} {_ACT_ADD}"
@@ -56,3 +313,7 @@ TAG_ATTACHMENT_ADD_SUB = f" {_TAG_SUBMISSION} {TAG_ATTACHMENT_ADD}"
 
 TAG_ADMIN_ADD = f"{_TAG_ADMIN} {_ACT_ADD}"
 TAG_ADMIN_DEL = f"{_TAG_ADMIN} {_ACT_DEL}"
+
+TAG_STORAGE_GC = f"{_TAG_STORAGE} {_ACT_GC}"
+
+TAGS = {value for name, value in list(globals().items()) if name.startswith("TAG_")}
@@ -0,0 +1,47 @@
+import constraints
+import memo
+import logic.blobgc
+import logic.logging
+import statements
+from auth import token_cache, get_pool_stats, get_replica_stats, get_storage_db
+import repo.files as repo_files
+from repo.blobs import blob_cache
+
+
+async def get_server_metrics(db_cursor, user_email: str):
+    # checking constraints
+    await constraints.assert_admin_access(db_cursor, user_email)
+
+    return {
+        "request_memo": memo.get_stats(),
+        "token_cache": token_cache.stats(),
+        "role_cache": constraints.role_cache.stats(),
+        "database_pools": get_pool_stats(),
+        "replica_routing": get_replica_stats(),
+        "prepared_statements": statements.get_stats(),
+        "blob_cache": blob_cache.stats(),
+        "storage_gc": logic.blobgc.get_stats(),
+        "log_writer": logic.logging.log_writer.stats(),
+    }
+
+
+async def get_storage_stats(db_cursor, user_email: str):
+    # checking constraints
+    await constraints.assert_admin_access(db_cursor, user_email)
+
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        stats = await repo_files.sql_select_storage_stats(storage_db_cursor)
+    files, references, stored_bytes, referenced_bytes, chunked_bytes, encoded_bytes = stats
+
+    return {
+        "files": files,
+        "references": references,
+        "stored_bytes": stored_bytes,
+        "referenced_bytes": referenced_bytes,
+        "bytes_saved": referenced_bytes - stored_bytes,
+        "dedup_ratio": referenced_bytes / stored_bytes if stored_bytes else 1.0,
+        # the files in the storage database before and after compression
+        "database_bytes": chunked_bytes,
+        "database_compressed_bytes": encoded_bytes,
+        "compression_ratio": chunked_bytes / encoded_bytes if encoded_bytes else 1.0,
+    }
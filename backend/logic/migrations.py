@@ -0,0 +1,54 @@
+import os
+import repo.migrations as repo_migrations
+import repo.files as repo_files
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+# ordered (version, name, path) of the migrations of a database,
+# taken from migrations/<database>/<version>_<name>.sql
+def list_migrations(database: str) -> list[tuple[int, str, str]]:
+    directory = os.path.join(MIGRATIONS_DIR, database)
+    if not os.path.isdir(directory):
+        return []
+    res = []
+    for filename in os.listdir(directory):
+        if not filename.endswith(".sql"):
+            continue
+        version, _, name = filename[:-4].partition("_")
+        res.append((int(version), name, os.path.join(directory, filename)))
+    return sorted(res)
+
+
+# applies the migrations that are not applied yet, all in one transaction
+async def migrate(db_conn, db_cursor, database: str) -> list[str]:
+    await repo_migrations.sql_lock_migrations(db_cursor)
+    await repo_migrations.sql_create_migrations_table(db_cursor)
+    applied = await repo_migrations.sql_select_applied_migrations(db_cursor)
+
+    res = []
+    for version, name, path in list_migrations(database):
+        if version in applied:
+            continue
+        with open(path, encoding="utf-8") as script:
+            await repo_migrations.sql_run_migration_script(db_cursor, script.read())
+        await repo_migrations.sql_insert_migration(db_cursor, version, name)
+        res.append(f"{version:04d}_{name}")
+
+    await db_conn.commit()
+    return res
+
+
+# fills the sizes and hashes of the attachments uploaded before the system
+# database kept them; the ones whose file is not in the storage stay empty
+async def backfill_attachment_info(db_conn, db_cursor, storage_db_cursor) -> int:
+    file_ids = await repo_migrations.sql_select_attachments_without_info(db_cursor)
+    if not file_ids:
+        return 0
+
+    files_info = await repo_files.sql_select_files_info(storage_db_cursor, file_ids)
+    for file_id, size, sha256 in files_info:
+        await repo_migrations.sql_update_attachment_info(db_cursor, file_id, size, sha256)
+
+    await db_conn.commit()
+    return len(files_info)
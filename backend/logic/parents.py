@@ -4,23 +4,24 @@ import repo.parents as repo_parents
 import logic.logging as logger
 
 
-def get_students_parents(db_cursor, course_id: str, student_email: str, user_email: str):
+async def get_students_parents(db_cursor, course_id: str, student_email: str, user_email: str):
 
     # checking constraints
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    user, student = await constraints.resolve_course_access(db_cursor, course_id, user_email, student_email)
+    user.assert_teacher_access()
 
     # check if the student is enrolled to course
-    if not constraints.check_student_access(db_cursor, student_email, course_id):
+    if not student.check_student_access():
         raise HTTPException(status_code=404, detail="Provided user in not a student at this course")
 
     # finding student's parents
-    parents = repo_parents.sql_select_students_parents(db_cursor, course_id, student_email)
+    parents = await repo_parents.sql_select_students_parents(db_cursor, course_id, student_email)
 
     res = [{"email": par[0], "name": par[1]} for par in parents]
     return res
 
 
-def invite_parent(
+async def invite_parent(
     db_conn,
     db_cursor,
     course_id: str,
@@ -30,31 +31,35 @@ def invite_parent(
 ):
 
     # checking constraints
-    constraints.assert_teacher_access(db_cursor, teacher_email, course_id)
-    constraints.assert_student_access(db_cursor, student_email, course_id)
+    teacher, student, parent = await constraints.resolve_course_access(
+        db_cursor, course_id, teacher_email, student_email, parent_email
+    )
+    teacher.assert_teacher_access()
+    student.assert_student_access()
 
     # check if the parent already assigned to the course with the student
-    if constraints.check_parent_student_access(db_cursor, parent_email, student_email, course_id):
+    if parent.check_parent_student_access(student):
         raise HTTPException(status_code=403, detail="Parent already assigned to this student at this course")
 
     # check if the potential parent already has teacher rights at this course
-    if constraints.check_teacher_access(db_cursor, parent_email, course_id):
+    if parent.check_teacher_access():
         raise HTTPException(status_code=403, detail="Can't invite course teacher as a parent")
 
     # check if the potential parent already has student rights at this course
-    if constraints.check_student_access(db_cursor, parent_email, course_id):
+    if parent.check_student_access():
         raise HTTPException(status_code=403, detail="Can't invite course student as a parent")
 
     # invite parent
-    repo_parents.sql_insert_parent_of_at_course(db_cursor, parent_email, student_email, course_id)
-    db_conn.commit()
+    await repo_parents.sql_insert_parent_of_at_course(db_cursor, parent_email, student_email, course_id)
+    await db_conn.commit()
+    constraints.role_cache.invalidate(parent_email, constraints.normalize_course_id(course_id))
 
-    logger.log(db_conn, logger.TAG_PARENT_ADD, f"Teacher {teacher_email} invited a parent {parent_email} for student {student_email}")
+    logger.log(logger.TAG_PARENT_ADD, f"Teacher {teacher_email} invited a parent {parent_email} for student {student_email}", actor=teacher_email)
 
     return {"success": True}
 
 
-def remove_parent(
+async def remove_parent(
     db_conn,
     db_cursor,
     course_id: str,
@@ -64,30 +69,34 @@ def remove_parent(
 ):
 
     # checking constraints
+    user, parent, student = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, parent_email, student_email
+    )
     if not (
-        constraints.check_teacher_access(db_cursor, user_email, course_id)
-        or (constraints.check_parent_access(db_cursor, user_email, course_id) and parent_email == user_email)
+        user.check_teacher_access()
+        or (user.check_parent_access() and parent_email == user_email)
     ):
         raise HTTPException(status_code=403, detail="User does not have permissions to delete this parent")
 
     # check if the parent assigned to the course with the student
-    constraints.assert_parent_student_access(db_cursor, parent_email, student_email, course_id)
+    parent.assert_parent_student_access(student)
 
     # remove parent
-    repo_parents.sql_delete_parent_of_at_course(db_cursor, course_id, student_email, parent_email)
-    db_conn.commit()
+    await repo_parents.sql_delete_parent_of_at_course(db_cursor, course_id, student_email, parent_email)
+    await db_conn.commit()
+    constraints.role_cache.invalidate(parent_email, constraints.normalize_course_id(course_id))
 
-    logger.log(db_conn, logger.TAG_PARENT_DEL, f"Teacher {user_email} removed a parent {parent_email} for student {student_email}")
+    logger.log(logger.TAG_PARENT_DEL, f"Teacher {user_email} removed a parent {parent_email} for student {student_email}", actor=user_email)
 
     return {"success": True}
 
 
-def get_parents_children(db_cursor, course_id: str, user_email: str):
+async def get_parents_children(db_cursor, course_id: str, user_email: str):
 
     # checking constraints
-    constraints.assert_course_exists(db_cursor, course_id)
+    await constraints.assert_course_exists(db_cursor, course_id)
 
-    parents_children = repo_parents.sql_select_parents_children(db_cursor, course_id, user_email)
+    parents_children = await repo_parents.sql_select_parents_children(db_cursor, course_id, user_email)
 
     res = [{"email": child[0], "name": child[1]} for child in parents_children]
     return res
@@ -4,61 +4,65 @@ import repo.students as repo_students
 import logic.logging as logger
 
 
-def get_enrolled_students(db_cursor, course_id: str, user_email: str):
+async def get_enrolled_students(db_cursor, course_id: str, user_email: str):
     # checking constraints
-    constraints.assert_course_access(db_cursor, user_email, course_id)
+    await constraints.assert_course_access(db_cursor, user_email, course_id)
 
     # finding enrolled students
-    students = repo_students.sql_select_enrolled_students(db_cursor, course_id)
+    students = await repo_students.sql_select_enrolled_students(db_cursor, course_id)
 
     res = [{"email": st[0], "name": st[1]} for st in students]
     return res
 
 
-def invite_student(db_conn, db_cursor, course_id: str, student_email: str, teacher_email: str):
+async def invite_student(db_conn, db_cursor, course_id: str, student_email: str, teacher_email: str):
     # checking constraints
-    constraints.assert_user_exists(db_cursor, student_email)
-    constraints.assert_teacher_access(db_cursor, teacher_email, course_id)
+    teacher, student = await constraints.resolve_course_access(db_cursor, course_id, teacher_email, student_email)
+    student.assert_user_exists()
+    teacher.assert_teacher_access()
 
     # check if the student already enrolled to course
-    if constraints.check_student_access(db_cursor, student_email, course_id):
+    if student.check_student_access():
         raise HTTPException(
             status_code=403,
             detail="The invited user already has student rights in this course",
         )
 
     # check if the potential student already has teacher rights at this course
-    if constraints.check_teacher_access(db_cursor, student_email, course_id):
+    if student.check_teacher_access():
         raise HTTPException(status_code=403, detail="Can't invite course teacher as a student")
 
     # check if the potential student already has parent rights at this course
-    if constraints.check_parent_access(db_cursor, student_email, course_id):
+    if student.check_parent_access():
         raise HTTPException(status_code=403, detail="Can't invite parent as a student")
 
     # invite student
-    repo_students.sql_insert_student_at(db_cursor, student_email, course_id)
-    db_conn.commit()
+    await repo_students.sql_insert_student_at(db_cursor, student_email, course_id)
+    await db_conn.commit()
+    constraints.role_cache.invalidate(student_email, constraints.normalize_course_id(course_id))
 
-    logger.log(db_conn, logger.TAG_STUDENT_ADD, f"Teacher {teacher_email} invited a student {student_email}")
+    logger.log(logger.TAG_STUDENT_ADD, f"Teacher {teacher_email} invited a student {student_email}", actor=teacher_email)
     return {"success": True}
 
 
-def remove_student(db_conn, db_cursor, course_id: str, student_email: str, user_email: str):
+async def remove_student(db_conn, db_cursor, course_id: str, student_email: str, user_email: str):
     # checking constraints
+    user, student = await constraints.resolve_course_access(db_cursor, course_id, user_email, student_email)
     if not (
-        constraints.check_teacher_access(db_cursor, user_email, course_id)
-        or (constraints.check_student_access(db_cursor, user_email, course_id) and student_email == user_email)
+        user.check_teacher_access()
+        or (user.check_student_access() and student_email == user_email)
     ):
         raise HTTPException(status_code=403, detail="User does not have permissions to delete this student")
 
     # check if the student is enrolled to course
-    if not constraints.check_student_access(db_cursor, student_email, course_id):
+    if not student.check_student_access():
         raise HTTPException(status_code=404, detail="User to remove is not a student at this course")
 
     # remove student
-    repo_students.sql_delete_student_at(db_cursor, course_id, student_email)
-    db_conn.commit()
+    await repo_students.sql_delete_student_at(db_cursor, course_id, student_email)
+    await db_conn.commit()
+    constraints.role_cache.invalidate_student(student_email, constraints.normalize_course_id(course_id))
 
-    logger.log(db_conn, logger.TAG_STUDENT_DEL, f"Teacher {user_email} removed a student {student_email}")
+    logger.log(logger.TAG_STUDENT_DEL, f"Teacher {user_email} removed a student {student_email}", actor=user_email)
 
     return {"success": True}
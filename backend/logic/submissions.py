@@ -1,13 +1,20 @@
-from fastapi import HTTPException, UploadFile, Response
+import json
+from datetime import datetime
+from fastapi import HTTPException, UploadFile, Request
+from fastapi.responses import StreamingResponse
+from auth import get_storage_db
 from constants import TIME_FORMAT
 import constraints
 import repo.submissions as repo_submit
 import repo.files as repo_files
 import logic.logging as logger
-from logic.uploading import careful_upload
+from logic.uploading import careful_upload, careful_upload_all, finish_upload
+from logic.downloading import stream_attachment
+from logic.zipping import stream_zip, unique_entry_name
+from repo.blobs import get_blob_store
 
 
-def submit_assignment(
+async def submit_assignment(
     db_conn,
     db_cursor,
     course_id: str,
@@ -17,36 +24,40 @@ def submit_assignment(
 ):
 
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_student_access(db_cursor, student_email, course_id)
+    student, = await constraints.resolve_course_access(
+        db_cursor, course_id, student_email, assignment_id=assignment_id
+    )
+    student.assert_assignment_exists()
+    student.assert_student_access()
 
-    submission = repo_submit.sql_select_submission_grade(db_cursor, course_id, assignment_id, student_email)
+    submission = await repo_submit.sql_select_submission_grade(db_cursor, course_id, assignment_id, student_email)
 
     # inserting submission
     if submission is None:
-        repo_submit.sql_insert_submission(db_cursor, course_id, assignment_id, student_email, comment)
-        db_conn.commit()
+        await repo_submit.sql_insert_submission(db_cursor, course_id, assignment_id, student_email, comment)
+        await db_conn.commit()
 
     # updating submission if not graded
     elif submission and submission[0] in (None, "null"):
-        repo_submit.sql_update_submission_comment(db_cursor, comment, course_id, assignment_id, student_email)
-        db_conn.commit()
+        await repo_submit.sql_update_submission_comment(db_cursor, comment, course_id, assignment_id, student_email)
+        await db_conn.commit()
 
     else:
         raise HTTPException(status_code=404, detail="Can't edit the submission after it was graded.")
 
-    logger.log(db_conn, logger.TAG_ASSIGNMENT_SUBMIT, f"Student {student_email} submitted an assignment{assignment_id} in {course_id}")
+    logger.log(logger.TAG_ASSIGNMENT_SUBMIT, f"Student {student_email} submitted an assignment{assignment_id} in {course_id}", actor=student_email)
 
     return {"success": True}
 
 
-def get_assignment_submissions(db_cursor, course_id: str, assignment_id: str, user_email: str):
+async def get_assignment_submissions(db_cursor, course_id: str, assignment_id: str, user_email: str):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
 
     # finding students' submissions
-    submissions = repo_submit.sql_select_submissions(db_cursor, course_id, assignment_id)
+    submissions = await repo_submit.sql_select_submissions(db_cursor, course_id, assignment_id)
 
     res = [
         {
@@ -65,7 +76,7 @@ def get_assignment_submissions(db_cursor, course_id: str, assignment_id: str, us
     return res
 
 
-def get_submission(
+async def get_submission(
     db_cursor,
     course_id: str,
     assignment_id: str,
@@ -73,17 +84,20 @@ def get_submission(
     user_email: str,
 ):
     # checking constraints
-    constraints.assert_assignment_exists(db_cursor, course_id, assignment_id)
-    constraints.assert_student_access(db_cursor, student_email, course_id)
+    user, student = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, student_email, assignment_id=assignment_id
+    )
+    student.assert_assignment_exists()
+    student.assert_student_access()
     if not (
-        constraints.check_teacher_access(db_cursor, user_email, course_id)
-        or constraints.check_parent_student_access(db_cursor, user_email, student_email, course_id)
+        user.check_teacher_access()
+        or user.check_parent_student_access(student)
         or student_email == user_email
     ):
         raise HTTPException(status_code=403, detail="User does not have access to this submission")
 
     # finding student's submission
-    submission = repo_submit.sql_select_single_submission(db_cursor, course_id, assignment_id, student_email)
+    submission = await repo_submit.sql_select_single_submission(db_cursor, course_id, assignment_id, student_email)
     if not submission:
         raise HTTPException(status_code=404, detail="Submission of this user is not found")
 
@@ -101,7 +115,7 @@ def get_submission(
     return res
 
 
-def grade_submission(
+async def grade_submission(
     db_conn,
     db_cursor,
     course_id: str,
@@ -111,54 +125,123 @@ def grade_submission(
     user_email: str,
 ):
     # checking constraints
-    constraints.assert_teacher_access(db_cursor, user_email, course_id)
-    constraints.assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
+    user, student = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, student_email, assignment_id=assignment_id
+    )
+    user.assert_teacher_access()
+    student.assert_submission_exists()
 
-    repo_submit.sql_update_submission_grade(db_cursor, grade, user_email, course_id, assignment_id, student_email)
-    db_conn.commit()
+    await repo_submit.sql_update_submission_grade(db_cursor, grade, user_email, course_id, assignment_id, student_email)
+    await db_conn.commit()
 
-    logger.log(db_conn, logger.TAG_ASSIGNMENT_GRADE, f"Teacher {user_email} graded an assignment {assignment_id} in {course_id} by {student_email}")
+    logger.log(logger.TAG_ASSIGNMENT_GRADE, f"Teacher {user_email} graded an assignment {assignment_id} in {course_id} by {student_email}", actor=user_email)
 
     return {"success": True}
 
 
 async def create_submission_attachment(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, student_email: str, file: UploadFile, user_email: str):
     # checking constraints
-    constraints.assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
+    student, = await constraints.resolve_course_access(
+        db_cursor, course_id, student_email, assignment_id=assignment_id
+    )
+    student.assert_submission_exists()
     if student_email != user_email:
         raise HTTPException(status_code=403, detail="User does not have access to this submission")
 
-    # read the file
-    contents = await careful_upload(file)
+    # stream the file into the storage database
+    content_id, size, sha256 = await careful_upload(storage_db_cursor, file)
 
-    # save the file into database
-    attachment_metadata = repo_submit.sql_insert_submission_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, student_email, file.filename, contents)
-    db_conn.commit()
-    storage_db_conn.commit()
+    # save the file metadata into database
+    attachment_metadata = await repo_submit.sql_insert_submission_attachment(db_cursor, course_id, assignment_id, student_email, content_id, file.filename, size, sha256)
+    await db_conn.commit()
+    await storage_db_conn.commit()
 
-    logger.log(db_conn, logger.TAG_ATTACHMENT_ADD_SUB, f"User {user_email} created an attachment {file.filename} for the submission for the assignment {assignment_id} in course {course_id}")
+    logger.log(logger.TAG_ATTACHMENT_ADD_SUB, f"User {user_email} created an attachment {file.filename} for the submission for the assignment {assignment_id} in course {course_id}", actor=user_email)
     return {
         "course_id": course_id,
         "assignment_id": assignment_id,
         'student_email': student_email,
         'file_id': attachment_metadata[0],
         'filename' : file.filename,
-        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT)
+        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT),
+        'size': size,
+    }
+
+
+async def create_submission_attachments(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, student_email: str, files: list[UploadFile], user_email: str):
+    # checking constraints
+    student, = await constraints.resolve_course_access(
+        db_cursor, course_id, student_email, assignment_id=assignment_id
+    )
+    student.assert_submission_exists()
+    if student_email != user_email:
+        raise HTTPException(status_code=403, detail="User does not have access to this submission")
+
+    # stream the files into the storage database
+    attachments = await careful_upload_all(storage_db_cursor, files)
+
+    # save the metadata of all the files into database at once
+    file_ids, upload_time = await repo_submit.sql_insert_submission_attachments(db_cursor, course_id, assignment_id, student_email, attachments)
+    await db_conn.commit()
+    await storage_db_conn.commit()
+
+    filenames = ", ".join(file.filename for file in files)
+    logger.log(logger.TAG_ATTACHMENT_ADD_SUB, f"User {user_email} created attachments {filenames} for the submission for the assignment {assignment_id} in course {course_id}", actor=user_email)
+    return [{
+        "course_id": course_id,
+        "assignment_id": assignment_id,
+        "student_email": student_email,
+        "file_id": file_id,
+        "filename": filename,
+        "upload_time": upload_time.strftime(TIME_FORMAT),
+        "size": size,
+    } for file_id, (_, filename, size, _) in zip(file_ids, attachments)]
+
+
+async def finish_submission_attachment_upload(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id: str, assignment_id: str, student_email: str, upload_id: str, user_email: str):
+    # checking constraints
+    student, = await constraints.resolve_course_access(
+        db_cursor, course_id, student_email, assignment_id=assignment_id
+    )
+    student.assert_submission_exists()
+    if student_email != user_email:
+        raise HTTPException(status_code=403, detail="User does not have access to this submission")
+
+    # assemble the parts of the resumable upload into a file
+    content_id, filename, size, sha256 = await finish_upload(storage_db_cursor, upload_id, user_email)
+
+    # save the file metadata into database
+    attachment_metadata = await repo_submit.sql_insert_submission_attachment(db_cursor, course_id, assignment_id, student_email, content_id, filename, size, sha256)
+    await db_conn.commit()
+    await storage_db_conn.commit()
+
+    logger.log(logger.TAG_ATTACHMENT_ADD_SUB, f"User {user_email} created an attachment {filename} for the submission for the assignment {assignment_id} in course {course_id}", actor=user_email)
+    return {
+        "course_id": course_id,
+        "assignment_id": assignment_id,
+        'student_email': student_email,
+        'file_id': attachment_metadata[0],
+        'filename' : filename,
+        'upload_time' : attachment_metadata[1].strftime(TIME_FORMAT),
+        'size': size,
     }
 
 
-def get_submission_attachments(db_cursor, course_id: str, assignment_id: str, student_email: str, user_email: str):
+async def get_submission_attachments(db_cursor, course_id: str, assignment_id: str, student_email: str, user_email: str):
     # checking constraints
-    constraints.assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
+    user, student = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, student_email, assignment_id=assignment_id
+    )
+    student.assert_submission_exists()
     if not (
-        constraints.check_teacher_access(db_cursor, user_email, course_id)
-        or constraints.check_parent_student_access(db_cursor, user_email, student_email, course_id)
+        user.check_teacher_access()
+        or user.check_parent_student_access(student)
         or student_email == user_email
     ):
         raise HTTPException(status_code=403, detail="User does not have access to this submission")
 
     # searching for submission attachments
-    files = repo_submit.sql_select_submission_attachments(db_cursor, course_id, assignment_id, student_email)
+    files = await repo_submit.sql_select_submission_attachments(db_cursor, course_id, assignment_id, student_email)
 
     res = [{
         "course_id": course_id,
@@ -166,30 +249,86 @@ def get_submission_attachments(db_cursor, course_id: str, assignment_id: str, st
         'student_email': student_email,
         "file_id": file[0],
         "filename": file[1],
-        "upload_time": file[2].strftime(TIME_FORMAT)
+        "upload_time": file[2].strftime(TIME_FORMAT),
+        "size": file[3],
     } for file in files]
  
     return res
 
 
-def download_submission_attachment(db_cursor, storage_db_cursor, course_id: str, assignment_id: str, student_email: str, file_id: str, user_email: str):
+async def download_submission_attachment(db_cursor, request: Request, course_id: str, assignment_id: str, student_email: str, file_id: str, user_email: str):
     # checking constraints
-    constraints.assert_submission_exists(db_cursor, course_id, assignment_id, student_email)
+    user, student = await constraints.resolve_course_access(
+        db_cursor, course_id, user_email, student_email, assignment_id=assignment_id
+    )
+    student.assert_submission_exists()
     if not (
-        constraints.check_teacher_access(db_cursor, user_email, course_id)
-        or constraints.check_parent_student_access(db_cursor, user_email, student_email, course_id)
+        user.check_teacher_access()
+        or user.check_parent_student_access(student)
         or student_email == user_email
     ):
         raise HTTPException(status_code=403, detail="User does not have access to this submission")
 
     # searching for submission attachment
-    file = repo_files.sql_download_attachment(storage_db_cursor, file_id)
-    file_metadata = repo_files.sql_select_attachment_metadata(db_cursor, file_id)
-    if (not file or not file_metadata):
+    file_metadata = await repo_submit.sql_select_submission_attachment(db_cursor, course_id, assignment_id, student_email, file_id)
+    if not file_metadata:
         raise HTTPException(status_code=404, detail="Attachment not found")
 
-    return Response(
-        content=file,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{file_metadata[1]}"'}
+    content_id, filename, upload_time, size, sha256 = file_metadata
+    return await stream_attachment(request, content_id, filename, upload_time, size, sha256)
+
+
+async def download_assignment_submissions_zip(db_cursor, course_id: str, assignment_id: str, user_email: str):
+    # checking constraints
+    user, = await constraints.resolve_course_access(db_cursor, course_id, user_email, assignment_id=assignment_id)
+    user.assert_assignment_exists()
+    user.assert_teacher_access()
+
+    # everything but the contents of the files is read before the response starts
+    submissions = await repo_submit.sql_select_submissions(db_cursor, course_id, assignment_id)
+    attachments = await repo_submit.sql_select_assignment_submissions_attachments(db_cursor, course_id, assignment_id)
+    content_ids = [str(attachment[1]) for attachment in attachments]
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        backends = await repo_files.sql_select_files_backends(storage_db_cursor, content_ids)
+
+    manifest = {
+        "course_id": course_id,
+        "assignment_id": assignment_id,
+        "submissions": [],
+    }
+    by_student = {}
+    for sub in submissions:
+        entry = {
+            "student_email": sub[0],
+            "student_name": sub[1],
+            "submission_time": sub[2].strftime(TIME_FORMAT),
+            "last_modification_time": sub[3].strftime(TIME_FORMAT),
+            "comment": sub[4],
+            "grade": sub[5],
+            "gradedby_email": sub[6],
+            "files": [],
+        }
+        manifest["submissions"].append(entry)
+        by_student[sub[0]] = entry
+
+    # one folder per student, the files of the missing blobs are left out
+    files = []
+    taken = set()
+    for student_email, content_id, filename, upload_time, size in attachments:
+        content_id = str(content_id)
+        if student_email not in by_student or content_id not in backends:
+            continue
+        name = unique_entry_name(student_email, filename, taken)
+        by_student[student_email]["files"].append(
+            {"path": name, "filename": filename, "upload_time": upload_time.strftime(TIME_FORMAT), "size": size}
+        )
+        files.append((name, upload_time, get_blob_store(backends[content_id]).read(content_id)))
+
+    manifest_content = json.dumps(manifest, ensure_ascii=False, indent=2).encode()
+    entries = [("manifest.json", datetime.now(), manifest_content)] + files
+
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="submissions_{assignment_id}.zip"'},
     )
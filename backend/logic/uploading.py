@@ -1,23 +1,234 @@
-from fastapi import HTTPException, UploadFile
+import os
+from uuid import UUID
+from fastapi import HTTPException, UploadFile, Request
+from hashlib import sha256
+from auth import get_storage_db
+from constants import TIME_FORMAT
+import repo.files as repo_files
+import repo.uploads as repo_uploads
+from repo.blobs import CHUNK_SIZE, get_blob_store, remove_blobs
 
 MAX_SIZE = 5 * 1024 * 1024
-CHUNK_SIZE = 64 * 1024
+# how many files one request may attach at once
+MAX_BATCH_FILES = 20
 
-async def careful_upload(file: UploadFile):
+# resumable uploads send larger files in parts of UPLOAD_PART_SIZE bytes
+# (the last part may be shorter), which stays under the default request
+# body limit of nginx
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 1024 * 1024 * 1024))
+UPLOAD_PART_SIZE = 8 * CHUNK_SIZE
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+MAX_UPLOAD_SESSIONS = 10
+# how many expired sessions are deleted at once, see expire_uploads
+EXPIRE_UPLOADS_BATCH_SIZE = 100
+
+
+async def _read_chunks(file: UploadFile):
     total_size = 0
-    chunks = []
     while True:
         chunk = await file.read(CHUNK_SIZE)
         if not chunk:
             break
-        
+
         total_size += len(chunk)
         if total_size > MAX_SIZE:
             raise HTTPException(
                 status_code=413,
                 detail=f"File too large (max {MAX_SIZE} bytes)"
             )
-        chunks.append(chunk)
+        yield chunk
+
+
+async def _hashed(chunks, digest):
+    async for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+# streams the chunks into the blob store of the new uploads and returns the
+# ID, size and SHA-256 of the file; an error in the chunks fails the request,
+# so the storage transaction is rolled back
+async def _store_file(storage_db_cursor, chunks) -> tuple[str, int, str]:
+    store = get_blob_store()
+    file_id = await repo_files.sql_insert_file(storage_db_cursor, store.name)
+    digest = sha256()
+    size = await store.write(storage_db_cursor, file_id, _hashed(chunks, digest))
+    file_hash = digest.hexdigest()
+
+    # the same content is stored once, the new copy is dropped in favor of the old one
+    await repo_files.sql_lock_file_hash(storage_db_cursor, file_hash)
+    existing_file_id = await repo_files.sql_select_file_by_hash(storage_db_cursor, file_hash, file_id)
+    if existing_file_id is not None:
+        await repo_files.sql_delete_file(storage_db_cursor, file_id)
+        await remove_blobs([(file_id, store.name)])
+        await repo_files.sql_add_file_reference(storage_db_cursor, existing_file_id)
+        return existing_file_id, size, file_hash
+
+    await repo_files.sql_update_file_info(storage_db_cursor, file_id, size, file_hash)
+    return file_id, size, file_hash
+
+
+# streams the file into the blob store one chunk at a time, see _store_file
+async def careful_upload(storage_db_cursor, file: UploadFile) -> tuple[str, int, str]:
+    return await _store_file(storage_db_cursor, _read_chunks(file))
+
+
+# streams the files one after another, see careful_upload; returns the
+# (file_id, filename, size, sha256) tuples of the attachments to insert, where
+# file_id is the ID of the stored file, the content ID of the attachment
+async def careful_upload_all(storage_db_cursor, files: list[UploadFile]) -> list[tuple[str, str, int, str]]:
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {MAX_BATCH_FILES})")
+
+    attachments = []
+    for file in files:
+        file_id, size, sha256 = await careful_upload(storage_db_cursor, file)
+        attachments.append((file_id, file.filename, size, sha256))
+    return attachments
+
+
+# drops one reference per attachment removed from the system database;
+# the files no attachment uses any more are deleted
+async def release_files(file_ids: list[str]):
+    if not file_ids:
+        return
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        deleted_files = await repo_files.sql_release_files(storage_db_cursor, file_ids)
+    await remove_blobs(deleted_files)
+
+
+def _parse_upload_id(upload_id: str) -> str:
+    try:
+        return str(UUID(upload_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+
+def _count_parts(size: int) -> int:
+    return -(-size // UPLOAD_PART_SIZE)
+
+
+def _part_size(size: int, part: int) -> int:
+    return min(UPLOAD_PART_SIZE, size - part * UPLOAD_PART_SIZE)
+
+
+# [first, last] runs of the consecutive part numbers
+def _part_runs(parts: list[int]) -> list[list[int]]:
+    runs = []
+    for part in parts:
+        if runs and runs[-1][1] == part - 1:
+            runs[-1][1] = part
+        else:
+            runs.append([part, part])
+    return runs
+
+
+async def initiate_upload(filename: str, size: int, user_email: str):
+    if size < 0:
+        raise HTTPException(status_code=400, detail="Invalid file size")
+    if size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_SIZE} bytes)")
+
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        if await repo_uploads.sql_count_upload_sessions(storage_db_cursor, user_email) >= MAX_UPLOAD_SESSIONS:
+            raise HTTPException(status_code=429, detail=f"Too many unfinished uploads (max {MAX_UPLOAD_SESSIONS})")
+        upload_id, expires = await repo_uploads.sql_insert_upload_session(
+            storage_db_cursor, user_email, filename, size, UPLOAD_SESSION_TTL_SECONDS
+        )
+
+    return {
+        "upload_id": str(upload_id),
+        "size": size,
+        "part_size": UPLOAD_PART_SIZE,
+        "parts": _count_parts(size),
+        "expires": expires.strftime(TIME_FORMAT),
+    }
+
+
+# the body of the request is the part, the parts may be sent in any order
+# and at the same time
+async def upload_part(request: Request, upload_id: str, part: int, user_email: str):
+    upload_id = _parse_upload_id(upload_id)
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        session = await repo_uploads.sql_select_upload_session(storage_db_cursor, upload_id, user_email)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    _, size, _ = session
+    if not 0 <= part < _count_parts(size):
+        raise HTTPException(status_code=400, detail="Invalid part number")
+
+    # no storage connection is held while the part arrives
+    expected_size = _part_size(size, part)
+    content = bytearray()
+    async for piece in request.stream():
+        content += piece
+        if len(content) > expected_size:
+            raise HTTPException(status_code=413, detail=f"Part too large (expected {expected_size} bytes)")
+    if len(content) != expected_size:
+        raise HTTPException(status_code=400, detail=f"Part too small (expected {expected_size} bytes)")
+
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        # the session may have been finished or expired in the meantime
+        if await repo_uploads.sql_select_upload_session(storage_db_cursor, upload_id, user_email) is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        await repo_uploads.sql_upsert_upload_part(storage_db_cursor, upload_id, part, bytes(content))
+
+    return {"success": True}
+
+
+async def get_upload_status(upload_id: str, user_email: str):
+    upload_id = _parse_upload_id(upload_id)
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        session = await repo_uploads.sql_select_upload_session(storage_db_cursor, upload_id, user_email)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        parts = await repo_uploads.sql_select_upload_part_numbers(storage_db_cursor, upload_id)
+
+    filename, size, expires = session
+    runs = _part_runs(parts)
+    return {
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "part_size": UPLOAD_PART_SIZE,
+        "parts": _count_parts(size),
+        "received_parts": runs,
+        "received_ranges": [
+            [first * UPLOAD_PART_SIZE, last * UPLOAD_PART_SIZE + _part_size(size, last) - 1] for first, last in runs
+        ],
+        "expires": expires.strftime(TIME_FORMAT),
+    }
+
+
+# the parts one after another, read with the cursor of the transaction that
+# stores them; a second connection from the same pool could wait for a free one
+# forever when many uploads are finished at once
+async def _read_parts(storage_db_cursor, upload_id: str, parts: int):
+    for part in range(parts):
+        yield await repo_uploads.sql_select_upload_part(storage_db_cursor, upload_id, part)
+
+
+# assembles the parts of a complete upload into a file, like careful_upload does
+# with a file sent at once, and deletes the session in the same transaction;
+# returns the ID, filename, size and SHA-256 of the file
+async def finish_upload(storage_db_cursor, upload_id: str, user_email: str) -> tuple[str, str, int, str]:
+    upload_id = _parse_upload_id(upload_id)
+    session = await repo_uploads.sql_lock_upload_session(storage_db_cursor, upload_id, user_email)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    filename, size, _ = session
+    parts, received = await repo_uploads.sql_select_upload_progress(storage_db_cursor, upload_id)
+    if parts != _count_parts(size) or received != size:
+        raise HTTPException(status_code=409, detail="Upload is not complete")
+
+    file_id, size, file_hash = await _store_file(storage_db_cursor, _read_parts(storage_db_cursor, upload_id, parts))
+    await repo_uploads.sql_delete_upload_session(storage_db_cursor, upload_id)
+    return file_id, filename, size, file_hash
+
 
-    file_data = b''.join(chunks)
-    return file_data
+# deletes the sessions that were not finished in time, returns (sessions, bytes)
+async def expire_uploads() -> tuple[int, int]:
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await repo_uploads.sql_delete_expired_upload_sessions(storage_db_cursor, EXPIRE_UPLOADS_BATCH_SIZE)
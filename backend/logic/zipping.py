@@ -0,0 +1,58 @@
+import zipfile
+
+
+# a write-only file for zipfile that keeps what was written until it is taken
+class _ZipBuffer:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+# yields a ZIP archive of the entries while it is built, so that only one chunk
+# of it is in memory at a time. An entry is (name, modification time, content),
+# the content is either bytes, which are compressed, or an async iterable of
+# bytes, which is stored as is and read only when its turn comes
+async def stream_zip(entries):
+    buffer = _ZipBuffer()
+    # the output is not seekable, so zipfile puts the sizes and CRCs after the contents
+    archive = zipfile.ZipFile(buffer, "w")
+    for name, modified, content in entries:
+        info = zipfile.ZipInfo(name, modified.timetuple()[:6])
+        if isinstance(content, bytes):
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w") as entry:
+                entry.write(content)
+        else:
+            with archive.open(info, "w") as entry:
+                async for chunk in content:
+                    entry.write(chunk)
+                    yield buffer.take()
+        yield buffer.take()
+    archive.close()
+    yield buffer.take()
+
+
+# a name for the archive entry that does not repeat the taken ones
+def unique_entry_name(folder: str, filename: str, taken: set) -> str:
+    filename = filename.replace("/", "_").replace("\\", "_") or "file"
+    stem, dot, extension = filename.rpartition(".")
+    if not stem:
+        stem, dot, extension = filename, "", ""
+    name = f"{folder}/{filename}"
+    copy = 1
+    while name in taken:
+        copy += 1
+        name = f"{folder}/{stem} ({copy}){dot}{extension}"
+    taken.add(name)
+    return name
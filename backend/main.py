@@ -1,15 +1,23 @@
+import asyncio
+import contextlib
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logic.users
-from auth import get_db
+import logic.blobgc
+import logic.logging
+from auth import get_db, open_databases, close_databases
+from migrate import migrate_all
 
 import routers.assignments
 import routers.submissions
 import routers.courses
+import routers.logs
 import routers.materials
+import routers.metrics
 import routers.parents
 import routers.students
 import routers.teachers
+import routers.uploads
 import routers.users
 
 
@@ -35,10 +43,13 @@ app = FastAPI(
 app.include_router(routers.assignments.router)
 app.include_router(routers.submissions.router)
 app.include_router(routers.courses.router)
+app.include_router(routers.logs.router)
 app.include_router(routers.materials.router)
+app.include_router(routers.metrics.router)
 app.include_router(routers.parents.router)
 app.include_router(routers.students.router)
 app.include_router(routers.teachers.router)
+app.include_router(routers.uploads.router)
 app.include_router(routers.users.router)
 
 app.add_middleware(
@@ -53,5 +64,22 @@ app.add_middleware(
 # app startup
 @app.on_event("startup")
 async def startup_event():
-    with get_db() as (conn, cur):
+    await open_databases()
+    logic.logging.log_writer.start()
+    await migrate_all()
+    async with get_db() as (conn, cur):
         await logic.users.create_admin_account_if_not_exists(conn, cur)
+    app.state.blob_gc = asyncio.create_task(logic.blobgc.run_garbage_collector())
+    app.state.log_maintenance = asyncio.create_task(logic.logging.run_log_maintenance())
+
+
+# app shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    # the background tasks finish unwinding before their pools are closed
+    for task in (app.state.blob_gc, app.state.log_maintenance):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await logic.logging.log_writer.close()
+    await close_databases()
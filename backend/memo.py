@@ -0,0 +1,70 @@
+from psycopg import AsyncCursor
+import statements
+
+#
+# RequestMemo remembers the answers of existence and role checks made with
+# one cursor, so that a request does not ask the database the same question
+# twice. Every INSERT, UPDATE or DELETE executed with the cursor drops all
+# remembered answers, since any of them could be changed by the write.
+#
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+# returned by RequestMemo.get when there is no remembered answer
+MISSING = object()
+
+# process-wide totals over all requests
+_totals = {"lookups": 0, "hits": 0, "invalidations": 0}
+
+
+class RequestMemo:
+    def __init__(self):
+        self._answers = {}
+        self.lookups = 0
+        self.hits = 0
+
+    def get(self, key):
+        self.lookups += 1
+        _totals["lookups"] += 1
+        value = self._answers.get(key, MISSING)
+        if value is MISSING:
+            return MISSING
+        self.hits += 1
+        _totals["hits"] += 1
+        return value
+
+    def put(self, key, value):
+        self._answers[key] = value
+
+    def invalidate(self):
+        if self._answers:
+            self._answers.clear()
+            _totals["invalidations"] += 1
+
+
+class MemoCursor(AsyncCursor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memo = RequestMemo()
+        # set for the cursors of replica connections
+        self.replica = False
+
+    async def execute(self, query, params=None, **kwargs):
+        statement = str(query).lstrip("( \n").split(None, 1)
+        if statement and statement[0].upper() in _WRITE_STATEMENTS:
+            self.memo.invalidate()
+        # parameterized queries are always single statements of the repo
+        # modules, those are prepared on their first execution; scripts
+        # without parameters (migrations) are sent as plain text
+        if params is not None and kwargs.get("prepare") is None and self.connection.prepare_threshold is not None:
+            kwargs["prepare"] = True
+            statements.register_call(query)
+        return await super().execute(query, params, **kwargs)
+
+
+def get_stats() -> dict:
+    return {
+        "lookups": _totals["lookups"],
+        "hits": _totals["hits"],
+        "invalidations": _totals["invalidations"],
+    }
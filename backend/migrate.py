@@ -0,0 +1,39 @@
+#
+# Applies the pending schema migrations from the migrations directory.
+# The backend does the same on startup, this script is for running them
+# by hand, e.g. `docker compose exec backend python migrate.py`.
+#
+
+import asyncio
+import logic.migrations
+from auth import get_db, get_storage_db, open_databases, close_databases
+
+# database name in the migrations directory -> connection to it
+DATABASES = {
+    "system": get_db,
+    "storage": get_storage_db,
+}
+
+
+async def migrate_all():
+    for database, get_conn in DATABASES.items():
+        async with get_conn() as (conn, cur):
+            for migration in await logic.migrations.migrate(conn, cur, database):
+                print(f"Applied migration {database}/{migration}")
+
+    async with get_db() as (conn, cur), get_storage_db() as (storage_conn, storage_cur):
+        filled = await logic.migrations.backfill_attachment_info(conn, cur, storage_cur)
+        if filled:
+            print(f"Filled the size and hash of {filled} attachments")
+
+
+async def main():
+    await open_databases()
+    try:
+        await migrate_all()
+    finally:
+        await close_databases()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
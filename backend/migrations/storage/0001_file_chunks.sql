@@ -0,0 +1,17 @@
+-- File contents are stored as numbered chunks of up to 64 KiB, so that an
+-- upload is written chunk by chunk as it arrives instead of as one value.
+CREATE TABLE file_chunks(
+    fileid uuid REFERENCES files ON DELETE CASCADE,
+    seq int NOT NULL,
+    content bytea NOT NULL,
+    PRIMARY KEY (fileid, seq)
+);
+
+INSERT INTO file_chunks (fileid, seq, content)
+SELECT id, s.seq, substring(content FROM s.seq * 65536 + 1 FOR 65536)
+FROM files, generate_series(0, GREATEST((length(content) - 1) / 65536, 0)) AS s(seq);
+
+ALTER TABLE files ADD COLUMN size bigint NOT NULL DEFAULT 0;
+UPDATE files SET size = length(content);
+ALTER TABLE files ALTER COLUMN size DROP DEFAULT;
+ALTER TABLE files DROP COLUMN content;
@@ -0,0 +1,8 @@
+-- SHA-256 of the file contents, the strong ETag of the downloads
+ALTER TABLE files ADD COLUMN sha256 text;
+UPDATE files SET sha256 = (
+    SELECT encode(sha256(COALESCE(string_agg(c.content, ''::bytea ORDER BY c.seq), ''::bytea)), 'hex')
+    FROM file_chunks c
+    WHERE c.fileid = files.id
+);
+ALTER TABLE files ALTER COLUMN sha256 SET NOT NULL;
@@ -0,0 +1,4 @@
+-- Files are stored once per unique content. refcount is the number of
+-- attachments in the system database that use the file.
+ALTER TABLE files ADD COLUMN refcount int NOT NULL DEFAULT 1;
+CREATE INDEX files_sha256_idx ON files (sha256);
@@ -0,0 +1,3 @@
+-- The blob store that holds the contents of the file: "postgres" keeps them
+-- in file_chunks, "disk" in a file under BLOB_STORE_DIR (see repo/blobs.py).
+ALTER TABLE files ADD COLUMN backend text NOT NULL DEFAULT 'postgres';
@@ -0,0 +1,5 @@
+-- How the chunks of the file in file_chunks are encoded ("identity" or "zstd",
+-- every chunk compressed on its own), and their total size.
+ALTER TABLE files ADD COLUMN codec text NOT NULL DEFAULT 'identity';
+ALTER TABLE files ADD COLUMN stored_size bigint NOT NULL DEFAULT 0;
+UPDATE files SET stored_size = size WHERE backend = 'postgres';
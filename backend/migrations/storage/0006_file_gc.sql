@@ -0,0 +1,11 @@
+-- The garbage collector of the storage leaves young files alone (an upload
+-- may not have committed its attachment yet) and the old copies of recently
+-- moved files (a download may still read them).
+ALTER TABLE files ADD COLUMN timecreated timestamp NOT NULL DEFAULT now();
+ALTER TABLE files ADD COLUMN timemoved timestamp NOT NULL DEFAULT now();
+
+-- Where each pass of the collector stopped, so that the next one goes on from there.
+CREATE TABLE gc_state(
+    name text PRIMARY KEY,
+    position text NOT NULL
+);
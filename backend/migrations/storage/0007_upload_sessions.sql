@@ -0,0 +1,19 @@
+-- Resumable uploads: the client sends the parts of a file in any order, they
+-- are kept here until the upload is finished or expires.
+CREATE TABLE upload_sessions(
+    id uuid PRIMARY KEY,
+    owner text NOT NULL,
+    filename text NOT NULL CHECK (length(filename) <= 256),
+    size bigint NOT NULL,
+    timecreated timestamp NOT NULL,
+    timeexpires timestamp NOT NULL
+);
+CREATE INDEX upload_sessions_owner_idx ON upload_sessions (owner);
+CREATE INDEX upload_sessions_timeexpires_idx ON upload_sessions (timeexpires);
+
+CREATE TABLE upload_parts(
+    sessionid uuid REFERENCES upload_sessions ON DELETE CASCADE,
+    part int NOT NULL,
+    content bytea NOT NULL,
+    PRIMARY KEY (sessionid, part)
+);
@@ -0,0 +1,7 @@
+-- Course rosters are read by course: enrolled students, course teachers,
+-- a parent's children and a student's parents in the course.
+-- The primary keys of these tables start with the email, so they do not help.
+CREATE INDEX IF NOT EXISTS student_at_courseid_idx ON student_at (courseid);
+CREATE INDEX IF NOT EXISTS teaches_courseid_idx ON teaches (courseid);
+CREATE INDEX IF NOT EXISTS parent_of_at_course_courseid_parentemail_idx ON parent_of_at_course (courseid, parentemail);
+CREATE INDEX IF NOT EXISTS parent_of_at_course_courseid_studentemail_idx ON parent_of_at_course (courseid, studentemail);
@@ -0,0 +1,5 @@
+-- Attachment metadata is looked up by file ID alone, which is the last
+-- column of the primary keys of the attachment tables.
+CREATE INDEX IF NOT EXISTS material_files_fileid_idx ON material_files (fileid);
+CREATE INDEX IF NOT EXISTS assignment_files_fileid_idx ON assignment_files (fileid);
+CREATE INDEX IF NOT EXISTS submissions_files_fileid_idx ON submissions_files (fileid);
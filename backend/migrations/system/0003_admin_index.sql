@@ -0,0 +1,2 @@
+-- Admins are looked up with WHERE isadmin, which matches only a few users.
+CREATE INDEX IF NOT EXISTS users_admins_idx ON users (email) WHERE isadmin;
@@ -0,0 +1,6 @@
+-- Size and SHA-256 of the stored file, so that listings and HEAD requests
+-- do not need the storage database. The rows of the files stored before are
+-- filled from the storage database on startup (see migrate.py).
+ALTER TABLE material_files ADD COLUMN size bigint, ADD COLUMN sha256 text;
+ALTER TABLE assignment_files ADD COLUMN size bigint, ADD COLUMN sha256 text;
+ALTER TABLE submissions_files ADD COLUMN size bigint, ADD COLUMN sha256 text;
@@ -0,0 +1,33 @@
+-- The logs are kept in one partition per day (UTC), so that the expired ones
+-- are dropped as a whole instead of deleted row by row. logic/logging.py
+-- creates the partitions of the next days and drops the expired ones; the
+-- default partition only catches the rows of the days it has not created yet.
+ALTER TABLE logs RENAME TO logs_unpartitioned;
+
+CREATE TABLE logs(
+    t timestamp NOT NULL,
+    tag text NOT NULL,
+    msg text NOT NULL
+) PARTITION BY RANGE (t);
+
+CREATE TABLE logs_default PARTITION OF logs DEFAULT;
+
+DO $$
+DECLARE
+    day date;
+BEGIN
+    FOR day IN
+        SELECT generate_series((now() AT TIME ZONE 'UTC')::date - 7, (now() AT TIME ZONE 'UTC')::date + 3, '1 day')::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+            'logs_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO logs (t, tag, msg)
+SELECT t, tag, msg FROM logs_unpartitioned WHERE t >= (now() AT TIME ZONE 'UTC')::date - 7;
+
+DROP TABLE logs_unpartitioned;
@@ -0,0 +1,23 @@
+-- The logs are read by the audit log API of logic/logging.py, newest first
+-- or oldest first, a page at a time: the next page starts after the (t, id)
+-- of the last row of the previous one. Every filter has an index that gives
+-- the rows in that order, so a page costs the same however many rows there
+-- are. The indexes of logs are created on every partition, the ones created
+-- later included.
+CREATE SEQUENCE logs_id_seq AS bigint;
+ALTER TABLE logs ADD COLUMN id bigint NOT NULL DEFAULT nextval('logs_id_seq');
+ALTER SEQUENCE logs_id_seq OWNED BY logs.id;
+
+-- the email of the user who did what the record is about,
+-- NULL for the records of the backend itself
+ALTER TABLE logs ADD COLUMN actor text;
+
+-- the records written before the actor was kept name it at the start of the message
+UPDATE logs SET actor = coalesce(
+    substring(msg FROM '^(?:User|Teacher|Student) (\S+)'),
+    substring(msg FROM '^Created new user: (\S+)$')
+);
+
+CREATE INDEX logs_t_id ON logs (t, id);
+CREATE INDEX logs_tag_t_id ON logs (tag, t, id);
+CREATE INDEX logs_actor_t_id ON logs (actor, t, id);
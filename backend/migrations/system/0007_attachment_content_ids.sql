@@ -0,0 +1,26 @@
+-- Every attachment gets an ID of its own, and the ID of its file in the
+-- storage database moves to contentid. The storage keeps each content once,
+-- so one material, assignment or submission may attach the same content
+-- twice, which the primary keys did not allow while the two IDs were one.
+-- The attachments uploaded before keep their IDs, those stay unique within
+-- their material, assignment or submission.
+ALTER TABLE material_files ADD COLUMN contentid uuid;
+ALTER TABLE assignment_files ADD COLUMN contentid uuid;
+ALTER TABLE submissions_files ADD COLUMN contentid uuid;
+
+UPDATE material_files SET contentid = fileid;
+UPDATE assignment_files SET contentid = fileid;
+UPDATE submissions_files SET contentid = fileid;
+
+ALTER TABLE material_files ALTER COLUMN contentid SET NOT NULL;
+ALTER TABLE assignment_files ALTER COLUMN contentid SET NOT NULL;
+ALTER TABLE submissions_files ALTER COLUMN contentid SET NOT NULL;
+
+-- The garbage collector counts the attachments of a stored file, attachments
+-- themselves are only looked up by their primary keys now.
+CREATE INDEX material_files_contentid_idx ON material_files (contentid);
+CREATE INDEX assignment_files_contentid_idx ON assignment_files (contentid);
+CREATE INDEX submissions_files_contentid_idx ON submissions_files (contentid);
+DROP INDEX IF EXISTS material_files_fileid_idx;
+DROP INDEX IF EXISTS assignment_files_fileid_idx;
+DROP INDEX IF EXISTS submissions_files_fileid_idx;
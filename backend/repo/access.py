@@ -0,0 +1,32 @@
+async def sql_select_course_access(db_cursor, course_id, user_emails, assignment_id=None, material_id=None):
+    # one row per user email, in the order of user_emails
+    await db_cursor.execute(
+        """
+        SELECT
+            EXISTS(SELECT 1 FROM courses WHERE courseid = %(course_id)s),
+            EXISTS(SELECT 1 FROM course_assignments WHERE courseid = %(course_id)s AND assid = %(assignment_id)s),
+            EXISTS(SELECT 1 FROM course_materials WHERE courseid = %(course_id)s AND matid = %(material_id)s),
+            u.email IS NOT NULL,
+            COALESCE(u.isadmin, FALSE),
+            EXISTS(SELECT 1 FROM teaches t WHERE t.email = e.email AND t.courseid = %(course_id)s),
+            EXISTS(SELECT 1 FROM student_at s WHERE s.email = e.email AND s.courseid = %(course_id)s),
+            EXISTS(
+                SELECT 1 FROM course_assignments_submissions cs
+                WHERE cs.courseid = %(course_id)s AND cs.assid = %(assignment_id)s AND cs.email = e.email
+            ),
+            ARRAY(
+                SELECT p.studentemail FROM parent_of_at_course p
+                WHERE p.parentemail = e.email AND p.courseid = %(course_id)s
+            )
+        FROM unnest(%(user_emails)s::text[]) WITH ORDINALITY AS e(email, pos)
+        LEFT JOIN users u ON u.email = e.email
+        ORDER BY e.pos
+        """,
+        {
+            "course_id": course_id,
+            "user_emails": list(user_emails),
+            "assignment_id": assignment_id,
+            "material_id": material_id,
+        },
+    )
+    return await db_cursor.fetchall()
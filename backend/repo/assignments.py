@@ -1,20 +1,23 @@
-def sql_insert_assignment(db_cursor, course_id, title, description, user_email):
-    db_cursor.execute(
+from uuid import uuid4
+
+
+async def sql_insert_assignment(db_cursor, course_id, title, description, user_email):
+    await db_cursor.execute(
         "INSERT INTO course_assignments (courseid, name, description, timeadded, author) VALUES (%s, %s, %s, now(), %s) RETURNING assid",
         (course_id, title, description, user_email),
     )
-    return db_cursor.fetchone()[0]
+    return (await db_cursor.fetchone())[0]
 
 
-def sql_delete_assignment(db_cursor, course_id, assignment_id):
-    db_cursor.execute(
+async def sql_delete_assignment(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
         "DELETE FROM course_assignments WHERE courseid = %s AND assid = %s",
         (course_id, assignment_id),
     )
 
 
-def sql_select_assignment(db_cursor, course_id, assignment_id):
-    db_cursor.execute(
+async def sql_select_assignment(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
         """
         SELECT courseid, assid, timeadded, name, description, author
         FROM course_assignments
@@ -22,46 +25,68 @@ def sql_select_assignment(db_cursor, course_id, assignment_id):
         """,
         (course_id, assignment_id),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_insert_assignment_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, filename, contents):
-    storage_db_cursor.execute(
+# the attachment gets an ID of its own, content_id is the ID of the stored file
+async def sql_insert_assignment_attachment(db_cursor, course_id, assignment_id, content_id, filename, size, sha256):
+    await db_cursor.execute(
         """
-        INSERT INTO files 
-        (id, content)
-        VALUES (gen_random_uuid(), %s)
-        RETURNING id
-        """,
-        (contents, )
-    )
-    fileid = storage_db_cursor.fetchone()[0]
-
-    db_cursor.execute(
-        """
-        INSERT INTO assignment_files 
-        (courseid, assid, fileid, filename, uploadtime)
-        VALUES (%s, %s, %s, %s, now())
+        INSERT INTO assignment_files
+        (courseid, assid, fileid, contentid, filename, size, sha256, uploadtime)
+        VALUES (%s, %s, gen_random_uuid(), %s, %s, %s, %s, now())
         RETURNING fileid, uploadtime
         """,
-        (course_id, assignment_id, fileid, filename),
+        (course_id, assignment_id, content_id, filename, size, sha256),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_select_assignment_attachments(db_cursor, course_id, assignment_id):
-    db_cursor.execute(
+async def sql_select_assignment_attachments(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
         """
-        SELECT fileid, filename, uploadtime
+        SELECT fileid, filename, uploadtime, size
         FROM assignment_files
         WHERE courseid = %s AND assid = %s
         """,
         (course_id, assignment_id),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
+
 
+async def sql_get_all_assignments(db_cursor, course_id: str) -> list[int]:
+    await db_cursor.execute("SELECT assid FROM course_assignments WHERE courseid = %s",
+                            (course_id,))
+    return [i[0] for i in await db_cursor.fetchall()]
 
-def sql_get_all_assignments(db_cursor, course_id: str) -> list[int]:
-    db_cursor.execute("SELECT assid FROM course_assignments WHERE courseid = %s",
-                      (course_id,))
-    return [i[0] for i in db_cursor.fetchall()]
+
+# attachments are (content_id, filename, size, sha256) tuples, returns the IDs
+# of the new attachments in the same order and their upload time
+async def sql_insert_assignment_attachments(db_cursor, course_id, assignment_id, attachments):
+    file_ids = [str(uuid4()) for _ in attachments]
+    await db_cursor.execute(
+        """
+        INSERT INTO assignment_files
+        (courseid, assid, fileid, contentid, filename, size, sha256, uploadtime)
+        SELECT %s::uuid, %s::int, a.fileid, a.contentid, a.filename, a.size, a.sha256, now()
+        FROM unnest(%s::uuid[], %s::uuid[], %s::text[], %s::bigint[], %s::text[])
+            AS a(fileid, contentid, filename, size, sha256)
+        RETURNING uploadtime
+        """,
+        (course_id, assignment_id, file_ids, *map(list, zip(*attachments))),
+    )
+    return file_ids, (await db_cursor.fetchall())[0][0]
+
+
+# (contentid, filename, uploadtime, size, sha256) of the attachment, None when
+# the assignment has no attachment with the ID
+async def sql_select_assignment_attachment(db_cursor, course_id, assignment_id, file_id):
+    await db_cursor.execute(
+        """
+        SELECT contentid, filename, uploadtime, size, sha256
+        FROM assignment_files
+        WHERE courseid = %s AND assid = %s AND fileid = %s
+        """,
+        (course_id, assignment_id, file_id),
+    )
+    return await db_cursor.fetchone()
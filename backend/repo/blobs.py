@@ -0,0 +1,379 @@
+import asyncio
+import os
+from collections import OrderedDict
+from time import time
+from uuid import UUID
+import zstandard
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from auth import get_storage_db
+import repo.files as repo_files
+
+#
+# Blob stores keep the contents of the files; the files table of the storage
+# database keeps the rest (size, hash, references) and the name of the store
+# that holds the contents of each file, so that files can be moved between
+# the stores while the backend is running (see blobmigrate.py).
+#
+# write() stores the chunks of a new file, read() yields a byte range of it,
+# delete() drops it inside the storage transaction (the chunks of a deleted
+# files row go away by themselves), and response() builds the HTTP response
+# for a range. Files on disk are removed only after the commit, by remove_blobs.
+#
+# The postgres store compresses every chunk on its own, so that a byte range
+# is still read from the chunks it falls into. The codec column of the files
+# table tells how the chunks in file_chunks are encoded.
+#
+
+# the store of the new uploads: "postgres" or "disk"
+BLOB_STORE = os.environ.get("BLOB_STORE", "postgres")
+# where the disk store keeps its files
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", "/var/lib/edhub/blobs")
+# when set, nginx sends the files of the disk store itself with sendfile:
+# the backend answers with X-Accel-Redirect to this internal location
+BLOB_STORE_ACCEL_PREFIX = os.environ.get("BLOB_STORE_ACCEL_PREFIX", "")
+
+# the codec of the chunks of new uploads to the postgres store: "zstd" or "identity"
+BLOB_COMPRESSION = os.environ.get("BLOB_COMPRESSION", "zstd")
+BLOB_COMPRESSION_LEVEL = int(os.environ.get("BLOB_COMPRESSION_LEVEL", 3))
+# a file is compressed when its first chunk shrinks to this part of its size or less
+COMPRESSION_PROBE_RATIO = 0.9
+
+# the hot-blob cache of the downloads, see BlobCache
+BLOB_CACHE_MAX_BYTES = int(os.environ.get("BLOB_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+BLOB_CACHE_MAX_FILE_BYTES = 8 * 1024 * 1024
+
+# every stored chunk but the last one of a file is exactly CHUNK_SIZE bytes,
+# reading byte ranges relies on it
+CHUNK_SIZE = 64 * 1024
+# how many bytes are read at once
+SLICE_SIZE = 4 * CHUNK_SIZE
+
+
+# cuts the incoming pieces of any size into chunks of exactly CHUNK_SIZE bytes
+async def _exact_chunks(pieces):
+    buffer = bytearray()
+    async for piece in pieces:
+        buffer += piece
+        while len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer[:CHUNK_SIZE])
+            del buffer[:CHUNK_SIZE]
+    if buffer:
+        yield bytes(buffer)
+
+
+_compressor = zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def encode_chunk(codec: str, chunk: bytes) -> bytes:
+    return _compressor.compress(chunk) if codec == "zstd" else chunk
+
+
+def decode_chunk(codec: str, chunk: bytes) -> bytes:
+    return _decompressor.decompress(chunk) if codec == "zstd" else chunk
+
+
+# the codec of a file and its encoded first chunk, chosen by how well the chunk compresses
+def probe_codec(chunk: bytes) -> tuple[str, bytes]:
+    if BLOB_COMPRESSION == "zstd":
+        compressed = encode_chunk("zstd", chunk)
+        if len(compressed) <= len(chunk) * COMPRESSION_PROBE_RATIO:
+            return "zstd", compressed
+    return "identity", chunk
+
+
+def _streaming_response(body, status_code: int, headers: dict):
+    return StreamingResponse(body, status_code=status_code, media_type="application/octet-stream", headers=headers)
+
+
+# contents in the file_chunks table of the storage database
+class PostgresBlobStore:
+    name = "postgres"
+    # nginx can not send the contents by itself, see DiskBlobStore.sends_itself
+    sends_itself = False
+
+    async def write(self, storage_db_cursor, file_id: str, pieces) -> int:
+        codec = None
+        size = 0
+
+        async def encoded_chunks():
+            nonlocal codec, size
+            async for chunk in _exact_chunks(pieces):
+                size += len(chunk)
+                if codec is None:
+                    codec, chunk = probe_codec(chunk)
+                else:
+                    chunk = encode_chunk(codec, chunk)
+                yield chunk
+
+        # copied a slice at a time: no query can run on the connection while a COPY is open,
+        # and the pieces may be read with the same cursor, like the parts of an upload are
+        chunks_per_slice = SLICE_SIZE // CHUNK_SIZE
+        stored_size = 0
+        seq = 0
+        chunks = []
+        async for chunk in encoded_chunks():
+            chunks.append(chunk)
+            if len(chunks) == chunks_per_slice:
+                stored_size += await repo_files.sql_copy_file_chunks(storage_db_cursor, file_id, seq, chunks)
+                seq += len(chunks)
+                chunks = []
+        if chunks:
+            stored_size += await repo_files.sql_copy_file_chunks(storage_db_cursor, file_id, seq, chunks)
+        await repo_files.sql_update_file_codec(storage_db_cursor, file_id, codec or "identity", stored_size)
+        return size
+
+    # the chunks as they are stored, slice by slice
+    async def read_stored(self, file_id: str, first_seq: int = 0):
+        chunks_per_slice = SLICE_SIZE // CHUNK_SIZE
+        seq = first_seq
+        while True:
+            async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+                chunks = await repo_files.sql_select_file_chunks(storage_db_cursor, file_id, seq, chunks_per_slice)
+            for chunk in chunks:
+                yield chunk
+            if len(chunks) < chunks_per_slice:
+                return
+            seq += len(chunks)
+
+    # a storage connection is held only while a slice is fetched, not while the client receives it
+    async def read(self, file_id: str, start: int = 0, length: int = None):
+        async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+            codec = await repo_files.sql_select_file_codec(storage_db_cursor, file_id)
+        seq, skip = divmod(start, CHUNK_SIZE)
+        async for chunk in self.read_stored(file_id, seq):
+            chunk = decode_chunk(codec, chunk)
+            if skip:
+                chunk = chunk[skip:]
+                skip = 0
+            if length is not None:
+                chunk = chunk[:length]
+                length -= len(chunk)
+            if chunk:
+                yield chunk
+            if length == 0:
+                return
+
+    async def delete(self, storage_db_cursor, file_id: str):
+        await repo_files.sql_delete_file_chunks(storage_db_cursor, file_id)
+
+    def response(self, file_id: str, status_code: int, start: int, length: int, headers: dict):
+        return _streaming_response(self.read(file_id, start, length), status_code, headers)
+
+
+# contents in files on disk, sharded into directories by the first characters of the ID
+class DiskBlobStore:
+    name = "disk"
+    shards = [f"{i:02x}" for i in range(256)]
+
+    def __init__(self, root: str, accel_prefix: str):
+        self.root = root
+        self.accel_prefix = accel_prefix
+        self.sends_itself = bool(accel_prefix)
+
+    def _relative_path(self, file_id: str) -> str:
+        return os.path.join(file_id[:2], file_id[2:4], file_id)
+
+    def path(self, file_id: str) -> str:
+        return os.path.join(self.root, self._relative_path(file_id))
+
+    # the file appears under its name only when it is complete
+    async def write(self, storage_db_cursor, file_id: str, pieces) -> int:
+        path = self.path(file_id)
+        partial_path = path + ".part"
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        size = 0
+        target = await asyncio.to_thread(open, partial_path, "wb")
+        try:
+            async for piece in pieces:
+                await asyncio.to_thread(target.write, piece)
+                size += len(piece)
+            await asyncio.to_thread(target.close)
+            await asyncio.to_thread(os.replace, partial_path, path)
+        except BaseException:
+            target.close()
+            await asyncio.to_thread(_remove_if_exists, partial_path)
+            raise
+        return size
+
+    async def read(self, file_id: str, start: int = 0, length: int = None):
+        source = await asyncio.to_thread(open, self.path(file_id), "rb")
+        try:
+            offset = start
+            while length is None or length > 0:
+                size = SLICE_SIZE if length is None else min(SLICE_SIZE, length)
+                data = await asyncio.to_thread(os.pread, source.fileno(), size, offset)
+                if not data:
+                    return
+                offset += len(data)
+                if length is not None:
+                    length -= len(data)
+                yield data
+        finally:
+            source.close()
+
+    # the file is removed after the commit, see remove_blobs
+    async def delete(self, storage_db_cursor, file_id: str):
+        pass
+
+    async def remove(self, file_id: str):
+        await asyncio.to_thread(_remove_if_exists, self.path(file_id))
+
+    def _scan_shard(self, shard: str, max_mtime: float):
+        files, partial_files = [], []
+        for directory, _, filenames in os.walk(os.path.join(self.root, shard)):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= max_mtime:
+                    continue
+                if filename.endswith(".part"):
+                    partial_files.append((path, stat.st_size))
+                elif _is_uuid(filename):
+                    files.append((filename, stat.st_size))
+        return files, partial_files
+
+    # ([(file_id, size)], [(partial file path, size)]) of the files under the top
+    # directory of the shard that were not written to in the last min_age seconds
+    async def scan_shard(self, shard: str, min_age: float):
+        return await asyncio.to_thread(self._scan_shard, shard, time() - min_age)
+
+    async def remove_path(self, path: str):
+        await asyncio.to_thread(_remove_if_exists, path)
+
+    def response(self, file_id: str, status_code: int, start: int, length: int, headers: dict):
+        if not self.accel_prefix:
+            return _streaming_response(self.read(file_id, start, length), status_code, headers)
+
+        # nginx sends the file and handles the range by itself
+        headers = {key: value for key, value in headers.items() if key not in ("Content-Length", "Content-Range")}
+        headers["X-Accel-Redirect"] = self.accel_prefix.rstrip("/") + "/" + self._relative_path(file_id)
+        return Response(media_type="application/octet-stream", headers=headers)
+
+
+# LRU cache of whole files for the downloads that many users make at once,
+# bounded by the total size of the files in it. The files never change, so an
+# entry is only dropped when its file is deleted or to make room. Concurrent
+# misses of one file share one read of it.
+class BlobCache:
+    def __init__(self, max_bytes: int, max_file_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()
+        self._loading = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes_served = 0
+        self.bytes_loaded = 0
+
+    def accepts(self, size: int) -> bool:
+        return size <= min(self.max_file_bytes, self.max_bytes)
+
+    # the contents of the file, read with load() on a miss; served_bytes is
+    # how much of them the caller sends
+    async def get(self, file_id: str, load, served_bytes: int) -> bytes:
+        content = self._entries.get(file_id)
+        if content is not None:
+            self._entries.move_to_end(file_id)
+            self.hits += 1
+            self.bytes_served += served_bytes
+            return content
+
+        task = self._loading.get(file_id)
+        if task is None:
+            self.misses += 1
+            # the read goes on for the others when the request that started it is cancelled
+            task = asyncio.ensure_future(load())
+            self._loading[file_id] = task
+            task.add_done_callback(lambda done: self._loaded(file_id, done))
+        else:
+            self.shared_misses += 1
+        return await asyncio.shield(task)
+
+    def _loaded(self, file_id: str, task):
+        if self._loading.get(file_id) is task:
+            del self._loading[file_id]
+        if task.cancelled() or task.exception() is not None:
+            return
+        content = task.result()
+        self.bytes_loaded += len(content)
+        if not self.accepts(len(content)) or file_id in self._entries:
+            return
+        self._entries[file_id] = content
+        self.size_bytes += len(content)
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.evictions += 1
+
+    def invalidate(self, file_id: str):
+        content = self._entries.pop(file_id, None)
+        if content is not None:
+            self.size_bytes -= len(content)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses + self.shared_misses
+        return {
+            "files": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_misses": self.shared_misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "bytes_served_from_cache": self.bytes_served,
+            "bytes_loaded": self.bytes_loaded,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+blob_cache = BlobCache(BLOB_CACHE_MAX_BYTES, BLOB_CACHE_MAX_FILE_BYTES)
+
+
+def _is_uuid(name: str) -> bool:
+    try:
+        UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _remove_if_exists(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+BLOB_STORES = {
+    PostgresBlobStore.name: PostgresBlobStore(),
+    DiskBlobStore.name: DiskBlobStore(BLOB_STORE_DIR, BLOB_STORE_ACCEL_PREFIX),
+}
+
+
+def get_blob_store(name: str = None):
+    return BLOB_STORES[name or BLOB_STORE]
+
+
+async def read_whole(store, file_id: str) -> bytes:
+    return b"".join([chunk async for chunk in store.read(file_id)])
+
+
+# removes the contents that live outside of the storage database and the
+# cached ones, once the deletion of their files is committed
+async def remove_blobs(deleted_files):
+    for file_id, store_name in deleted_files:
+        blob_cache.invalidate(file_id)
+        store = get_blob_store(store_name)
+        if isinstance(store, DiskBlobStore):
+            await store.remove(file_id)
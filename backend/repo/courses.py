@@ -1,8 +1,5 @@
-from typing import Union
-
-
-def sql_select_available_courses(db_cursor, user_email):
-    db_cursor.execute(
+async def sql_select_available_courses(db_cursor, user_email):
+    await db_cursor.execute(
         """
         SELECT courseid AS cid FROM teaches WHERE email = %s
         UNION
@@ -12,28 +9,28 @@ def sql_select_available_courses(db_cursor, user_email):
         """,
         (user_email, user_email, user_email),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_select_all_courses(db_cursor):
-    db_cursor.execute("SELECT courseid FROM courses")
-    return db_cursor.fetchall()
+async def sql_select_all_courses(db_cursor):
+    await db_cursor.execute("SELECT courseid FROM courses")
+    return await db_cursor.fetchall()
 
 
-def sql_insert_course(db_cursor, title):
-    db_cursor.execute(
+async def sql_insert_course(db_cursor, title):
+    await db_cursor.execute(
         "INSERT INTO courses (courseid, name, timecreated) VALUES (gen_random_uuid(), %s, now()) RETURNING courseid",
         (title,),
     )
-    return db_cursor.fetchone()[0]
+    return (await db_cursor.fetchone())[0]
 
 
-def sql_delete_course(db_cursor, course_id):
-    db_cursor.execute("DELETE FROM courses WHERE courseid = %s", (course_id,))
+async def sql_delete_course(db_cursor, course_id):
+    await db_cursor.execute("DELETE FROM courses WHERE courseid = %s", (course_id,))
 
 
-def sql_select_course_info(db_cursor, course_id):
-    db_cursor.execute(
+async def sql_select_course_info(db_cursor, course_id):
+    await db_cursor.execute(
         """
         SELECT c.courseid, c.name, c.timecreated, COUNT(sa.email) AS student_count
         FROM courses c
@@ -43,11 +40,11 @@ def sql_select_course_info(db_cursor, course_id):
         """,
         (course_id,),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_select_course_feed(db_cursor, course_id):
-    db_cursor.execute(
+async def sql_select_course_feed(db_cursor, course_id):
+    await db_cursor.execute(
         """
         SELECT courseid AS cid, matid as postid, 'mat' as type, timeadded, author
         FROM course_materials
@@ -63,23 +60,30 @@ def sql_select_course_feed(db_cursor, course_id):
         """,
         (course_id, course_id),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_select_grades_in_course(db_cursor, course_id: str,
-                                students: Union[list[str], None] = None,
-                                assignments: Union[list[int], None] = None) -> list[tuple[str, int, Union[int, None]]]:
-    if students is not None and len(students) == 0:
-        return []
-    if assignments is not None and len(assignments) == 0:
+# (email, publicname, grades) for every student in the given order, with the
+# grades of the assignments in the given order and None for the missing ones
+async def sql_select_grade_table(db_cursor, course_id: str, students: list[str], assignments: list[int]):
+    if len(students) == 0:
         return []
-    query = "SELECT email, assid, grade FROM course_assignments_submissions WHERE courseid = %s"
-    qargs = [course_id]
-    if students is not None:
-        query += " AND email in %s"
-        qargs.append(tuple(students))
-    if assignments is not None:
-        query += " AND assid in %s"
-        qargs.append(tuple(assignments))
-    db_cursor.execute(query, tuple(qargs))
-    return db_cursor.fetchall()
+    await db_cursor.execute(
+        """
+        WITH r AS (SELECT email, n FROM unnest(%s::text[]) WITH ORDINALITY AS r(email, n)),
+             a AS (SELECT assid, n FROM unnest(%s::int[]) WITH ORDINALITY AS a(assid, n))
+        SELECT
+            r.email,
+            u.publicname,
+            coalesce(array_agg(s.grade ORDER BY a.n) FILTER (WHERE a.n IS NOT NULL), '{}')
+        FROM r
+        LEFT JOIN users u ON u.email = r.email
+        LEFT JOIN a ON TRUE
+        LEFT JOIN course_assignments_submissions s
+            ON s.courseid = %s AND s.assid = a.assid AND s.email = r.email
+        GROUP BY r.n, r.email, u.publicname
+        ORDER BY r.n
+        """,
+        (list(students), list(assignments), course_id),
+    )
+    return await db_cursor.fetchall()
@@ -1,14 +1,316 @@
-def sql_download_attachment(storage_db_cursor, file_id):
-    storage_db_cursor.execute("SELECT content FROM files WHERE id = %s", (file_id, ))
-    return storage_db_cursor.fetchone()[0]
-
-
-def sql_select_attachment_metadata(db_cursor, file_id):
-    db_cursor.execute("""
-                      (SELECT fileid, filename, uploadtime FROM material_files WHERE fileid = %s)
-                      UNION
-                      (SELECT fileid, filename, uploadtime FROM assignment_files WHERE fileid = %s)
-                      UNION
-                      (SELECT fileid, filename, uploadtime FROM submissions_files WHERE fileid = %s)
-                      """, (file_id, file_id, file_id))
-    return db_cursor.fetchone()
+async def sql_insert_file(storage_db_cursor, backend):
+    await storage_db_cursor.execute(
+        "INSERT INTO files (id, size, sha256, backend) VALUES (gen_random_uuid(), 0, '', %s) RETURNING id",
+        (backend,),
+    )
+    return str((await storage_db_cursor.fetchone())[0])
+
+
+# streams the chunks into the file with COPY, returns the total size
+# the chunks get the numbers from first_seq on
+async def sql_copy_file_chunks(storage_db_cursor, file_id, first_seq, chunks) -> int:
+    size = 0
+    async with storage_db_cursor.copy("COPY file_chunks (fileid, seq, content) FROM STDIN") as copy:
+        for seq, chunk in enumerate(chunks, first_seq):
+            await copy.write_row((file_id, seq, chunk))
+            size += len(chunk)
+    return size
+
+
+async def sql_update_file_info(storage_db_cursor, file_id, size, sha256):
+    await storage_db_cursor.execute("UPDATE files SET size = %s, sha256 = %s WHERE id = %s", (size, sha256, file_id))
+
+
+# held until the end of the transaction, so that two uploads of the same
+# content can not both miss each other and store it twice
+async def sql_lock_file_hash(storage_db_cursor, sha256):
+    await storage_db_cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (sha256,))
+
+
+async def sql_select_file_by_hash(storage_db_cursor, sha256, except_file_id):
+    await storage_db_cursor.execute(
+        "SELECT id FROM files WHERE sha256 = %s AND refcount > 0 AND id <> %s LIMIT 1 FOR UPDATE",
+        (sha256, except_file_id),
+    )
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+async def sql_delete_file(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("DELETE FROM files WHERE id = %s", (file_id,))
+
+
+async def sql_add_file_reference(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("UPDATE files SET refcount = refcount + 1 WHERE id = %s", (file_id,))
+
+
+# drops one reference per occurrence of the file ID, deletes the files left without
+# references and returns their (id, backend) pairs
+async def sql_release_files(storage_db_cursor, file_ids):
+    await storage_db_cursor.execute(
+        """
+        UPDATE files f SET refcount = f.refcount - r.n
+        FROM (SELECT id, COUNT(*) AS n FROM unnest(%s::uuid[]) AS id GROUP BY id) r
+        WHERE f.id = r.id
+        """,
+        (file_ids,),
+    )
+    await storage_db_cursor.execute(
+        "DELETE FROM files WHERE id = ANY(%s::uuid[]) AND refcount <= 0 RETURNING id, backend",
+        (file_ids,),
+    )
+    return [(str(row[0]), row[1]) for row in await storage_db_cursor.fetchall()]
+
+
+async def sql_select_storage_stats(storage_db_cursor):
+    await storage_db_cursor.execute(
+        """
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(refcount), 0),
+            COALESCE(SUM(size), 0),
+            COALESCE(SUM(size * refcount), 0),
+            COALESCE(SUM(size) FILTER (WHERE backend = 'postgres'), 0),
+            COALESCE(SUM(stored_size) FILTER (WHERE backend = 'postgres'), 0)
+        FROM files
+        """
+    )
+    return await storage_db_cursor.fetchone()
+
+
+async def sql_select_files_info(storage_db_cursor, file_ids):
+    await storage_db_cursor.execute("SELECT id, size, sha256 FROM files WHERE id = ANY(%s::uuid[])", (file_ids,))
+    return await storage_db_cursor.fetchall()
+
+
+async def sql_select_file_size(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("SELECT size FROM files WHERE id = %s", (file_id,))
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+# (backend, codec, stored_size) of the file
+async def sql_select_file_storage(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("SELECT backend, codec, stored_size FROM files WHERE id = %s", (file_id,))
+    return await storage_db_cursor.fetchone()
+
+
+async def sql_select_file_codec(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("SELECT codec FROM files WHERE id = %s", (file_id,))
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+async def sql_update_file_codec(storage_db_cursor, file_id, codec, stored_size):
+    await storage_db_cursor.execute(
+        "UPDATE files SET codec = %s, stored_size = %s WHERE id = %s",
+        (codec, stored_size, file_id),
+    )
+
+
+# file ID -> backend of the listed files
+async def sql_select_files_backends(storage_db_cursor, file_ids):
+    await storage_db_cursor.execute("SELECT id, backend FROM files WHERE id = ANY(%s::uuid[])", (file_ids,))
+    return {str(row[0]): row[1] for row in await storage_db_cursor.fetchall()}
+
+
+async def sql_delete_file_chunks(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("DELETE FROM file_chunks WHERE fileid = %s", (file_id,))
+
+
+# the next files to move to another blob store, in the order of their IDs
+async def sql_select_files_to_migrate(storage_db_cursor, backend, after_file_id, count):
+    await storage_db_cursor.execute(
+        "SELECT id FROM files WHERE backend <> %s AND id > %s ORDER BY id LIMIT %s",
+        (backend, after_file_id, count),
+    )
+    return [str(row[0]) for row in await storage_db_cursor.fetchall()]
+
+
+# locks the file against a concurrent release while it is moved, returns its backend
+async def sql_lock_file(storage_db_cursor, file_id):
+    await storage_db_cursor.execute("SELECT backend FROM files WHERE id = %s FOR UPDATE", (file_id,))
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+async def sql_update_file_backend(storage_db_cursor, file_id, backend):
+    await storage_db_cursor.execute(
+        "UPDATE files SET backend = %s, timemoved = now() WHERE id = %s",
+        (backend, file_id),
+    )
+
+
+async def sql_select_file_chunks(storage_db_cursor, file_id, first_seq, count):
+    await storage_db_cursor.execute(
+        "SELECT content FROM file_chunks WHERE fileid = %s AND seq >= %s ORDER BY seq LIMIT %s",
+        (file_id, first_seq, count),
+    )
+    return [row[0] for row in await storage_db_cursor.fetchall()]
+
+
+# the IDs of the stored files of the attachments that go away together with the material
+async def sql_select_material_file_ids(db_cursor, course_id, material_id):
+    await db_cursor.execute(
+        "SELECT contentid FROM material_files WHERE courseid = %s AND matid = %s",
+        (course_id, material_id),
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+# the IDs of the stored files of the attachments that go away together with the assignment and its submissions
+async def sql_select_assignment_file_ids(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
+        """
+        SELECT contentid FROM assignment_files WHERE courseid = %(course_id)s AND assid = %(assignment_id)s
+        UNION ALL
+        SELECT contentid FROM submissions_files WHERE courseid = %(course_id)s AND assid = %(assignment_id)s
+        """,
+        {"course_id": course_id, "assignment_id": assignment_id},
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+# the IDs of the stored files of the attachments that go away together with the course
+async def sql_select_course_file_ids(db_cursor, course_id):
+    await db_cursor.execute(
+        """
+        SELECT contentid FROM material_files WHERE courseid = %(course_id)s
+        UNION ALL
+        SELECT contentid FROM assignment_files WHERE courseid = %(course_id)s
+        UNION ALL
+        SELECT contentid FROM submissions_files WHERE courseid = %(course_id)s
+        """,
+        {"course_id": course_id},
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+# the IDs of the stored files of the submission attachments that go away together with the user,
+# except the ones in the listed courses
+async def sql_select_user_file_ids(db_cursor, user_email, except_course_ids):
+    await db_cursor.execute(
+        "SELECT contentid FROM submissions_files WHERE email = %s AND NOT courseid = ANY(%s::uuid[])",
+        (user_email, list(except_course_ids)),
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+# stored file ID -> the number of attachments that use it, for the files that have any
+async def sql_count_file_references(db_cursor, file_ids):
+    await db_cursor.execute(
+        """
+        SELECT contentid, COUNT(*) FROM (
+            SELECT contentid FROM material_files WHERE contentid = ANY(%(file_ids)s::uuid[])
+            UNION ALL
+            SELECT contentid FROM assignment_files WHERE contentid = ANY(%(file_ids)s::uuid[])
+            UNION ALL
+            SELECT contentid FROM submissions_files WHERE contentid = ANY(%(file_ids)s::uuid[])
+        ) refs
+        GROUP BY contentid
+        """,
+        {"file_ids": file_ids},
+    )
+    return {str(row[0]): row[1] for row in await db_cursor.fetchall()}
+
+
+# only one process collects the garbage at a time, the lock goes away with the transaction
+async def sql_try_lock_gc(storage_db_cursor, lock_id):
+    await storage_db_cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (lock_id,))
+    return (await storage_db_cursor.fetchone())[0]
+
+
+async def sql_select_gc_position(storage_db_cursor, name):
+    await storage_db_cursor.execute("SELECT position FROM gc_state WHERE name = %s", (name,))
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+async def sql_update_gc_position(storage_db_cursor, name, position):
+    await storage_db_cursor.execute(
+        """
+        INSERT INTO gc_state (name, position) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE SET position = EXCLUDED.position
+        """,
+        (name, position),
+    )
+
+
+# (id, refcount, backend, moved long ago) of the next files older than the grace period
+async def sql_select_gc_files(storage_db_cursor, after_file_id, grace_seconds, count):
+    await storage_db_cursor.execute(
+        """
+        SELECT id, refcount, backend, timemoved < now() - make_interval(secs => %(grace)s)
+        FROM files
+        WHERE id > %(after)s AND timecreated < now() - make_interval(secs => %(grace)s)
+        ORDER BY id
+        LIMIT %(count)s
+        """,
+        {"after": after_file_id, "grace": grace_seconds, "count": count},
+    )
+    return [(str(row[0]), row[1], row[2], row[3]) for row in await storage_db_cursor.fetchall()]
+
+
+# deletes the files whose reference count is still the one seen when no attachment
+# used them, a concurrent upload of the same content changes it; returns
+# (id, backend, bytes) of the deleted files
+async def sql_delete_unreferenced_files(storage_db_cursor, file_ids, refcounts):
+    await storage_db_cursor.execute(
+        """
+        DELETE FROM files f
+        USING unnest(%s::uuid[], %s::int[]) AS seen(id, refcount)
+        WHERE f.id = seen.id AND f.refcount = seen.refcount
+        RETURNING f.id, f.backend, CASE WHEN f.backend = 'postgres' THEN f.stored_size ELSE f.size END
+        """,
+        (file_ids, refcounts),
+    )
+    return [(str(row[0]), row[1], row[2]) for row in await storage_db_cursor.fetchall()]
+
+
+# raises the reference counts that are lower than the number of attachments;
+# a count that changed since it was seen is left for the next pass
+async def sql_raise_refcounts(storage_db_cursor, file_ids, refcounts, references):
+    await storage_db_cursor.execute(
+        """
+        UPDATE files f SET refcount = seen.refs
+        FROM unnest(%s::uuid[], %s::int[], %s::int[]) AS seen(id, refcount, refs)
+        WHERE f.id = seen.id AND f.refcount = seen.refcount AND f.refcount < seen.refs
+        """,
+        (file_ids, refcounts, references),
+    )
+    return storage_db_cursor.rowcount
+
+
+# deletes the chunks left behind by the files moved out of the postgres store
+# before the grace period, returns their total size
+async def sql_delete_moved_chunks(storage_db_cursor, file_ids, grace_seconds):
+    await storage_db_cursor.execute(
+        """
+        WITH deleted AS (
+            DELETE FROM file_chunks c
+            USING files f
+            WHERE c.fileid = f.id AND f.id = ANY(%s::uuid[])
+                AND f.backend <> 'postgres' AND f.timemoved < now() - make_interval(secs => %s)
+            RETURNING length(c.content) AS size
+        )
+        SELECT COALESCE(SUM(size), 0) FROM deleted
+        """,
+        (file_ids, grace_seconds),
+    )
+    return (await storage_db_cursor.fetchone())[0]
+
+
+# the files on disk that no file of the disk store owns
+async def sql_select_disk_orphans(storage_db_cursor, file_ids, grace_seconds):
+    await storage_db_cursor.execute(
+        """
+        SELECT candidate.id FROM unnest(%s::uuid[]) AS candidate(id)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM files f
+            WHERE f.id = candidate.id
+                AND (f.backend = 'disk' OR f.timemoved >= now() - make_interval(secs => %s))
+        )
+        """,
+        (file_ids, grace_seconds),
+    )
+    return [str(row[0]) for row in await storage_db_cursor.fetchall()]
@@ -1,13 +1,90 @@
-import random
+from psycopg import sql
 
-LOG_CLEANUP_PROBABILITY = 0.01
+# only one process maintains the partitions at a time, see logic/logging.py
+LOG_MAINTENANCE_LOCK_ID = 7310003
 
 
-def sql_insert_log(db_cursor, tag, msg):
-    db_cursor.execute("INSERT INTO logs (t, tag, msg) VALUES (now(), %s, %s)", (tag, msg))
-    if random.random() < LOG_CLEANUP_PROBABILITY:
-        sql_delete_old_logs(db_cursor)
+async def sql_insert_log(db_cursor, tag, msg, actor=None):
+    await db_cursor.execute("INSERT INTO logs (t, tag, msg, actor) VALUES (now(), %s, %s, %s)", (tag, msg, actor))
 
 
-def sql_delete_old_logs(db_cursor):
-    db_cursor.execute("DELETE FROM logs WHERE t < NOW() - INTERVAl '7 days'")
+# records are (t, tag, msg, actor) tuples
+async def sql_insert_logs(db_cursor, records):
+    async with db_cursor.copy("COPY logs (t, tag, msg, actor) FROM STDIN") as copy:
+        for record in records:
+            await copy.write_row(record)
+
+
+async def sql_try_lock_log_maintenance(db_cursor):
+    await db_cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (LOG_MAINTENANCE_LOCK_ID,))
+    return (await db_cursor.fetchone())[0]
+
+
+# the names of the day partitions of logs, without the default one
+async def sql_select_log_partitions(db_cursor):
+    await db_cursor.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'logs'::regclass AND c.relname <> 'logs_default'
+        """
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+# the rows of the day that went into the default partition move to the new one
+async def sql_create_log_partition(db_cursor, name, day, next_day):
+    partition = sql.Identifier(name)
+    bounds = (sql.Literal(day), sql.Literal(next_day))
+    await db_cursor.execute(
+        sql.SQL("CREATE TABLE {} (LIKE logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(partition)
+    )
+    await db_cursor.execute(
+        sql.SQL(
+            """
+            WITH moved AS (DELETE FROM logs_default WHERE t >= {} AND t < {} RETURNING id, t, tag, msg, actor)
+            INSERT INTO {} (id, t, tag, msg, actor) SELECT id, t, tag, msg, actor FROM moved
+            """
+        ).format(*bounds, partition)
+    )
+    await db_cursor.execute(
+        sql.SQL("ALTER TABLE logs ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(partition, *bounds)
+    )
+
+
+async def sql_drop_log_partition(db_cursor, name):
+    await db_cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+
+
+# the default partition only holds the rows of the days without a partition,
+# so this is a small table
+async def sql_delete_old_default_logs(db_cursor, before):
+    await db_cursor.execute(sql.SQL("DELETE FROM logs_default WHERE t < {}").format(sql.Literal(before)))
+
+
+# a page of (id, t, tag, actor, msg) in the order of (t, id), starting after
+# the (t, id) of after. The filters that are None are left out of the query
+# rather than passed as NULL, so that the prepared statement of every set of
+# filters has a plan that uses its index.
+async def sql_select_logs(db_cursor, tag, actor, since, until, after, newest_first: bool, limit: int):
+    conditions, params = [], []
+    for condition, value in (("tag = %s", tag), ("actor = %s", actor), ("t >= %s", since), ("t < %s", until)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    if after is not None:
+        conditions.append("(t, id) < (%s, %s)" if newest_first else "(t, id) > (%s, %s)")
+        params.extend(after)
+    order = "DESC" if newest_first else "ASC"
+    await db_cursor.execute(
+        f"""
+        SELECT id, t, tag, actor, msg
+        FROM logs
+        WHERE {" AND ".join(conditions) or "TRUE"}
+        ORDER BY t {order}, id {order}
+        LIMIT %s
+        """,
+        (*params, limit),
+    )
+    return await db_cursor.fetchall()
@@ -1,20 +1,23 @@
-def sql_insert_material(db_cursor, course_id, title, description, user_email):
-    db_cursor.execute(
+from uuid import uuid4
+
+
+async def sql_insert_material(db_cursor, course_id, title, description, user_email):
+    await db_cursor.execute(
         "INSERT INTO course_materials (courseid, name, description, timeadded, author) VALUES (%s, %s, %s, now(), %s) RETURNING matid",
         (course_id, title, description, user_email),
     )
-    return db_cursor.fetchone()[0]
+    return (await db_cursor.fetchone())[0]
 
 
-def sql_delete_material(db_cursor, course_id, material_id):
-    db_cursor.execute(
+async def sql_delete_material(db_cursor, course_id, material_id):
+    await db_cursor.execute(
         "DELETE FROM course_materials WHERE courseid = %s AND matid = %s",
         (course_id, material_id),
     )
 
 
-def sql_select_material(db_cursor, course_id, material_id):
-    db_cursor.execute(
+async def sql_select_material(db_cursor, course_id, material_id):
+    await db_cursor.execute(
         """
         SELECT courseid, matid, timeadded, name, description, author
         FROM course_materials
@@ -22,40 +25,62 @@ def sql_select_material(db_cursor, course_id, material_id):
         """,
         (course_id, material_id),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_insert_material_attachment(db_cursor, storage_db_cursor, course_id, material_id, filename, contents):
-    storage_db_cursor.execute(
+# the attachment gets an ID of its own, content_id is the ID of the stored file
+async def sql_insert_material_attachment(db_cursor, course_id, material_id, content_id, filename, size, sha256):
+    await db_cursor.execute(
         """
-        INSERT INTO files 
-        (id, content)
-        VALUES (gen_random_uuid(), %s)
-        RETURNING id
+        INSERT INTO material_files
+        (courseid, matid, fileid, contentid, filename, size, sha256, uploadtime)
+        VALUES (%s, %s, gen_random_uuid(), %s, %s, %s, %s, now())
+        RETURNING fileid, uploadtime
         """,
-        (contents, )
+        (course_id, material_id, content_id, filename, size, sha256),
     )
-    fileid = storage_db_cursor.fetchone()[0]
+    return await db_cursor.fetchone()
+
 
-    db_cursor.execute(
+async def sql_select_material_attachments(db_cursor, course_id, material_id):
+    await db_cursor.execute(
         """
-        INSERT INTO material_files 
-        (courseid, matid, fileid, filename, uploadtime)
-        VALUES (%s, %s, %s, %s, now())
-        RETURNING fileid, uploadtime
+        SELECT fileid, filename, uploadtime, size
+        FROM material_files
+        WHERE courseid = %s AND matid = %s
         """,
-        (course_id, material_id, fileid, filename),
+        (course_id, material_id),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchall()
 
 
-def sql_select_material_attachments(db_cursor, course_id, material_id):
-    db_cursor.execute(
+# attachments are (content_id, filename, size, sha256) tuples, returns the IDs
+# of the new attachments in the same order and their upload time
+async def sql_insert_material_attachments(db_cursor, course_id, material_id, attachments):
+    file_ids = [str(uuid4()) for _ in attachments]
+    await db_cursor.execute(
         """
-        SELECT fileid, filename, uploadtime
+        INSERT INTO material_files
+        (courseid, matid, fileid, contentid, filename, size, sha256, uploadtime)
+        SELECT %s::uuid, %s::int, a.fileid, a.contentid, a.filename, a.size, a.sha256, now()
+        FROM unnest(%s::uuid[], %s::uuid[], %s::text[], %s::bigint[], %s::text[])
+            AS a(fileid, contentid, filename, size, sha256)
+        RETURNING uploadtime
+        """,
+        (course_id, material_id, file_ids, *map(list, zip(*attachments))),
+    )
+    return file_ids, (await db_cursor.fetchall())[0][0]
+
+
+# (contentid, filename, uploadtime, size, sha256) of the attachment, None when
+# the material has no attachment with the ID
+async def sql_select_material_attachment(db_cursor, course_id, material_id, file_id):
+    await db_cursor.execute(
+        """
+        SELECT contentid, filename, uploadtime, size, sha256
         FROM material_files
-        WHERE courseid = %s AND matid = %s
+        WHERE courseid = %s AND matid = %s AND fileid = %s
         """,
-        (course_id, material_id),
+        (course_id, material_id, file_id),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchone()
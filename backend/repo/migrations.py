@@ -0,0 +1,57 @@
+# any constant works, it only has to be the same for all the backend processes
+MIGRATIONS_LOCK_ID = 7310001
+
+
+async def sql_lock_migrations(db_cursor):
+    # held until the end of the transaction, so that concurrently starting
+    # backend processes apply the migrations one after another
+    await db_cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+
+
+async def sql_create_migrations_table(db_cursor):
+    await db_cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            version int PRIMARY KEY,
+            name text NOT NULL,
+            timeapplied timestamp NOT NULL
+        )
+        """
+    )
+
+
+async def sql_select_applied_migrations(db_cursor) -> set[int]:
+    await db_cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in await db_cursor.fetchall()}
+
+
+async def sql_run_migration_script(db_cursor, script: str):
+    await db_cursor.execute(script)
+
+
+async def sql_insert_migration(db_cursor, version: int, name: str):
+    await db_cursor.execute(
+        "INSERT INTO schema_migrations (version, name, timeapplied) VALUES (%s, %s, now())",
+        (version, name),
+    )
+
+
+async def sql_select_attachments_without_info(db_cursor) -> list[str]:
+    await db_cursor.execute(
+        """
+        SELECT contentid FROM material_files WHERE sha256 IS NULL
+        UNION
+        SELECT contentid FROM assignment_files WHERE sha256 IS NULL
+        UNION
+        SELECT contentid FROM submissions_files WHERE sha256 IS NULL
+        """
+    )
+    return [row[0] for row in await db_cursor.fetchall()]
+
+
+async def sql_update_attachment_info(db_cursor, file_id, size, sha256):
+    for table in ("material_files", "assignment_files", "submissions_files"):
+        await db_cursor.execute(
+            f"UPDATE {table} SET size = %s, sha256 = %s WHERE contentid = %s",
+            (size, sha256, file_id),
+        )
@@ -1,5 +1,5 @@
-def sql_select_students_parents(db_cursor, course_id, student_email):
-    db_cursor.execute(
+async def sql_select_students_parents(db_cursor, course_id, student_email):
+    await db_cursor.execute(
         """
         SELECT
             p.parentemail,
@@ -10,25 +10,25 @@ def sql_select_students_parents(db_cursor, course_id, student_email):
         """,
         (course_id, student_email),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_insert_parent_of_at_course(db_cursor, parent_email, student_email, course_id):
-    db_cursor.execute(
+async def sql_insert_parent_of_at_course(db_cursor, parent_email, student_email, course_id):
+    await db_cursor.execute(
         "INSERT INTO parent_of_at_course (parentemail, studentemail, courseid) VALUES (%s, %s, %s)",
         (parent_email, student_email, course_id),
     )
 
 
-def sql_delete_parent_of_at_course(db_cursor, course_id, student_email, parent_email):
-    db_cursor.execute(
+async def sql_delete_parent_of_at_course(db_cursor, course_id, student_email, parent_email):
+    await db_cursor.execute(
         "DELETE FROM parent_of_at_course WHERE courseid = %s AND studentemail = %s AND parentemail = %s",
         (course_id, student_email, parent_email),
     )
 
 
-def sql_select_parents_children(db_cursor, course_id, parent_email):
-    db_cursor.execute(
+async def sql_select_parents_children(db_cursor, course_id, parent_email):
+    await db_cursor.execute(
         """
         SELECT
             p.studentemail,
@@ -39,15 +39,15 @@ def sql_select_parents_children(db_cursor, course_id, parent_email):
         """,
         (course_id, parent_email),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_has_child_at_course(db_cursor, course_id: str, parent_email: str, student_email: str) -> bool:
-    db_cursor.execute(
+async def sql_has_child_at_course(db_cursor, course_id: str, parent_email: str, student_email: str) -> bool:
+    await db_cursor.execute(
         """
         SELECT EXISTS(SELECT 1 FROM parent_of_at_course
         WHERE courseid = %s AND parentemail = %s AND studentemail = %s)
         """,
         (course_id, parent_email, student_email),
     )
-    return db_cursor.fetchone()[0]
+    return (await db_cursor.fetchone())[0]
@@ -1,56 +1,67 @@
-def sql_select_submission_grade(db_cursor, course_id, assignment_id, student_email):
-    db_cursor.execute(
+from uuid import uuid4
+
+
+async def sql_select_submission_grade(db_cursor, course_id, assignment_id, student_email):
+    await db_cursor.execute(
         "SELECT grade FROM course_assignments_submissions WHERE courseid = %s AND assid = %s AND email = %s",
         (course_id, assignment_id, student_email),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_insert_submission(db_cursor, course_id, assignment_id, student_email, comment):
-    db_cursor.execute(
+async def sql_insert_submission(db_cursor, course_id, assignment_id, student_email, comment):
+    await db_cursor.execute(
         "INSERT INTO course_assignments_submissions (courseid, assid, email, timeadded, timemodified, comment, grade, gradedby) VALUES (%s, %s, %s, now(), now(), %s, null, null)",
         (course_id, assignment_id, student_email, comment),
     )
 
 
-def sql_insert_submission_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, student_email, filename, contents):
-    storage_db_cursor.execute(
+# the attachment gets an ID of its own, content_id is the ID of the stored file
+async def sql_insert_submission_attachment(db_cursor, course_id, assignment_id, student_email, content_id, filename, size, sha256):
+    await db_cursor.execute(
         """
-        INSERT INTO files 
-        (id, content)
-        VALUES (gen_random_uuid(), %s)
-        RETURNING id
+        INSERT INTO submissions_files
+        (courseid, assid, email, fileid, contentid, filename, size, sha256, uploadtime)
+        VALUES (%s, %s, %s, gen_random_uuid(), %s, %s, %s, %s, now())
+        RETURNING fileid, uploadtime
         """,
-        (contents, )
+        (course_id, assignment_id, student_email, content_id, filename, size, sha256),
     )
-    fileid = storage_db_cursor.fetchone()[0]
-    
-    db_cursor.execute(
+    return await db_cursor.fetchone()
+
+
+# attachments are (content_id, filename, size, sha256) tuples, returns the IDs
+# of the new attachments in the same order and their upload time
+async def sql_insert_submission_attachments(db_cursor, course_id, assignment_id, student_email, attachments):
+    file_ids = [str(uuid4()) for _ in attachments]
+    await db_cursor.execute(
         """
-        INSERT INTO submissions_files 
-        (courseid, assid, email, fileid, filename, uploadtime)
-        VALUES (%s, %s, %s, %s, %s, now())
-        RETURNING fileid, uploadtime
+        INSERT INTO submissions_files
+        (courseid, assid, email, fileid, contentid, filename, size, sha256, uploadtime)
+        SELECT %s::uuid, %s::int, %s, a.fileid, a.contentid, a.filename, a.size, a.sha256, now()
+        FROM unnest(%s::uuid[], %s::uuid[], %s::text[], %s::bigint[], %s::text[])
+            AS a(fileid, contentid, filename, size, sha256)
+        RETURNING uploadtime
         """,
-        (course_id, assignment_id, student_email, fileid, filename),
+        (course_id, assignment_id, student_email, file_ids, *map(list, zip(*attachments))),
     )
-    return db_cursor.fetchone()
+    return file_ids, (await db_cursor.fetchall())[0][0]
 
 
-def sql_select_submission_attachments(db_cursor, course_id, assignment_id, student_email):
-    db_cursor.execute(
+async def sql_select_submission_attachments(db_cursor, course_id, assignment_id, student_email):
+    await db_cursor.execute(
         """
-        SELECT fileid, filename, uploadtime
+        SELECT fileid, filename, uploadtime, size
         FROM submissions_files
         WHERE courseid = %s AND assid = %s AND email = %s
         """,
         (course_id, assignment_id, student_email),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_update_submission_comment(db_cursor, comment, course_id, assignment_id, student_email):
-    db_cursor.execute(
+async def sql_update_submission_comment(db_cursor, comment, course_id, assignment_id, student_email):
+    await db_cursor.execute(
         """
         UPDATE course_assignments_submissions
         SET comment = %s, timemodified = now()
@@ -60,8 +71,8 @@ def sql_update_submission_comment(db_cursor, comment, course_id, assignment_id,
     )
 
 
-def sql_select_submissions(db_cursor, course_id, assignment_id):
-    db_cursor.execute(
+async def sql_select_submissions(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
         """
         SELECT
             s.email,
@@ -78,11 +89,11 @@ def sql_select_submissions(db_cursor, course_id, assignment_id):
         """,
         (course_id, assignment_id),
     )
-    return db_cursor.fetchall()
+    return await db_cursor.fetchall()
 
 
-def sql_select_single_submission(db_cursor, course_id, assignment_id, student_email):
-    db_cursor.execute(
+async def sql_select_single_submission(db_cursor, course_id, assignment_id, student_email):
+    await db_cursor.execute(
         """
         SELECT
             s.email,
@@ -98,11 +109,11 @@ def sql_select_single_submission(db_cursor, course_id, assignment_id, student_em
         """,
         (course_id, assignment_id, student_email),
     )
-    return db_cursor.fetchone()
+    return await db_cursor.fetchone()
 
 
-def sql_update_submission_grade(db_cursor, grade, user_email, course_id, assignment_id, student_email):
-    db_cursor.execute(
+async def sql_update_submission_grade(db_cursor, grade, user_email, course_id, assignment_id, student_email):
+    await db_cursor.execute(
         """
         UPDATE course_assignments_submissions
         SET grade = %s, gradedby = %s
@@ -110,3 +121,31 @@ def sql_update_submission_grade(db_cursor, grade, user_email, course_id, assignm
         """,
         (grade, user_email, course_id, assignment_id, student_email),
     )
+
+
+# (email, contentid, filename, uploadtime, size) of the attachments of all the submissions
+async def sql_select_assignment_submissions_attachments(db_cursor, course_id, assignment_id):
+    await db_cursor.execute(
+        """
+        SELECT email, contentid, filename, uploadtime, size
+        FROM submissions_files
+        WHERE courseid = %s AND assid = %s
+        ORDER BY email, uploadtime
+        """,
+        (course_id, assignment_id),
+    )
+    return await db_cursor.fetchall()
+
+
+# (contentid, filename, uploadtime, size, sha256) of the attachment, None when
+# the submission has no attachment with the ID
+async def sql_select_submission_attachment(db_cursor, course_id, assignment_id, student_email, file_id):
+    await db_cursor.execute(
+        """
+        SELECT contentid, filename, uploadtime, size, sha256
+        FROM submissions_files
+        WHERE courseid = %s AND assid = %s AND email = %s AND fileid = %s
+        """,
+        (course_id, assignment_id, student_email, file_id),
+    )
+    return await db_cursor.fetchone()
@@ -0,0 +1,105 @@
+async def sql_count_upload_sessions(storage_db_cursor, owner):
+    await storage_db_cursor.execute(
+        "SELECT COUNT(*) FROM upload_sessions WHERE owner = %s AND timeexpires > now()",
+        (owner,),
+    )
+    return (await storage_db_cursor.fetchone())[0]
+
+
+async def sql_insert_upload_session(storage_db_cursor, owner, filename, size, ttl_seconds):
+    await storage_db_cursor.execute(
+        """
+        INSERT INTO upload_sessions (id, owner, filename, size, timecreated, timeexpires)
+        VALUES (gen_random_uuid(), %s, %s, %s, now(), now() + make_interval(secs => %s))
+        RETURNING id, timeexpires
+        """,
+        (owner, filename, size, ttl_seconds),
+    )
+    return await storage_db_cursor.fetchone()
+
+
+# (filename, size, timeexpires) of the session; the lock keeps the session
+# from being finished or expired until the end of the transaction
+async def sql_select_upload_session(storage_db_cursor, upload_id, owner):
+    await storage_db_cursor.execute(
+        """
+        SELECT filename, size, timeexpires FROM upload_sessions
+        WHERE id = %s AND owner = %s AND timeexpires > now()
+        FOR KEY SHARE
+        """,
+        (upload_id, owner),
+    )
+    return await storage_db_cursor.fetchone()
+
+
+# the same as sql_select_upload_session, but waits for the parts being written
+# and keeps new ones out
+async def sql_lock_upload_session(storage_db_cursor, upload_id, owner):
+    await storage_db_cursor.execute(
+        """
+        SELECT filename, size, timeexpires FROM upload_sessions
+        WHERE id = %s AND owner = %s AND timeexpires > now()
+        FOR UPDATE
+        """,
+        (upload_id, owner),
+    )
+    return await storage_db_cursor.fetchone()
+
+
+# a part sent again replaces the earlier copy
+async def sql_upsert_upload_part(storage_db_cursor, upload_id, part, content):
+    await storage_db_cursor.execute(
+        """
+        INSERT INTO upload_parts (sessionid, part, content) VALUES (%s, %s, %s)
+        ON CONFLICT (sessionid, part) DO UPDATE SET content = EXCLUDED.content
+        """,
+        (upload_id, part, content),
+    )
+
+
+async def sql_select_upload_part_numbers(storage_db_cursor, upload_id):
+    await storage_db_cursor.execute(
+        "SELECT part FROM upload_parts WHERE sessionid = %s ORDER BY part",
+        (upload_id,),
+    )
+    return [row[0] for row in await storage_db_cursor.fetchall()]
+
+
+# (parts, bytes) received so far
+async def sql_select_upload_progress(storage_db_cursor, upload_id):
+    await storage_db_cursor.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(content)), 0) FROM upload_parts WHERE sessionid = %s",
+        (upload_id,),
+    )
+    return await storage_db_cursor.fetchone()
+
+
+async def sql_select_upload_part(storage_db_cursor, upload_id, part):
+    await storage_db_cursor.execute(
+        "SELECT content FROM upload_parts WHERE sessionid = %s AND part = %s",
+        (upload_id, part),
+    )
+    row = await storage_db_cursor.fetchone()
+    return row[0] if row else None
+
+
+async def sql_delete_upload_session(storage_db_cursor, upload_id):
+    await storage_db_cursor.execute("DELETE FROM upload_sessions WHERE id = %s", (upload_id,))
+
+
+# deletes up to count expired sessions, returns (sessions, bytes of their parts)
+async def sql_delete_expired_upload_sessions(storage_db_cursor, count):
+    await storage_db_cursor.execute(
+        "SELECT id FROM upload_sessions WHERE timeexpires <= now() LIMIT %s FOR UPDATE SKIP LOCKED",
+        (count,),
+    )
+    upload_ids = [row[0] for row in await storage_db_cursor.fetchall()]
+    if not upload_ids:
+        return 0, 0
+    await storage_db_cursor.execute(
+        "SELECT COALESCE(SUM(length(content)), 0) FROM upload_parts WHERE sessionid = ANY(%s::uuid[])",
+        (upload_ids,),
+    )
+    size = (await storage_db_cursor.fetchone())[0]
+    await storage_db_cursor.execute("DELETE FROM upload_sessions WHERE id = ANY(%s::uuid[])", (upload_ids,))
+    return len(upload_ids), size
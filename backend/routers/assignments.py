@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Request
 from typing import List
 
-from auth import get_current_user, get_db, get_storage_db
+from auth import get_current_user, get_request_db, get_storage_db
 import json_classes
 from logic.assignments import (
     create_assignment as logic_create_assignment,
     remove_assignment as logic_remove_assignment,
     get_assignment as logic_get_assignment,
     create_assignment_attachment as logic_create_assignment_attachment,
+    create_assignment_attachments as logic_create_assignment_attachments,
+    finish_assignment_attachment_upload as logic_finish_assignment_attachment_upload,
     get_assignment_attachments as logic_get_assignment_attachments,
     download_assignment_attachment as logic_download_assignment_attachment
 )
@@ -22,6 +24,7 @@ async def create_assignment(
     title: str,
     description: str,
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Create the assignment with provided title and description in the course with provided course_id.
@@ -32,12 +35,17 @@ async def create_assignment(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_create_assignment(db_conn, db_cursor, course_id, title, description, user_email)
+    db_conn, db_cursor = db
+    return await logic_create_assignment(db_conn, db_cursor, course_id, title, description, user_email)
 
 
 @router.post("/remove_assignment", response_model=json_classes.Success, tags=["Assignments"])
-async def remove_assignment(course_id: str, assignment_id: str, user_email: str = Depends(get_current_user)):
+async def remove_assignment(
+    course_id: str,
+    assignment_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Remove the assignment by the provided course_id and assignment_id.
 
@@ -45,12 +53,17 @@ async def remove_assignment(course_id: str, assignment_id: str, user_email: str
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_remove_assignment(db_conn, db_cursor, course_id, assignment_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_remove_assignment(db_conn, db_cursor, course_id, assignment_id, user_email)
 
 
 @router.get("/get_assignment", response_model=json_classes.Assignment, tags=["Assignments"])
-async def get_assignment(course_id: str, assignment_id: str, user_email: str = Depends(get_current_user)):
+async def get_assignment(
+    course_id: str,
+    assignment_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the assignment details by the provided (course_id, assignment_id).
 
@@ -62,8 +75,8 @@ async def get_assignment(course_id: str, assignment_id: str, user_email: str = D
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_assignment(db_cursor, course_id, assignment_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_assignment(db_cursor, course_id, assignment_id, user_email)
 
 
 @router.post("/create_assignment_attachment", response_model=json_classes.AssignmentAttachmentMetadata, tags=["Assignments"])
@@ -72,6 +85,7 @@ async def create_assignment_attachment(
     assignment_id: str,
     file: UploadFile = File(...),
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Attach the provided file to provided course assignment.
@@ -82,12 +96,64 @@ async def create_assignment_attachment(
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
         return await logic_create_assignment_attachment(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, file, user_email)
 
 
+@router.post("/create_assignment_attachments", response_model=List[json_classes.AssignmentAttachmentMetadata], tags=["Assignments"])
+async def create_assignment_attachments(
+    course_id: str,
+    assignment_id: str,
+    files: List[UploadFile] = File(...),
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach all the provided files to provided course assignment at once.
+
+    Teacher role required.
+
+    At most 20 files per request. Either all the files are attached or none.
+
+    Returns the list of (course_id, assignment_id, file_id, filename, upload_time) for the new attachments in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_create_assignment_attachments(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, files, user_email)
+
+
+@router.post("/finish_assignment_attachment_upload", response_model=json_classes.AssignmentAttachmentMetadata, tags=["Assignments"])
+async def finish_assignment_attachment_upload(
+    course_id: str,
+    assignment_id: str,
+    upload_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach the file of the complete resumable upload (see /initiate_upload) to provided course assignment.
+
+    Teacher role required.
+
+    Returns the (course_id, assignment_id, file_id, filename, upload_time) for the new attachment in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_finish_assignment_attachment_upload(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, upload_id, user_email)
+
+
 @router.get("/get_assignment_attachments", response_model=List[json_classes.AssignmentAttachmentMetadata], tags=["Assignments"])
-async def get_assignment_attachments(course_id: str, assignment_id: str, user_email: str = Depends(get_current_user)):
+async def get_assignment_attachments(
+    course_id: str,
+    assignment_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of course assignment attachments by provided course_id, assignment_id.
 
@@ -95,14 +161,23 @@ async def get_assignment_attachments(course_id: str, assignment_id: str, user_em
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_assignment_attachments(db_cursor, course_id, assignment_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_assignment_attachments(db_cursor, course_id, assignment_id, user_email)
 
 
-@router.get("/download_assignment_attachment", tags=["Assignments"])
-async def download_assignment_attachment(course_id: str, assignment_id: str, file_id: str, user_email: str = Depends(get_current_user)):
+@router.api_route("/download_assignment_attachment", methods=["GET", "HEAD"], tags=["Assignments"])
+async def download_assignment_attachment(
+    request: Request,
+    course_id: str,
+    assignment_id: str,
+    file_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Download the course assignment attachment by provided course_id, assignment_id, file_id.
+
+    Supports HEAD, single byte Range requests, and conditional requests with ETag and Last-Modified.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
-        return logic_download_assignment_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, file_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_download_assignment_attachment(db_cursor, request, course_id, assignment_id, file_id, user_email)
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends
+
+from auth import get_current_user, get_request_db
+import json_classes
+from logic.logging import (
+    AUDIT_PAGE_DEFAULT,
+    get_audit_logs as logic_get_audit_logs,
+    export_audit_logs as logic_export_audit_logs,
+)
+
+router = APIRouter()
+
+
+@router.get("/get_audit_logs", response_model=json_classes.AuditLogPage, tags=["Logs"])
+async def get_audit_logs(
+    tag: str = None,
+    actor: str = None,
+    since: str = None,
+    until: str = None,
+    cursor: str = None,
+    limit: int = AUDIT_PAGE_DEFAULT,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Get a page of the audit log, newest events first.
+
+    Admin role required.
+
+    The events can be filtered by tag (one of the TAG_* of the backend), by actor (the email of the user
+    who did what the event is about) and by time, from since inclusive to until exclusive. The format of
+    since, until and the times of the events is TIME_FORMAT.
+
+    Returns (events, next_cursor), where every event is (id, time, tag, actor, message). The next page is
+    requested with the same filters and cursor=next_cursor; next_cursor is null on the last page.
+    The page has at most limit events, from 1 to 1000.
+    """
+    db_conn, db_cursor = db
+    return await logic_get_audit_logs(db_cursor, user_email, tag, actor, since, until, cursor, limit)
+
+
+@router.get("/export_audit_logs", tags=["Logs"])
+async def export_audit_logs(
+    tag: str = None,
+    actor: str = None,
+    since: str = None,
+    until: str = None,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Download the audit log as NDJSON, oldest events first, one (id, time, tag, actor, message) object per line.
+
+    Admin role required.
+
+    Takes the same filters as /get_audit_logs. Without until, the export ends at the time of the request.
+    """
+    db_conn, db_cursor = db
+    return await logic_export_audit_logs(db_cursor, user_email, tag, actor, since, until)
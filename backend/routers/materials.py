@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Request
 from typing import List
 
-from auth import get_current_user, get_db, get_storage_db
+from auth import get_current_user, get_request_db, get_storage_db
 import json_classes
 from logic.materials import (
     create_material as logic_create_material,
     remove_material as logic_remove_material,
     get_material as logic_get_material,
     create_material_attachment as logic_create_material_attachment,
+    create_material_attachments as logic_create_material_attachments,
+    finish_material_attachment_upload as logic_finish_material_attachment_upload,
     get_material_attachments as logic_get_material_attachments,
     download_material_attachment as logic_download_material_attachment
 )
@@ -21,6 +23,7 @@ async def create_material(
     title: str,
     description: str,
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Create the material with provided title and description in the course with provided course_id.
@@ -29,23 +32,33 @@ async def create_material(
 
     Returns the (course_id, material_id) for the new material in case of success.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_create_material(db_conn, db_cursor, course_id, title, description, user_email)
+    db_conn, db_cursor = db
+    return await logic_create_material(db_conn, db_cursor, course_id, title, description, user_email)
 
 
 @router.post("/remove_material", response_model=json_classes.Success, tags=["Materials"])
-async def remove_material(course_id: str, material_id: str, user_email: str = Depends(get_current_user)):
+async def remove_material(
+    course_id: str,
+    material_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Remove the material by the provided course_id and material_id.
 
     Teacher role required.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_remove_material(db_conn, db_cursor, course_id, material_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_remove_material(db_conn, db_cursor, course_id, material_id, user_email)
 
 
 @router.get("/get_material", response_model=json_classes.Material, tags=["Materials"])
-async def get_material(course_id: str, material_id: str, user_email: str = Depends(get_current_user)):
+async def get_material(
+    course_id: str,
+    material_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the material details by the provided (course_id, material_id).
 
@@ -55,8 +68,8 @@ async def get_material(course_id: str, material_id: str, user_email: str = Depen
 
     The format of creation time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_material(db_cursor, course_id, material_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_material(db_cursor, course_id, material_id, user_email)
 
 
 @router.post("/create_material_attachment", response_model=json_classes.MaterialAttachmentMetadata, tags=["Materials"])
@@ -65,6 +78,7 @@ async def create_material_attachment(
     material_id: str,
     file: UploadFile = File(...),
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Attach the provided file to provided course material.
@@ -75,12 +89,64 @@ async def create_material_attachment(
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
         return await logic_create_material_attachment(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, material_id, file, user_email)
 
 
+@router.post("/create_material_attachments", response_model=List[json_classes.MaterialAttachmentMetadata], tags=["Materials"])
+async def create_material_attachments(
+    course_id: str,
+    material_id: str,
+    files: List[UploadFile] = File(...),
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach all the provided files to provided course material at once.
+
+    Teacher role required.
+
+    At most 20 files per request. Either all the files are attached or none.
+
+    Returns the list of (course_id, material_id, file_id, filename, upload_time) for the new attachments in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_create_material_attachments(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, material_id, files, user_email)
+
+
+@router.post("/finish_material_attachment_upload", response_model=json_classes.MaterialAttachmentMetadata, tags=["Materials"])
+async def finish_material_attachment_upload(
+    course_id: str,
+    material_id: str,
+    upload_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach the file of the complete resumable upload (see /initiate_upload) to provided course material.
+
+    Teacher role required.
+
+    Returns the (course_id, material_id, file_id, filename, upload_time) for the new attachment in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_finish_material_attachment_upload(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, material_id, upload_id, user_email)
+
+
 @router.get("/get_material_attachments", response_model=List[json_classes.MaterialAttachmentMetadata], tags=["Materials"])
-async def get_material_attachments(course_id: str, material_id: str, user_email: str = Depends(get_current_user)):
+async def get_material_attachments(
+    course_id: str,
+    material_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of course material attachments by provided course_id, material_id.
 
@@ -88,14 +154,23 @@ async def get_material_attachments(course_id: str, material_id: str, user_email:
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_material_attachments(db_cursor, course_id, material_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_material_attachments(db_cursor, course_id, material_id, user_email)
 
 
-@router.get("/download_material_attachment", tags=["Materials"])
-async def download_material_attachment(course_id: str, material_id: str, file_id: str, user_email: str = Depends(get_current_user)):
+@router.api_route("/download_material_attachment", methods=["GET", "HEAD"], tags=["Materials"])
+async def download_material_attachment(
+    request: Request,
+    course_id: str,
+    material_id: str,
+    file_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Download the course material attachment by provided course_id, material_id, file_id.
+
+    Supports HEAD, single byte Range requests, and conditional requests with ETag and Last-Modified.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
-        return logic_download_material_attachment(db_cursor, storage_db_cursor, course_id, material_id, file_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_download_material_attachment(db_cursor, request, course_id, material_id, file_id, user_email)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+
+from auth import get_current_user, get_request_db
+from logic.metrics import (
+    get_server_metrics as logic_get_server_metrics,
+    get_storage_stats as logic_get_storage_stats,
+)
+
+router = APIRouter()
+
+
+@router.get("/get_server_metrics", tags=["Metrics"])
+async def get_server_metrics(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
+    """
+    Get the internal counters of the backend process: caches, memos, and database pools.
+
+    Admin role required.
+    """
+    db_conn, db_cursor = db
+    return await logic_get_server_metrics(db_cursor, user_email)
+
+
+@router.get("/get_storage_stats", tags=["Metrics"])
+async def get_storage_stats(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
+    """
+    Get the deduplication stats of the file storage: stored files, attachments referencing them,
+    stored and referenced bytes, bytes saved, the deduplication ratio, and the size of the files
+    in the storage database before and after compression.
+
+    Admin role required.
+    """
+    db_conn, db_cursor = db
+    return await logic_get_storage_stats(db_cursor, user_email)
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
-from auth import get_current_user, get_db
+from auth import get_current_user, get_request_db
 from logic.parents import (
     get_students_parents as logic_get_students_parents,
     invite_parent as logic_invite_parent,
@@ -14,7 +14,12 @@ router = APIRouter()
 
 
 @router.get("/get_students_parents", response_model=List[json_classes.User], tags=["Parents"])
-async def get_students_parents(course_id: str, student_email: str, user_email: str = Depends(get_current_user)):
+async def get_students_parents(
+    course_id: str,
+    student_email: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of parents observing the student with provided email on course with provided course_id.
 
@@ -22,8 +27,8 @@ async def get_students_parents(course_id: str, student_email: str, user_email: s
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_students_parents(db_cursor, course_id, student_email, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_students_parents(db_cursor, course_id, student_email, user_email)
 
 
 @router.post("/invite_parent", response_model=json_classes.Success, tags=["Parents"])
@@ -32,6 +37,7 @@ async def invite_parent(
     student_email: str,
     parent_email: str,
     teacher_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Invite the user with provided parent_email to become a parent of the student with provided student_email on course with provided course_id.
@@ -40,8 +46,8 @@ async def invite_parent(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_invite_parent(db_conn, db_cursor, course_id, student_email, parent_email, teacher_email)
+    db_conn, db_cursor = db
+    return await logic_invite_parent(db_conn, db_cursor, course_id, student_email, parent_email, teacher_email)
 
 
 @router.post("/remove_parent", response_model=json_classes.Success, tags=["Parents"])
@@ -50,6 +56,7 @@ async def remove_parent(
     student_email: str,
     parent_email: str,
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Remove the parent identified by parent_email from the tracking of student with provided student_email on course with provided course_id.
@@ -60,12 +67,16 @@ async def remove_parent(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_remove_parent(db_conn, db_cursor, course_id, student_email, parent_email, user_email)
+    db_conn, db_cursor = db
+    return await logic_remove_parent(db_conn, db_cursor, course_id, student_email, parent_email, user_email)
 
 
 @router.get("/get_parents_children", response_model=List[json_classes.User], tags=["Parents"])
-async def get_parents_children(course_id: str, user_email: str = Depends(get_current_user)):
+async def get_parents_children(
+    course_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of students for the parent with provided email on course with provided course_id.
 
@@ -73,5 +84,5 @@ async def get_parents_children(course_id: str, user_email: str = Depends(get_cur
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_parents_children(db_cursor, course_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_parents_children(db_cursor, course_id, user_email)
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
-from auth import get_current_user, get_db
+from auth import get_current_user, get_request_db
 import json_classes
 from logic.students import (
     get_enrolled_students as logic_get_enrolled_students,
@@ -13,29 +13,43 @@ router = APIRouter()
 
 
 @router.get("/get_enrolled_students", response_model=List[json_classes.User], tags=["Students"])
-async def get_enrolled_students(course_id: str, user_email: str = Depends(get_current_user)):
+async def get_enrolled_students(
+    course_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of enrolled students by course_id.
 
     Return the email and name of each student.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_enrolled_students(db_cursor, course_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_enrolled_students(db_cursor, course_id, user_email)
 
 
 @router.post("/invite_student", response_model=json_classes.Success, tags=["Students"])
-async def invite_student(course_id: str, student_email: str, teacher_email: str = Depends(get_current_user)):
+async def invite_student(
+    course_id: str,
+    student_email: str,
+    teacher_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Add the student with provided email to the course with provided course_id.
 
     Teacher role required.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_invite_student(db_conn, db_cursor, course_id, student_email, teacher_email)
+    db_conn, db_cursor = db
+    return await logic_invite_student(db_conn, db_cursor, course_id, student_email, teacher_email)
 
 
 @router.post("/remove_student", response_model=json_classes.Success, tags=["Students"])
-async def remove_student(course_id: str, student_email: str, user_email: str = Depends(get_current_user)):
+async def remove_student(
+    course_id: str,
+    student_email: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Remove the student with provided email from the course with provided course_id.
 
@@ -43,5 +57,5 @@ async def remove_student(course_id: str, student_email: str, user_email: str = D
 
     Student can only remove themselves.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_remove_student(db_conn, db_cursor, course_id, student_email, user_email)
+    db_conn, db_cursor = db
+    return await logic_remove_student(db_conn, db_cursor, course_id, student_email, user_email)
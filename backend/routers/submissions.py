@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Request
 from typing import List
 
-from auth import get_current_user, get_db, get_storage_db
+from auth import get_current_user, get_request_db, get_storage_db
 import json_classes
 from logic.submissions import (
     submit_assignment as logic_submit_assignment,
@@ -9,8 +9,11 @@ from logic.submissions import (
     get_submission as logic_get_submission,
     grade_submission as logic_grade_submission,
     create_submission_attachment as logic_create_submission_attachment,
+    create_submission_attachments as logic_create_submission_attachments,
+    finish_submission_attachment_upload as logic_finish_submission_attachment_upload,
     get_submission_attachments as logic_get_submission_attachments,
     download_submission_attachment as logic_download_submission_attachment,
+    download_assignment_submissions_zip as logic_download_assignment_submissions_zip,
 )
 
 
@@ -23,6 +26,7 @@ async def submit_assignment(
     assignment_id: str,
     comment: str,
     student_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Allows student to submit their assignment.
@@ -33,12 +37,17 @@ async def submit_assignment(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_submit_assignment(db_conn, db_cursor, course_id, assignment_id, comment, student_email)
+    db_conn, db_cursor = db
+    return await logic_submit_assignment(db_conn, db_cursor, course_id, assignment_id, comment, student_email)
 
 
 @router.get("/get_assignment_submissions", response_model=List[json_classes.Submission], tags=["Submissions"])
-async def get_assignment_submissions(course_id: str, assignment_id: str, user_email: str = Depends(get_current_user)):
+async def get_assignment_submissions(
+    course_id: str,
+    assignment_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of students submissions of provided assignments.
 
@@ -54,8 +63,8 @@ async def get_assignment_submissions(course_id: str, assignment_id: str, user_em
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_assignment_submissions(db_cursor, course_id, assignment_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_assignment_submissions(db_cursor, course_id, assignment_id, user_email)
 
 
 @router.get("/get_submission", response_model=json_classes.Submission, tags=["Submissions"])
@@ -64,6 +73,7 @@ async def get_submission(
     assignment_id: str,
     student_email: str,
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Get the student submission of assignment by course_id, assignment_id and student_email.
@@ -80,8 +90,8 @@ async def get_submission(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_submission(db_cursor, course_id, assignment_id, student_email, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_submission(db_cursor, course_id, assignment_id, student_email, user_email)
 
 
 @router.post("/grade_submission", response_model=json_classes.Success, tags=["Submissions"])
@@ -91,6 +101,7 @@ async def grade_submission(
     student_email: str,
     grade: str,
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Allows teacher to grade student's submission.
@@ -99,16 +110,16 @@ async def grade_submission(
     """
 
     # connection to database
-    with get_db() as (db_conn, db_cursor):
-        return logic_grade_submission(
-            db_conn,
-            db_cursor,
-            course_id,
-            assignment_id,
-            student_email,
-            grade,
-            user_email,
-        )
+    db_conn, db_cursor = db
+    return await logic_grade_submission(
+        db_conn,
+        db_cursor,
+        course_id,
+        assignment_id,
+        student_email,
+        grade,
+        user_email,
+    )
 
 
 @router.post("/create_submission_attachment", response_model=json_classes.SubmissionAttachmentMetadata, tags=["Submissions"])
@@ -118,6 +129,7 @@ async def create_submission_attachment(
     student_email: str,
     file: UploadFile = File(...),
     user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
 ):
     """
     Attach the provided file to provided course assignment submission.
@@ -128,12 +140,67 @@ async def create_submission_attachment(
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
         return await logic_create_submission_attachment(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, student_email, file, user_email)
 
 
+@router.post("/create_submission_attachments", response_model=List[json_classes.SubmissionAttachmentMetadata], tags=["Submissions"])
+async def create_submission_attachments(
+    course_id: str,
+    assignment_id: str,
+    student_email: str,
+    files: List[UploadFile] = File(...),
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach all the provided files to provided course assignment submission at once.
+
+    Student role required.
+
+    At most 20 files per request. Either all the files are attached or none.
+
+    Returns the list of (course_id, assignment_id, student_email, file_id, filename, upload_time) for the new attachments in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_create_submission_attachments(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, student_email, files, user_email)
+
+
+@router.post("/finish_submission_attachment_upload", response_model=json_classes.SubmissionAttachmentMetadata, tags=["Submissions"])
+async def finish_submission_attachment_upload(
+    course_id: str,
+    assignment_id: str,
+    student_email: str,
+    upload_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Attach the file of the complete resumable upload (see /initiate_upload) to provided course assignment submission.
+
+    Student role required.
+
+    Returns the (course_id, assignment_id, student_email, file_id, filename, upload_time) for the new attachment in case of success.
+
+    The format of upload_time is TIME_FORMAT.
+    """
+    db_conn, db_cursor = db
+    async with get_storage_db() as (storage_db_conn, storage_db_cursor):
+        return await logic_finish_submission_attachment_upload(db_conn, db_cursor, storage_db_conn, storage_db_cursor, course_id, assignment_id, student_email, upload_id, user_email)
+
+
 @router.get("/get_submission_attachments", response_model=List[json_classes.SubmissionAttachmentMetadata], tags=["Submissions"])
-async def get_submission_attachments(course_id: str, assignment_id: str, student_email: str, user_email: str = Depends(get_current_user)):
+async def get_submission_attachments(
+    course_id: str,
+    assignment_id: str,
+    student_email: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the list of attachments to the course assignment submission by provided course_id, assignment_id, student_email.
 
@@ -141,14 +208,46 @@ async def get_submission_attachments(course_id: str, assignment_id: str, student
 
     The format of upload_time is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_submission_attachments(db_cursor, course_id, assignment_id, student_email, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_submission_attachments(db_cursor, course_id, assignment_id, student_email, user_email)
 
 
-@router.get("/download_submission_attachment", tags=["Submissions"])
-async def download_submission_attachment(course_id: str, assignment_id: str, student_email: str, file_id: str, user_email: str = Depends(get_current_user)):
+@router.api_route("/download_submission_attachment", methods=["GET", "HEAD"], tags=["Submissions"])
+async def download_submission_attachment(
+    request: Request,
+    course_id: str,
+    assignment_id: str,
+    student_email: str,
+    file_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Download the attachment to the course assignment submission by provided course_id, assignment_id, student_email, file_id.
+
+    Supports HEAD, single byte Range requests, and conditional requests with ETag and Last-Modified.
+    """
+    db_conn, db_cursor = db
+    return await logic_download_submission_attachment(db_cursor, request, course_id, assignment_id, student_email, file_id, user_email)
+
+
+@router.get("/download_assignment_submissions_zip", tags=["Submissions"])
+async def download_assignment_submissions_zip(
+    course_id: str,
+    assignment_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
+    """
+    Download all the submissions of the assignment as a ZIP archive, built while it is sent.
+
+    Teacher role required.
+
+    The archive has a folder named by student_email with the attachments of each submission,
+    and manifest.json with the submissions (student_email, student_name, submission_time,
+    last_modification_time, comment, grade, gradedby_email) and the paths of their files.
+
+    The format of the times is TIME_FORMAT.
     """
-    with get_db() as (db_conn, db_cursor), get_storage_db() as (storage_db_conn, storage_db_cursor):
-        return logic_download_submission_attachment(db_cursor, storage_db_cursor, course_id, assignment_id, student_email, file_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_download_assignment_submissions_zip(db_cursor, course_id, assignment_id, user_email)
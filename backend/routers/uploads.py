@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, Request
+
+from auth import get_current_user_unheld
+import json_classes
+from logic.uploading import (
+    initiate_upload as logic_initiate_upload,
+    upload_part as logic_upload_part,
+    get_upload_status as logic_get_upload_status,
+)
+
+router = APIRouter()
+
+
+@router.post("/initiate_upload", response_model=json_classes.UploadSession, tags=["Uploads"])
+async def initiate_upload(filename: str, size: int, user_email: str = Depends(get_current_user_unheld)):
+    """
+    Start a resumable upload of a file with provided filename and size in bytes, for files too large
+    to be sent at once or sent over an unreliable connection.
+
+    The file is sent in parts with /upload_part, which may be sent in any order, at the same time, and again
+    after a failure. /get_upload_status tells which parts have been received. The complete upload is attached
+    with /finish_material_attachment_upload, /finish_assignment_attachment_upload or
+    /finish_submission_attachment_upload. Unfinished uploads are deleted when they expire.
+
+    Returns the (upload_id, size, part_size, parts, expires) of the new upload. Every part is part_size bytes
+    long except the last one.
+
+    The format of expires is TIME_FORMAT.
+    """
+    return await logic_initiate_upload(filename, size, user_email)
+
+
+@router.put("/upload_part", response_model=json_classes.Success, tags=["Uploads"])
+async def upload_part(request: Request, upload_id: str, part: int, user_email: str = Depends(get_current_user_unheld)):
+    """
+    Send the part with provided number (from 0) of the resumable upload. The request body is the part itself.
+
+    Only the user who started the upload can send its parts.
+    """
+    return await logic_upload_part(request, upload_id, part, user_email)
+
+
+@router.get("/get_upload_status", response_model=json_classes.UploadStatus, tags=["Uploads"])
+async def get_upload_status(upload_id: str, user_email: str = Depends(get_current_user_unheld)):
+    """
+    Get the state of the resumable upload.
+
+    Returns (upload_id, filename, size, part_size, parts, received_parts, received_ranges, expires), where
+    received_parts are the [first, last] runs of the received part numbers and received_ranges are the same
+    runs as [first, last] byte offsets.
+
+    The format of expires is TIME_FORMAT.
+    """
+    return await logic_get_upload_status(upload_id, user_email)
@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends
 
-from auth import get_current_user, get_db
+from auth import get_current_user, get_request_db
 import json_classes
 from logic.users import (
     get_user_info as logic_get_user_info,
@@ -19,25 +19,29 @@ router = APIRouter()
 
 
 @router.get("/get_user_info", response_model=json_classes.User, tags=["Users"])
-async def get_user_info(user_email: str = Depends(get_current_user)):
+async def get_user_info(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
     """
     Get the info about the user.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_user_info(db_cursor, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_user_info(db_cursor, user_email)
 
 
 @router.get("/get_user_role", response_model=json_classes.CourseRole, tags=["Users"])
-async def get_user_role(course_id: str, user_email: str = Depends(get_current_user)):
+async def get_user_role(
+    course_id: str,
+    user_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Get the user's role in the provided course.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_user_role(db_cursor, course_id, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_user_role(db_cursor, course_id, user_email)
 
 
 @router.post("/create_user", response_model=json_classes.Account, tags=["Users"])
-async def create_user(user: json_classes.UserCreate):
+async def create_user(user: json_classes.UserCreate, db: tuple = Depends(get_request_db)):
     """
     Creates a user account with provided email, name, and password.
 
@@ -47,32 +51,32 @@ async def create_user(user: json_classes.UserCreate):
 
     Returns email and JWT access token for 30 minutes.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_create_user(db_conn, db_cursor, user)
+    db_conn, db_cursor = db
+    return await logic_create_user(db_conn, db_cursor, user)
 
 
 @router.post("/login", response_model=json_classes.Account, tags=["Users"])
-async def login(user: json_classes.UserLogin):
+async def login(user: json_classes.UserLogin, db: tuple = Depends(get_request_db)):
     """
     Log into user account with provided email and password.
 
     Returns email and JWT access token for 30 minutes.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_login(db_cursor, user)
+    db_conn, db_cursor = db
+    return await logic_login(db_cursor, user)
 
 
 @router.post("/change_password", response_model=json_classes.Success, tags=["Users"])
-async def change_password(user: json_classes.UserNewPassword):
+async def change_password(user: json_classes.UserNewPassword, db: tuple = Depends(get_request_db)):
     """
     Change the user password to a new one.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_change_password(db_conn, db_cursor, user)
+    db_conn, db_cursor = db
+    return await logic_change_password(db_conn, db_cursor, user)
 
 
 @router.post("/remove_user", response_model=json_classes.Success, tags=["Users"])
-async def remove_user(user_email: str = Depends(get_current_user)):
+async def remove_user(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
     """
     Delete user account from the system.
 
@@ -84,23 +88,27 @@ async def remove_user(user_email: str = Depends(get_current_user)):
 
     Courses where the user is the only Teacher will be deleted.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_remove_user(db_conn, db_cursor, user_email)
+    db_conn, db_cursor = db
+    return await logic_remove_user(db_conn, db_cursor, user_email)
 
 
 @router.post("/give_admin_permissions", response_model=json_classes.Success, tags=["Users"])
-async def give_admin_permissions(object_email: str, subject_email: str = Depends(get_current_user)):
+async def give_admin_permissions(
+    object_email: str,
+    subject_email: str = Depends(get_current_user),
+    db: tuple = Depends(get_request_db),
+):
     """
     Give admin rights to some existing user by their email.
 
     Admin role required.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_give_admin_permissions(db_conn, db_cursor, object_email, subject_email)
+    db_conn, db_cursor = db
+    return await logic_give_admin_permissions(db_conn, db_cursor, object_email, subject_email)
 
 
 @router.get("/get_all_users", response_model=List[json_classes.User], tags=["Users"])
-async def get_all_users(user_email: str = Depends(get_current_user)):
+async def get_all_users(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
     """
     Get the list of all users in the system.
 
@@ -108,14 +116,14 @@ async def get_all_users(user_email: str = Depends(get_current_user)):
 
     Admin role required.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_all_users(db_cursor, user_email)
+    db_conn, db_cursor = db
+    return await logic_get_all_users(db_cursor, user_email)
 
 
 @router.get("/get_admins", response_model=List[json_classes.User], tags=["Users"])
-async def get_admins(user_email: str = Depends(get_current_user)):
+async def get_admins(user_email: str = Depends(get_current_user), db: tuple = Depends(get_request_db)):
     """
     Get the list of platform administrators.
     """
-    with get_db() as (db_conn, db_cursor):
-        return logic_get_admins(db_cursor)
+    db_conn, db_cursor = db
+    return await logic_get_admins(db_cursor)
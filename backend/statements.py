@@ -0,0 +1,28 @@
+#
+# Registry of the statements that are executed as server-side prepared
+# statements. psycopg prepares a statement on a connection the first time
+# it is executed there and keeps it in a per-connection LRU cache of
+# PREPARED_MAX statements, so each statement is parsed and planned by
+# Postgres once per connection instead of on every call.
+#
+
+# how many prepared statements each connection keeps, more than the repo has
+PREPARED_MAX = 256
+
+# process-wide call counts, keyed by the statement text
+_calls: dict[str, int] = {}
+
+
+def register_call(query):
+    query = str(query)
+    _calls[query] = _calls.get(query, 0) + 1
+
+
+def get_stats() -> dict:
+    statements = sorted(_calls.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "prepared_max": PREPARED_MAX,
+        "statements": len(statements),
+        "calls": sum(_calls.values()),
+        "registry": [{"statement": " ".join(query.split()), "calls": calls} for query, calls in statements],
+    }
@@ -0,0 +1,15 @@
+#!/bin/bash
+# hot standby of system_db, cloned from it on the first start
+if [ -z "$(ls $PGDATA)" ]; then
+    until pg_basebackup -h "$PRIMARY_HOST" -U postgres -D "$PGDATA" -R -X stream; do
+        echo "waiting for $PRIMARY_HOST"
+        rm -rf "$PGDATA"/*
+        sleep 1
+    done
+    chmod 700 "$PGDATA"
+fi
+pg_ctl -D "$PGDATA" start
+trap 'echo exiting' INT
+sleep INFINITY &
+wait $!
+pg_ctl -D "$PGDATA" stop